@@ -9,7 +9,10 @@ import networkx as nx
 from wordcloud import WordCloud
 import matplotlib.font_manager as fm
 import pandas as pd
-from snownlp import SnowNLP
+
+from 情感评分 import score_sentiments
+from 情感趋势 import DEFAULT_SMOOTH_SECONDS, SentimentTrend
+from 新词发现 import load_jieba_userdict
 
 warnings.filterwarnings('ignore')
 
@@ -149,6 +152,8 @@ def jieba_cut(text):
     旧版本使用jieba.cut，新版本使用jieba.lcut
     """
     try:
+        # 新词发现生成的新词词典（存在时）
+        load_jieba_userdict()
         # 尝试使用新版本的lcut方法
         if hasattr(jieba, 'lcut'):
             return jieba.lcut(text)
@@ -575,14 +580,8 @@ def main():
         # 1. 读取数据
         df = pd.read_csv('./莞莞类卿-纯元故衣事件.csv', encoding='utf-8-sig')
         
-        # 2. 情感分析函数
-        def get_sentiment(text):
-            try:
-                return SnowNLP(text).sentiments
-            except:
-                return 0.5
-
-        df['情感得分'] = df['弹幕内容'].apply(get_sentiment)
+        # 2. 情感分析（多进程批量评分）
+        df['情感得分'] = score_sentiments(df['弹幕内容'])
         
         # 3. 情感分类
         def classify_sentiment(score):
@@ -630,14 +629,15 @@ def main():
         # 图4: 按时间的情感变化趋势
         ax4 = plt.subplot(2, 3, 4)
         df['出现时间秒'] = pd.to_numeric(df['出现时间秒'], errors='coerce')
-        window_size = 20
-        df_sorted = df.sort_values('出现时间秒')
-        df_sorted['情感得分平滑'] = df_sorted['情感得分'].rolling(window=window_size, center=True).mean()
-        ax4.scatter(df_sorted['出现时间秒'], df_sorted['情感得分'], alpha=0.3, s=10, color='gray')
-        ax4.plot(df_sorted['出现时间秒'], df_sorted['情感得分平滑'], color='red', linewidth=2)
+        # 按视频时间分桶汇总，平滑窗口覆盖固定时长
+        window_seconds = DEFAULT_SMOOTH_SECONDS
+        trend = SentimentTrend()
+        trend.add_frame(df)
+        if not trend.plot(ax4, window_seconds):
+            ax4.text(0.5, 0.5, '没有带时间的弹幕', ha='center', va='center', transform=ax4.transAxes)
         ax4.set_xlabel('视频时间 (秒)', fontsize=12)
         ax4.set_ylabel('情感得分', fontsize=12)
-        ax4.set_title(f'情感得分随时间变化趋势 (滑动窗口: {window_size}条)', fontsize=14, fontweight='bold')
+        ax4.set_title(f'情感得分随时间变化趋势 (时间窗口: {window_seconds}秒)', fontsize=14, fontweight='bold')
         ax4.grid(True, alpha=0.3)
         
         # 图5: 弹幕长度与情感关系
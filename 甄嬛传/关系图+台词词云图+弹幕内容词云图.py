@@ -8,6 +8,8 @@ import matplotlib.pyplot as plt
 import networkx as nx
 from wordcloud import WordCloud
 
+from 新词发现 import load_jieba_userdict
+
 warnings.filterwarnings('ignore')
 
 font_path = '/System/Library/Fonts/PingFang.ttc'
@@ -135,6 +137,7 @@ script_text = """
 祺贵人:臣妾要告发熹贵妃私通秽乱后宫 静白:贫尼甘露寺静白见过皇上，皇后娘娘。
 """
 
+load_jieba_userdict()
 words = jieba.lcut(script_text)
 stop_words = {'的', '了', '啊', '呢', '吧', '吗', '是', '在', '和', '与', '之', '其', '这', '那', '我', '你', '他',
               '她', '臣妾', '皇上', '娘娘', '奴婢', '小主', '臣', '本宫', '哀家', '朕', '贵人', '嫔妾', '什么', '怎么',
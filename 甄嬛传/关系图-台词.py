@@ -5,6 +5,9 @@ import matplotlib.pyplot as plt
 # 读取 CSV
 df = pd.read_csv("全剧_台词_情感汇总.csv", encoding="utf-8-sig")
 
+# 情感节点：优先使用细粒度的 情感类别，旧的汇总表只有 情感分类
+emotion_col = '情感类别' if '情感类别' in df.columns else '情感分类'
+
 # 创建空图
 G = nx.Graph()
 
@@ -12,7 +15,7 @@ G = nx.Graph()
 for _, row in df.iterrows():
     role = row['人物']
     scene = row['剧情阶段']
-    emotion = row['情感分类']
+    emotion = row[emotion_col]
 
     # 添加节点
     G.add_node(role, type='角色')
@@ -1,17 +1,9 @@
 import pandas as pd
-from snownlp import SnowNLP
 
-# 1. 读取 CSV
-df = pd.read_csv("test.csv", encoding="utf-8-sig")
+from 情感词典 import add_emotion_columns
+from 情感评分 import score_sentiments
 
-# 2. 定义情感分析函数
-def get_sentiment(text):
-    try:
-        return SnowNLP(str(text)).sentiments
-    except:
-        return 0.5
-
-# 3. 定义情感分类规则
+# 1. 定义情感分类规则
 def classify_sentiment(score):
     if score > 0.6:
         return "积极"
@@ -20,12 +12,19 @@ def classify_sentiment(score):
     else:
         return "中性"
 
-# 4. ★真正“加列”的两行（你问的那两行）
-df["情感得分"] = df["dialogue"].apply(get_sentiment)
-df["情感分类"] = df["情感得分"].apply(classify_sentiment)
+# 评分使用进程池，Windows 下子进程会重新导入本文件，入口需放在 __main__ 下
+if __name__ == "__main__":
+    # 2. 读取 CSV
+    df = pd.read_csv("test.csv", encoding="utf-8-sig")
+
+    # 3. ★真正“加列”的两行（情感得分为多进程批量评分）
+    df["情感得分"] = score_sentiments(df["dialogue"])
+    df["情感分类"] = df["情感得分"].apply(classify_sentiment)
+    # 细粒度情感类别（喜悦/愤怒/悲伤/恐惧/惊讶/厌恶/中性）
+    add_emotion_columns(df, "dialogue")
 
-# 5. 保存新 CSV
-df.to_csv("test_情感分析后.csv", index=False, encoding="utf-8-sig")
+    # 4. 保存新 CSV
+    df.to_csv("test_情感分析后.csv", index=False, encoding="utf-8-sig")
 
-print("✅ 已生成：test_情感分析后.csv")
-print(df.head())
+    print("✅ 已生成：test_情感分析后.csv")
+    print(df.head())
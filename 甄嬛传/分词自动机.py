@@ -0,0 +1,199 @@
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+# 汉字范围，与 FastChineseSegmenter 一致：只有从汉字开始的位置才查词
+CJK_FIRST = '一'
+CJK_LAST = '鿿'
+# 基本多文种平面大小：字符到编码的转换表覆盖这些字符
+BMP_SIZE = 0x10000
+
+
+class ArrayAutomaton:
+    """扁平整数数组存储的 Trie + Aho-Corasick 失败指针，不再为每个节点建字典
+
+    - 状态按层序编号，同一状态的子节点编号连续：状态 c 的边标签存于 labels[c - 1]，
+      状态 s 的子节点为 first[s] + 1 到 first[s + 1]（标签有序，二分查找）
+    - 根节点的转移单独用稠密数组 root 存放（大部分查找从根开始）
+    - 词按逆序插入：逆序扫描文本时，到达某位置的状态沿失败链包含了所有
+      “以该位置开头”的词，longest 数组预先记录其中最长的词长
+    - 全部数组为 array('i')，数万词的词典也只占几MB
+    """
+
+    def __init__(self, words):
+        words = sorted({word for word in words if word})
+        chars = sorted({char for word in words for char in word})
+        # 字符编码从1开始，0表示词典中没有的字符
+        self.codes = {char: code for code, char in enumerate(chars, 1)}
+        self.alphabet_size = len(chars) + 1
+        self.word_count = len(words)
+        self.max_word_len = max((len(word) for word in words), default=0)
+
+        # 先建临时的逆序 Trie（每个节点的子节点表），再按层序展开成数组
+        children = [{}]
+        terminal = [False]
+        for word in words:
+            node = 0
+            for char in reversed(word):
+                code = self.codes[char]
+                child = children[node].get(code)
+                if child is None:
+                    child = len(children)
+                    children[node][code] = child
+                    children.append({})
+                    terminal.append(False)
+                node = child
+            terminal[node] = True
+
+        self._build_arrays(children, terminal)
+
+    def _build_arrays(self, children, terminal):
+        """层序编号，生成 first/labels/root，并计算失败指针和最长输出"""
+        size = len(children)
+        first = array('i', [0]) * (size + 1)
+        labels = array('i', [0]) * max(size - 1, 0)
+        parent = array('i', [0]) * size
+        depth = array('i', [0]) * size
+        is_word = array('b', [0]) * size
+
+        order = [0]
+        for state, node in enumerate(order):
+            first[state] = len(order) - 1
+            for code in sorted(children[node]):
+                child = children[node][code]
+                labels[len(order) - 1] = code
+                parent[len(order)] = state
+                depth[len(order)] = depth[state] + 1
+                is_word[len(order)] = terminal[child]
+                order.append(child)
+        first[size] = size - 1
+
+        root = array('i', [0]) * self.alphabet_size
+        for state in range(1, first[1] + 1):
+            root[labels[state - 1]] = state
+
+        self.first = first
+        self.labels = labels
+        self.root = root
+        self.fail = array('i', [0]) * size
+        self.longest = array('i', [0]) * size
+
+        # 层序计算：子节点的失败状态 = 从父节点的失败状态读入同一字符后的状态
+        for state in range(1, size):
+            if parent[state]:
+                self.fail[state] = self.step(self.fail[parent[state]], labels[state - 1])
+            # 自身是词时输出自身长度，否则沿失败链取最长的词
+            self.longest[state] = depth[state] if is_word[state] else self.longest[self.fail[state]]
+
+    def step(self, state, code):
+        """从 state 读入一个字符编码后的状态（失败时沿失败链回退）"""
+        first, labels, fail = self.first, self.labels, self.fail
+        while state:
+            lo = first[state]
+            hi = first[state + 1]
+            k = bisect_left(labels, code, lo, hi)
+            if k < hi and labels[k] == code:
+                return k + 1
+            state = fail[state]
+        return self.root[code]
+
+    def translation_table(self):
+        """字符 → 编码 的转换表（str.translate 用），词典外的字符映射为 0"""
+        table = ['\0'] * BMP_SIZE
+        for char, code in self.codes.items():
+            if ord(char) < BMP_SIZE:
+                table[ord(char)] = chr(code)
+        return ''.join(table)
+
+    def memory_bytes(self):
+        """自动机数组占用的字节数"""
+        arrays = (self.first, self.labels, self.root, self.fail, self.longest)
+        return sum(arr.itemsize * len(arr) for arr in arrays)
+
+
+class AutomatonSegmenter:
+    """基于数组自动机的分词器 - 输出与 FastChineseSegmenter.fast_segment 完全相同
+
+    逆序扫描一遍文本得到每个位置开头的最长词长，再从左到右贪心取词：
+    汉字位置有词取最长词，否则取单字（停用词除外），非汉字跳过。
+    """
+
+    def __init__(self, words, stop_words=(), verbose=True):
+        self.automaton = ArrayAutomaton(words)
+        self.max_word_len = self.automaton.max_word_len
+        self.stop_words = set(stop_words)
+        self._table = self.automaton.translation_table()
+        # 基本平面之外的词典字符（如扩展B区汉字）不在转换表中，单独查表
+        self._astral_codes = {ord(char): code for char, code in self.automaton.codes.items()
+                              if ord(char) >= BMP_SIZE}
+        if verbose:
+            print(f"自动机词典加载完成，最大词长: {self.max_word_len}，总词数: {self.automaton.word_count}，"
+                  f"数组占用: {self.automaton.memory_bytes() / 1024:.0f} KB")
+
+    def _encode(self, text):
+        """文本转为逆序的字符编码列表（转换在C层完成）"""
+        encoded = np.frombuffer(text[::-1].translate(self._table).encode('utf-32-le'), dtype=np.uint32)
+        # 基本平面之外的字符 translate 后保持原样，查表转换，词典外的为 0
+        codes = np.where(encoded < BMP_SIZE, encoded, 0).tolist()
+        if self._astral_codes:
+            for i in np.flatnonzero(encoded >= BMP_SIZE).tolist():
+                codes[i] = self._astral_codes.get(int(encoded[i]), 0)
+        return codes
+
+    def longest_starts(self, text):
+        """每个位置开头的最长词长（没有词为0）"""
+        automaton = self.automaton
+        first, labels, root = automaton.first, automaton.labels, automaton.root
+        fail, longest = automaton.fail, automaton.longest
+        lengths = [0] * len(text)
+        state = 0
+        position = len(text)
+        for code in self._encode(text):
+            position -= 1
+            if not code:
+                state = 0
+                continue
+            while state:
+                lo = first[state]
+                hi = first[state + 1]
+                if lo < hi:
+                    k = bisect_left(labels, code, lo, hi)
+                    if k < hi and labels[k] == code:
+                        state = k + 1
+                        break
+                state = fail[state]
+            else:
+                state = root[code]
+            if state:
+                lengths[position] = longest[state]
+        return lengths
+
+    def fast_segment(self, text):
+        """分词，结果与 FastChineseSegmenter.fast_segment 相同"""
+        lengths = self.longest_starts(text)
+        stop_words = self.stop_words
+        words = []
+        i = 0
+        n = len(text)
+        while i < n:
+            char = text[i]
+            if not (CJK_FIRST <= char <= CJK_LAST):
+                i += 1
+                continue
+            length = lengths[i]
+            if length:
+                words.append(text[i:i + length])
+                i += length
+            else:
+                if char not in stop_words:
+                    words.append(char)
+                i += 1
+        return words
+
+    def batch_segment(self, texts, batch_size=1000):
+        """批量分词"""
+        all_words = []
+        for text in texts:
+            all_words.extend(self.fast_segment(text))
+        return all_words
@@ -17,15 +17,18 @@ scenes_ordered = all_scenes
 # 统计角色→剧情台词数量
 role_scene = df_main.groupby(['人物', '剧情阶段']).size().reset_index(name='count')
 
+# 情感列：优先使用细粒度的 情感类别（喜悦/愤怒/...），旧的汇总表只有 积极/中性/消极
+emotion_col = '情感类别' if '情感类别' in df.columns else '情感分类'
+
 # 统计剧情→情感台词数量（只保留 top5 情感，避免图太乱）
-scene_emotion = df_main.groupby(['剧情阶段', '情感分类']).size().reset_index(name='count')
-top_emotions = scene_emotion.groupby('情感分类')['count'].sum().sort_values(ascending=False).head(5).index.tolist()
-scene_emotion = scene_emotion[scene_emotion['情感分类'].isin(top_emotions)]
+scene_emotion = df_main.groupby(['剧情阶段', emotion_col]).size().reset_index(name='count')
+top_emotions = scene_emotion.groupby(emotion_col)['count'].sum().sort_values(ascending=False).head(5).index.tolist()
+scene_emotion = scene_emotion[scene_emotion[emotion_col].isin(top_emotions)]
 
 # 创建节点列表（角色 + 全部剧情阶段 + 情感）
 roles = role_scene['人物'].unique().tolist()
 scenes = scenes_ordered
-emotions = list(scene_emotion['情感分类'].unique())
+emotions = list(scene_emotion[emotion_col].unique())
 nodes = roles + scenes + emotions
 
 node_indices = {name: i for i, name in enumerate(nodes)}
@@ -64,10 +67,10 @@ for role in roles:
 # 剧情→情感
 for _, row in scene_emotion.iterrows():
     source.append(node_indices[row['剧情阶段']])
-    target.append(node_indices[row['情感分类']])
+    target.append(node_indices[row[emotion_col]])
     value.append(row['count'])
-    label_info.append(f"剧情：{row['剧情阶段']}<br>情感：{row['情感分类']}<br>台词数量：{row['count']}")
-    link_color.append(emotion_colors_map.get(row['情感分类'], "lightgray"))
+    label_info.append(f"剧情：{row['剧情阶段']}<br>情感：{row[emotion_col]}<br>台词数量：{row['count']}")
+    link_color.append(emotion_colors_map.get(row[emotion_col], "lightgray"))
 
 # 绘制桑基图
 fig = go.Figure(data=[go.Sankey(
@@ -1,10 +1,13 @@
 import pandas as pd
-from snownlp import SnowNLP
 import matplotlib.pyplot as plt
 import jieba
 from collections import Counter
 import warnings
 
+from 情感词典 import add_emotion_columns
+from 情感评分 import score_sentiments
+from 新词发现 import load_jieba_userdict
+
 warnings.filterwarnings('ignore')
 
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
@@ -47,14 +50,8 @@ def analyze_dialogue_sentiment(file_path, stage_name):
 
     print(f"✔ 台词列：{dialogue_col} | 人物列：{speaker_col}")
 
-    # ===== 情感分析 =====
-    def get_sentiment(text):
-        try:
-            return SnowNLP(str(text)).sentiments
-        except:
-            return 0.5
-
-    df['情感得分'] = df[dialogue_col].apply(get_sentiment)
+    # ===== 情感分析（多进程批量评分）=====
+    df['情感得分'] = score_sentiments(df[dialogue_col])
 
     def classify_sentiment(score):
         if score > 0.6:
@@ -66,6 +63,9 @@ def analyze_dialogue_sentiment(file_path, stage_name):
 
     df['情感分类'] = df['情感得分'].apply(classify_sentiment)
 
+    # 细粒度情感类别（喜悦/愤怒/悲伤/恐惧/惊讶/厌恶/中性），供桑基图和关系图使用
+    add_emotion_columns(df, dialogue_col)
+
     # ===== 可视化 =====
     plt.figure(figsize=(12, 8))
 
@@ -93,6 +93,7 @@ def analyze_dialogue_sentiment(file_path, stage_name):
     # 高频词
     plt.subplot(2, 2, 4)
     text = ' '.join(df[dialogue_col].astype(str))
+    load_jieba_userdict()
     words = jieba.lcut(text)
     stopwords = ['的','了','在','是','我','你','他','她','这','那','也']
     words = [w for w in words if len(w) > 1 and w not in stopwords]
@@ -114,7 +115,7 @@ def analyze_dialogue_sentiment(file_path, stage_name):
     df.to_csv(output_name, index=False, encoding='utf-8-sig')
     print(f"✅ 已生成：{output_name}")
 
-    return df[['人物', '台词', '情感得分', '情感分类']]
+    return df[['人物', '台词', '情感得分', '情感分类', '情感类别', '情感标签']]
 
 
 # ===== 九个关键情节 =====
@@ -130,15 +131,17 @@ files = [
     ("九.csv", "真相揭晓")
 ]
 
-all_data = []
+# 评分使用进程池，Windows 下子进程会重新导入本文件，入口需放在 __main__ 下
+if __name__ == "__main__":
+    all_data = []
 
-for f, name in files:
-    df_stage = analyze_dialogue_sentiment(f, name)
-    df_stage['剧情阶段'] = name
-    all_data.append(df_stage)
+    for f, name in files:
+        df_stage = analyze_dialogue_sentiment(f, name)
+        df_stage['剧情阶段'] = name
+        all_data.append(df_stage)
 
-# ===== 合并总表（语义网络用）=====
-all_df = pd.concat(all_data, ignore_index=True)
-all_df.to_csv("全剧_台词_情感汇总.csv", index=False, encoding='utf-8-sig')
+    # ===== 合并总表（语义网络用）=====
+    all_df = pd.concat(all_data, ignore_index=True)
+    all_df.to_csv("全剧_台词_情感汇总.csv", index=False, encoding='utf-8-sig')
 
-print("\n🎯 已生成：全剧_台词_情感汇总.csv（用于语义网络 / 知识图谱）")
+    print("\n🎯 已生成：全剧_台词_情感汇总.csv（用于语义网络 / 知识图谱）")
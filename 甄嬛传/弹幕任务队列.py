@@ -0,0 +1,259 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# 默认队列文件，多台机器共享同一目录即可分工爬取
+DEFAULT_QUEUE_PATH = "弹幕任务队列.db"
+# 租约时长：工作进程超过这么久没有心跳，任务会被其他进程接手
+LEASE_SECONDS = 120
+# 单个任务最多尝试次数
+MAX_ATTEMPTS = 3
+
+# 任务状态
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+STATUS_NAMES = {PENDING: '待处理', RUNNING: '进行中', DONE: '已完成', FAILED: '失败'}
+
+
+def default_worker_id():
+    """工作进程标识：主机名-进程号"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class JobQueue:
+    """基于SQLite文件的任务队列 - 租约 + 心跳
+
+    - 领取任务时在一个写事务内完成查询和标记，多进程不会领到同一任务
+    - 进行中的任务需定期心跳续租，进程崩溃后租约过期，任务重新变为可领取
+    - 任务可设置 wait_group：该组任务全部结束后才能被领取（如分段下载完再合并）
+    """
+
+    def __init__(self, db_path=DEFAULT_QUEUE_PATH, lease_seconds=LEASE_SECONDS,
+                 max_attempts=MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # 手动控制事务；队列文件可能放在共享目录，不使用只支持单机的WAL模式
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None,
+                                    check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        """建表"""
+        with self._lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    job_key TEXT NOT NULL,
+                    job_group TEXT,
+                    wait_group TEXT,
+                    payload TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_expires REAL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL,
+                    updated_at REAL,
+                    UNIQUE (kind, job_key)
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+                CREATE INDEX IF NOT EXISTS idx_jobs_group ON jobs (job_group, status);
+            """)
+
+    @contextmanager
+    def _transaction(self):
+        """写事务：BEGIN IMMEDIATE 先拿写锁，避免两个进程同时领取"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def add_job(self, kind, key, payload=None, group=None, wait_group=None):
+        """添加任务，同类同 key 的任务已存在时忽略，返回是否新增"""
+        return self.add_jobs(kind, [key], payload, group, wait_group) == 1
+
+    def add_jobs(self, kind, keys, payload=None, group=None, wait_group=None):
+        """批量添加同类任务，返回新增数量"""
+        now = time.time()
+        payload_text = json.dumps(payload or {}, ensure_ascii=False)
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs "
+                "(kind, job_key, job_group, wait_group, payload, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(kind, key, group, wait_group, payload_text, now, now) for key in keys]
+            )
+            return conn.total_changes - before
+
+    def claim(self, worker_id, kinds=None):
+        """领取一个可执行的任务（待处理或租约已过期），没有则返回None"""
+        now = time.time()
+        kind_filter = ""
+        params = [now, self.max_attempts]
+        if kinds:
+            kind_filter = f" AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+
+        with self._transaction() as conn:
+            # 反复过期的任务不再重试
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = '租约多次过期', updated_at = ? "
+                "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT job_id, kind, job_key, job_group, payload, attempts FROM jobs "
+                "WHERE (status = 'pending' OR (status = 'running' AND lease_expires < ?)) "
+                "AND attempts < ?" + kind_filter + " "
+                "AND (wait_group IS NULL OR NOT EXISTS ("
+                "    SELECT 1 FROM jobs AS member WHERE member.job_group = jobs.wait_group "
+                "    AND member.status IN ('pending', 'running'))) "
+                "ORDER BY job_id LIMIT 1",
+                params
+            ).fetchone()
+            if row is None:
+                return None
+
+            job_id, kind, key, group, payload, attempts = row
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "lease_expires = ?, updated_at = ? WHERE job_id = ?",
+                (worker_id, now + self.lease_seconds, now, job_id)
+            )
+
+        return {
+            'job_id': job_id,
+            'kind': kind,
+            'key': key,
+            'group': group,
+            'payload': json.loads(payload or '{}'),
+            'attempt': attempts + 1,
+            'worker': worker_id,
+        }
+
+    def heartbeat(self, job):
+        """续租，返回False表示租约已被其他进程接手"""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE job_id = ? AND worker = ? AND status = 'running'",
+                (now + self.lease_seconds, now, job['job_id'], job['worker'])
+            )
+            return cursor.rowcount == 1
+
+    @contextmanager
+    def keep_alive(self, job, interval=None):
+        """任务执行期间在后台线程定期心跳"""
+        interval = interval or self.lease_seconds / 3
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                if not self.heartbeat(job):
+                    print(f"⚠️ 任务 {job['key']} 的租约已失效")
+                    return
+
+        thread = threading.Thread(target=beat, name='job-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield job
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, job, result=None):
+        """标记任务完成，返回False表示租约已失效（结果作废）"""
+        return self._finish(job, DONE, result=result)
+
+    def fail(self, job, error):
+        """任务失败：未达到最大次数时放回待处理，否则标记失败"""
+        status = PENDING if job['attempt'] < self.max_attempts else FAILED
+        return self._finish(job, status, error=str(error))
+
+    def _finish(self, job, status, result=None, error=None):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_expires = NULL, "
+                "updated_at = ? WHERE job_id = ? AND worker = ? AND status = 'running'",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job['job_id'], job['worker'])
+            )
+            return cursor.rowcount == 1
+
+    def retry_failed(self):
+        """失败的任务重新放回队列，返回数量"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, error = NULL, updated_at = ? "
+                "WHERE status = 'failed'",
+                (time.time(),)
+            )
+            return cursor.rowcount
+
+    def progress(self):
+        """各状态任务数 {kind: {status: count}}"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status"
+            ).fetchall()
+        summary = {}
+        for kind, status, count in rows:
+            summary.setdefault(kind, {})[status] = count
+        return summary
+
+    def unfinished(self):
+        """待处理和进行中的任务总数"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')"
+            ).fetchone()[0]
+
+    def next_lease_expiry(self):
+        """进行中任务最早的租约到期时间，没有进行中的任务时返回None"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT MIN(lease_expires) FROM jobs WHERE status = 'running'"
+            ).fetchone()[0]
+
+    def show_progress(self):
+        """打印队列进度"""
+        print(f"\n📋 任务队列进度 ({self.db_path}):")
+        summary = self.progress()
+        if not summary:
+            print("   队列为空")
+        for kind, counts in sorted(summary.items()):
+            detail = ' | '.join(f"{STATUS_NAMES[status]} {counts.get(status, 0)}"
+                                for status in (PENDING, RUNNING, DONE, FAILED))
+            print(f"   {kind}: {detail}")
+
+    def close(self):
+        """关闭数据库"""
+        with self._lock:
+            self.conn.close()
+
+
+if __name__ == "__main__":
+    # 查看队列进度
+    if not os.path.exists(DEFAULT_QUEUE_PATH):
+        print(f"任务队列不存在: {DEFAULT_QUEUE_PATH}")
+    else:
+        job_queue = JobQueue()
+        job_queue.show_progress()
+        job_queue.close()
@@ -0,0 +1,143 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+# 默认缓存文件（与弹幕CSV放在同一目录）
+DEFAULT_CACHE_PATH = "视频信息缓存.json"
+# 缓存有效期：已发布视频的cid、标题、UP主几乎不会变化
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+def compact_video_info(data):
+    """只保留爬虫用到的视频信息字段（含分P的全部cid）"""
+    owner = data.get('owner') or {}
+    return {
+        'bvid': data.get('bvid'),
+        'aid': data.get('aid'),
+        'cid': data.get('cid'),
+        'title': data.get('title'),
+        'owner': {'name': owner.get('name'), 'mid': owner.get('mid')},
+        'duration': data.get('duration'),
+        'pubdate': data.get('pubdate'),
+        'pages': [
+            {'cid': page.get('cid'), 'page': page.get('page'),
+             'part': page.get('part'), 'duration': page.get('duration')}
+            for page in data.get('pages') or []
+        ],
+    }
+
+
+def video_cids(video_info):
+    """视频所有分P的cid（单P视频只有一个）"""
+    cids = [page['cid'] for page in video_info.get('pages') or [] if page.get('cid')]
+    return cids or [video_info['cid']]
+
+
+def video_parts(video_info):
+    """按分P拆开的视频信息：每项的 cid、duration 为该P的值，多P时另有 page（P序号）和 part（分P标题）
+
+    单P视频返回只含原视频信息的列表。
+    """
+    pages = [page for page in video_info.get('pages') or [] if page.get('cid')]
+    if len(pages) <= 1:
+        return [video_info]
+    return [dict(video_info, cid=page['cid'], duration=page.get('duration') or video_info.get('duration'),
+                 page=page.get('page') or number, part=page.get('part'))
+            for number, page in enumerate(pages, 1)]
+
+
+class VideoInfoCache:
+    """视频信息磁盘缓存 - 以BV号为键，超过有效期后重新请求"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        """首次使用时读取缓存文件，损坏时当作空缓存"""
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 视频信息缓存读取失败，将重新获取: {e}")
+
+    def _save(self):
+        """先写临时文件再改名，避免中断时损坏缓存
+
+        临时文件名各进程唯一（多个队列工作进程共用缓存文件时互不干扰）；
+        写入失败只打印警告，缓存写不进去不影响爬取。
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + '.', suffix='.tmp',
+                                            dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ 视频信息缓存写入失败: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, bvid):
+        """读取未过期的视频信息，没有或已过期返回None"""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(bvid)
+            if entry and time.time() - entry['fetched_at'] < self.ttl:
+                self.hits += 1
+                return entry['data']
+            self.misses += 1
+            return None
+
+    def put(self, bvid, data):
+        """写入视频信息，返回精简后的记录"""
+        info = compact_video_info(data)
+        info['bvid'] = info['bvid'] or bvid
+        with self._lock:
+            self._load()
+            self._entries[bvid] = {'fetched_at': time.time(), 'data': info}
+            self._save()
+        return info
+
+    def invalidate(self, bvid=None):
+        """删除某个BV号的缓存，bvid为None时清空"""
+        with self._lock:
+            self._load()
+            if bvid is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(bvid, None)
+            self._save()
+
+    def show_stats(self):
+        """打印命中情况"""
+        total = self.hits + self.misses
+        if total:
+            print(f"🗂️ 视频信息缓存: 命中 {self.hits} 次，未命中 {self.misses} 次")
+
+
+if __name__ == "__main__":
+    # 查看缓存概况
+    cache = VideoInfoCache()
+    cache._load()
+    print(f"🗂️ 视频信息缓存: {DEFAULT_CACHE_PATH}")
+    print(f"   已缓存视频: {len(cache._entries)} 个")
+    now = time.time()
+    for bvid, entry in cache._entries.items():
+        info = entry['data']
+        age = (now - entry['fetched_at']) / 3600
+        status = "过期" if now - entry['fetched_at'] >= cache.ttl else "有效"
+        print(f"   {bvid}: {info['title']} | {len(video_cids(info))} P | {age:.1f}小时前 ({status})")
@@ -0,0 +1,180 @@
+import os
+from datetime import datetime
+
+from 弹幕字段 import COLOR_NAMES, MODE_NAMES, NORMAL_FONT_SIZE
+
+# pyarrow 为可选依赖：没有安装时仍可使用CSV输出
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# 每个行组的弹幕条数（写入时内存只保留一个行组）
+ROW_GROUP_SIZE = 50000
+
+
+def parquet_available():
+    """是否安装了 pyarrow"""
+    return pa is not None
+
+
+def danmu_schema():
+    """列式存储的弹幕表结构 - 只存原始数值，显示标签读取时再生成"""
+    return pa.schema([
+        ('出现时间秒', pa.float32()),
+        ('发送时间戳', pa.int64()),
+        ('颜色值', pa.uint32()),
+        ('模式值', pa.uint8()),
+        ('字号值', pa.uint8()),
+        ('用户哈希', pa.dictionary(pa.int32(), pa.string())),
+        ('弹幕内容', pa.string()),
+        ('弹幕ID', pa.int64()),
+    ])
+
+
+def _record_row_id(record):
+    try:
+        return int(record.row_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def write_danmu_parquet(danmu_records, filename, row_group_size=ROW_GROUP_SIZE):
+    """流式写入Parquet，返回写入条数（0条时不生成文件）"""
+    if not parquet_available():
+        raise ImportError("列式输出需要安装 pyarrow: pip install pyarrow")
+
+    schema = danmu_schema()
+    columns = {name: [] for name in schema.names}
+    writer = None
+    count = 0
+
+    def flush():
+        nonlocal writer
+        arrays = [
+            pa.array(columns['出现时间秒'], type=pa.float32()),
+            pa.array(columns['发送时间戳'], type=pa.int64()),
+            pa.array(columns['颜色值'], type=pa.uint32()),
+            pa.array(columns['模式值'], type=pa.uint8()),
+            pa.array(columns['字号值'], type=pa.uint8()),
+            pa.array(columns['用户哈希'], type=pa.string()).dictionary_encode(),
+            pa.array(columns['弹幕内容'], type=pa.string()),
+            pa.array(columns['弹幕ID'], type=pa.int64()),
+        ]
+        table = pa.Table.from_arrays(arrays, schema=schema)
+        if writer is None:
+            writer = pq.ParquetWriter(filename, schema, compression='zstd')
+        writer.write_table(table)
+        for values in columns.values():
+            values.clear()
+
+    try:
+        for record in danmu_records:
+            columns['出现时间秒'].append(record.appear_time)
+            columns['发送时间戳'].append(record.send_timestamp)
+            columns['颜色值'].append(record.color)
+            columns['模式值'].append(record.mode)
+            columns['字号值'].append(min(record.font_size, 255))
+            columns['用户哈希'].append(record.user_hash)
+            columns['弹幕内容'].append(record.content)
+            columns['弹幕ID'].append(_record_row_id(record))
+            count += 1
+            if count % row_group_size == 0:
+                flush()
+
+        if columns['弹幕内容']:
+            flush()
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return count
+
+
+def load_danmu_parquet(file_path, labels=True):
+    """读取Parquet弹幕为DataFrame，按需生成与CSV相同的显示列"""
+    # 只有读取时才需要pandas，爬虫端不依赖它
+    import numpy as np
+    import pandas as pd
+
+    df = pq.read_table(file_path).to_pandas()
+    df['出现时间秒'] = df['出现时间秒'].astype('float64').round(2)
+    df['弹幕长度'] = df['弹幕内容'].str.len()
+
+    if not labels:
+        return df
+
+    # 时间戳按本地时区显示，与爬虫 datetime.fromtimestamp 一致
+    local_tz = datetime.now().astimezone().tzinfo
+    send_time = pd.to_datetime(df['发送时间戳'], unit='s', utc=True).dt.tz_convert(local_tz)
+    df['发送日期'] = send_time.dt.strftime('%Y-%m-%d')
+    df['发送时间'] = send_time.dt.strftime('%H:%M:%S')
+    df['发送年份'] = send_time.dt.year
+
+    appear = df['出现时间秒']
+    minutes = (appear // 60).astype('int64').astype(str)
+    seconds = (appear % 60).astype('int64').astype(str).str.zfill(2)
+    df['时间位置'] = minutes + ':' + seconds
+
+    # 颜色、模式只有少量不同取值，先对唯一值建表再映射
+    color_hex = {value: f"#{value:06X}" for value in df['颜色值'].unique()}
+    df['颜色代码'] = df['颜色值'].map(color_hex)
+    df['弹幕颜色'] = df['颜色代码'].map(COLOR_NAMES).fillna('其他颜色')
+    mode_names = {value: MODE_NAMES.get(value, f"模式{value}") for value in df['模式值'].unique()}
+    df['弹幕模式'] = df['模式值'].map(mode_names)
+    df['字体大小'] = np.where(df['字号值'] == NORMAL_FONT_SIZE, '正常',
+                         np.where(df['字号值'] > NORMAL_FONT_SIZE, '较大', '较小'))
+
+    # 用户哈希是字典编码的分类列，只需处理各个不同的取值
+    users = df['用户哈希'].astype('category')
+    short_ids = np.asarray(users.cat.categories.astype(str).str[:8] + '...', dtype=object)
+    df['用户ID'] = short_ids[users.cat.codes.to_numpy()]
+
+    return df
+
+
+def find_parquet(file_path, parquet_path=None):
+    """确定要读取的Parquet文件，没有可用的列式数据时返回None
+
+    依次使用：显式传入的 parquet_path、file_path 本身是 .parquet 文件、CSV旁的同名 .parquet 文件。
+    """
+    if parquet_path is None and os.path.splitext(file_path)[1].lower() == '.parquet':
+        parquet_path = file_path
+    if parquet_path is not None:
+        # 明确要求读取Parquet时不能退回CSV
+        if not parquet_available():
+            raise ImportError("读取列式数据需要安装 pyarrow: pip install pyarrow")
+        return parquet_path
+
+    same_name = os.path.splitext(file_path)[0] + '.parquet'
+    if parquet_available() and os.path.exists(same_name):
+        return same_name
+    return None
+
+
+def load_danmu_table(file_path, labels=True, parquet_path=None):
+    """读取弹幕数据：优先使用Parquet文件（见 find_parquet），否则读取CSV"""
+    import pandas as pd
+
+    parquet_path = find_parquet(file_path, parquet_path)
+    if parquet_path is not None:
+        print(f"读取列式数据: {parquet_path}")
+        return load_danmu_parquet(parquet_path, labels=labels)
+
+    return pd.read_csv(file_path, encoding='utf-8-sig')
+
+
+def iter_danmu_table(file_path, columns=None, chunk_rows=ROW_GROUP_SIZE, parquet_path=None):
+    """分块读取弹幕数据（只读需要的列），逐块产生DataFrame，内存只保留一块"""
+    import pandas as pd
+
+    parquet_path = find_parquet(file_path, parquet_path)
+    if parquet_path is not None:
+        parquet_file = pq.ParquetFile(parquet_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    yield from pd.read_csv(file_path, encoding='utf-8-sig', usecols=columns, chunksize=chunk_rows)
@@ -0,0 +1,244 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import 弹幕爬取 as crawler
+from 弹幕元数据缓存 import VideoInfoCache
+from 弹幕模拟服务器 import MockConfig, serve_in_process, serve_live_in_process
+from 弹幕请求调度 import RequestScheduler
+from 直播弹幕采集 import LiveDanmuIngester
+
+# 与基准相比吞吐量下降超过该比例视为性能回退
+DEFAULT_TOLERANCE = 0.2
+
+
+def peak_rss_mb():
+    """当前进程的峰值内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def latency_percentiles(scheduler):
+    """合并各接口的延迟样本计算总体分位数"""
+    samples = sorted(latency for stats in scheduler.stats.values() for latency in stats.latencies)
+    if not samples:
+        return 0.0, 0.0
+
+    def percentile(q):
+        return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))]
+
+    return percentile(50), percentile(99)
+
+
+def run_load_test(videos=50, danmu_per_video=3000, segmented=False, max_workers=8, max_rate=1000.0,
+                  latency=0.02, jitter=0.0, error_rate=0.0, encoding='utf-8', mojibake_rate=0.0,
+                  quiet=True):
+    """启动模拟服务器并驱动批量爬虫，返回压测指标"""
+    config = MockConfig(danmu_per_video=danmu_per_video, latency=latency, jitter=jitter,
+                        error_rate=error_rate, encoding=encoding, mojibake_rate=mojibake_rate)
+
+    # 服务器放在子进程，峰值内存只统计爬虫
+    ready = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve_in_process, args=(config, ready, stop), daemon=True)
+    server.start()
+    api_base = ready.get(timeout=30)
+
+    # 每次压测使用新的调度器和空缓存，在临时目录中运行（分段缓存等不影响下次）
+    crawler.scheduler = RequestScheduler(max_rate=max_rate, burst=max(10, int(max_rate)))
+    bvids = [f"BV1LoadTest{i:05d}" for i in range(videos)]
+    old_cwd = os.getcwd()
+    output = io.StringIO()
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.chdir(work_dir)
+            try:
+                crawler.video_cache = VideoInfoCache()
+                redirect = contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext()
+                with redirect:
+                    summary = crawler.batch_danmu_crawler(bvids, max_workers=max_workers,
+                                                          api_base=api_base, save=False,
+                                                          segmented=segmented)
+            finally:
+                # 切回原目录后临时目录才能删除
+                os.chdir(old_cwd)
+    finally:
+        stop.set()
+        server.join(timeout=10)
+
+    requests_total = sum(row['请求数'] for row in summary['metrics'])
+    errors_total = sum(row['错误数'] for row in summary['metrics'])
+    p50, p99 = latency_percentiles(crawler.scheduler)
+    return {
+        'videos': videos,
+        'danmu_per_video': danmu_per_video,
+        'segmented': segmented,
+        'workers': max_workers,
+        'success': summary['success'],
+        'total_danmu': summary['total_danmu'],
+        'elapsed': round(summary['elapsed'], 3),
+        'requests': requests_total,
+        'errors': errors_total,
+        'requests_per_sec': round(requests_total / summary['elapsed'], 1),
+        'danmu_per_sec': round(summary['danmu_per_sec'], 1),
+        'p50_latency': round(p50, 4),
+        'p99_latency': round(p99, 4),
+        'peak_rss_mb': None if peak_rss_mb() is None else round(peak_rss_mb(), 1),
+        'endpoints': summary['metrics'],
+    }
+
+
+def show_load_test(result):
+    """打印压测结果"""
+    print(f"\n🏁 压测结果 ({result['videos']} 个视频 × {result['danmu_per_video']} 条弹幕, "
+          f"{'分段接口' if result['segmented'] else 'list.so'}, 并发 {result['workers']})")
+    print(f"   成功视频: {result['success']}/{result['videos']} | 弹幕总数: {result['total_danmu']:,} | "
+          f"用时: {result['elapsed']:.2f} 秒")
+    print(f"   请求: {result['requests']} 次 ({result['requests_per_sec']:.1f} 次/秒) | "
+          f"错误: {result['errors']} 次")
+    print(f"   弹幕吞吐: {result['danmu_per_sec']:,.1f} 条/秒")
+    print(f"   延迟: P50 {result['p50_latency'] * 1000:.1f} ms | P99 {result['p99_latency'] * 1000:.1f} ms")
+    if result['peak_rss_mb'] is not None:
+        print(f"   峰值内存: {result['peak_rss_mb']:.1f} MB")
+    for row in result['endpoints']:
+        print(f"   {row['接口']}: 请求 {row['请求数']} | P50 {row['P50延迟秒'] * 1000:.1f} ms | "
+              f"P99 {row['P99延迟秒'] * 1000:.1f} ms")
+
+
+def run_live_load_test(total=200000, per_packet=20, timeout=300.0, quiet=True):
+    """启动模拟直播服务器，用直播采集器接收 total 条弹幕，返回吞吐指标"""
+    ready = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve_live_in_process, args=(total, per_packet, ready, stop),
+                                     daemon=True)
+    server.start()
+    url = ready.get(timeout=30)
+
+    old_cwd = os.getcwd()
+    output = io.StringIO()
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.chdir(work_dir)
+            try:
+                ingester = LiveDanmuIngester(0, output='直播压测.csv', url=url, token='')
+                redirect = contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext()
+                with redirect:
+                    runner = threading.Thread(target=ingester.run, name='live-load-test', daemon=True)
+                    start = time.perf_counter()
+                    runner.start()
+                    # 收齐后立即停止，吞吐量只统计接收这些弹幕的时间
+                    while ingester.stats['received'] < total and runner.is_alive():
+                        if time.perf_counter() - start > timeout:
+                            break
+                        time.sleep(0.01)
+                    elapsed = time.perf_counter() - start
+                    ingester.stop()
+                    runner.join()
+                file_size = os.path.getsize(ingester.output) if os.path.exists(ingester.output) else 0
+            finally:
+                os.chdir(old_cwd)
+    finally:
+        stop.set()
+        server.join(timeout=10)
+
+    stats = ingester.stats
+    return {
+        'mode': 'live',
+        'total': total,
+        'per_packet': per_packet,
+        'received': stats['received'],
+        'written': stats['written'],
+        'connections': stats['connections'],
+        'backpressure_waits': stats['backpressure_waits'],
+        'elapsed': round(elapsed, 3),
+        'messages_per_sec': round(stats['received'] / elapsed, 1),
+        'output_mb': round(file_size / (1024 * 1024), 1),
+        'peak_rss_mb': None if peak_rss_mb() is None else round(peak_rss_mb(), 1),
+    }
+
+
+def show_live_load_test(result):
+    """打印直播采集压测结果"""
+    print(f"\n🏁 直播采集压测结果 ({result['total']:,} 条弹幕, 每包 {result['per_packet']} 条)")
+    print(f"   接收: {result['received']:,} | 写入: {result['written']:,} | 连接 {result['connections']} 次 | "
+          f"用时: {result['elapsed']:.2f} 秒")
+    print(f"   吞吐: {result['messages_per_sec']:,.1f} 条/秒 | 队列背压等待: {result['backpressure_waits']} 次")
+    print(f"   输出文件: {result['output_mb']:.1f} MB")
+    if result['peak_rss_mb'] is not None:
+        print(f"   峰值内存: {result['peak_rss_mb']:.1f} MB")
+
+
+def compare_with_baseline(result, baseline_path, tolerance=DEFAULT_TOLERANCE):
+    """与基准结果比较，吞吐量下降超过容忍度时返回False"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    ok = True
+    print(f"\n📐 与基准比较 ({baseline_path}, 容忍度 {tolerance:.0%}):")
+    metrics = ((('messages_per_sec', '直播弹幕吞吐'),) if result.get('mode') == 'live'
+               else (('danmu_per_sec', '弹幕吞吐'), ('requests_per_sec', '请求速率')))
+    for key, name in metrics:
+        change = result[key] / baseline[key] - 1 if baseline.get(key) else 0.0
+        regressed = change < -tolerance
+        ok = ok and not regressed
+        print(f"   {'❌' if regressed else '✅'} {name}: {baseline[key]:,.1f} → {result[key]:,.1f} ({change:+.1%})")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="弹幕爬虫离线压测（模拟B站接口）")
+    parser.add_argument('--videos', type=int, default=50)
+    parser.add_argument('--danmu', type=int, default=3000, help="每个视频的弹幕条数")
+    parser.add_argument('--segmented', action='store_true', help="使用分段接口")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=1000.0, help="每秒最大请求数")
+    parser.add_argument('--latency', type=float, default=0.02, help="模拟接口延迟（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--encoding', default='utf-8', choices=['utf-8', 'gbk'])
+    parser.add_argument('--mojibake-rate', type=float, default=0.0)
+    parser.add_argument('--verbose', action='store_true', help="显示爬虫输出")
+    parser.add_argument('--save', help="把结果保存为JSON（可作为基准）")
+    parser.add_argument('--baseline', help="与基准JSON比较，性能回退时返回非零退出码")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--live', action='store_true', help="压测直播弹幕采集（模拟WebSocket服务器）")
+    parser.add_argument('--live-total', type=int, default=200000, help="直播压测的弹幕总数")
+    parser.add_argument('--per-packet', type=int, default=20, help="直播压测每个压缩包的弹幕条数")
+    args = parser.parse_args()
+
+    if args.live:
+        result = run_live_load_test(total=args.live_total, per_packet=args.per_packet,
+                                    quiet=not args.verbose)
+        show_live_load_test(result)
+    else:
+        result = run_load_test(videos=args.videos, danmu_per_video=args.danmu,
+                               segmented=args.segmented,
+                               max_workers=args.workers, max_rate=args.rate, latency=args.latency,
+                               jitter=args.jitter, error_rate=args.error_rate, encoding=args.encoding,
+                               mojibake_rate=args.mojibake_rate, quiet=not args.verbose)
+        show_load_test(result)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"✅ 结果已保存到 {args.save}")
+
+    if args.baseline and not compare_with_baseline(result, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# 默认存档目录：objects/ 下按内容哈希存放压缩后的原始响应，index.db 记录抓取信息
+DEFAULT_ARCHIVE_DIR = "弹幕原始存档"
+
+
+def archive_exists(root=DEFAULT_ARCHIVE_DIR):
+    """存档目录下是否已有索引（还没存档过任何响应时为False）"""
+    return os.path.exists(os.path.join(root, 'index.db'))
+
+
+class ArchiveWriter:
+    """边下载边写入存档：同时计算哈希和gzip压缩，不在内存中保留完整响应"""
+
+    def __init__(self, archive, **meta):
+        self.archive = archive
+        self.meta = meta
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.tmp_path = os.path.join(archive.tmp_dir, f"{os.getpid()}_{threading.get_ident()}_{id(self)}.gz")
+        self._file = gzip.open(self.tmp_path, 'wb', compresslevel=6)
+
+    def write(self, chunk):
+        self.hasher.update(chunk)
+        self.size += len(chunk)
+        self._file.write(chunk)
+
+    def commit(self):
+        """完成写入，返回内容哈希"""
+        self._file.close()
+        digest = self.hasher.hexdigest()
+        self.archive._store_object(self.tmp_path, digest)
+        self.archive._record(digest, self.size, self.meta)
+        return digest
+
+    def discard(self):
+        """放弃写入（下载中断时）"""
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class ResponseArchive:
+    """原始响应存档 - 内容寻址、gzip压缩，索引记录接口、cid、分段和抓取时间
+
+    相同内容只保存一份；索引中每次抓取一行，重放时取每个 (cid, 接口, 分段) 的最新一次。
+    """
+
+    def __init__(self, root=DEFAULT_ARCHIVE_DIR, readonly=False):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.readonly = readonly
+        if readonly and not archive_exists(root):
+            # 只读时不创建空索引，由调用方提示“存档不存在”
+            raise FileNotFoundError(f"存档不存在: {root}")
+        if not readonly:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            os.makedirs(self.tmp_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, 'index.db'), timeout=30,
+                                    check_same_thread=False)
+        if not readonly:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self._create_tables()
+
+    def _create_tables(self):
+        """建表"""
+        with self._lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sha256 TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    cid INTEGER,
+                    bvid TEXT,
+                    part TEXT,
+                    url TEXT,
+                    status INTEGER,
+                    content_type TEXT,
+                    size INTEGER,
+                    fetched_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_responses_cid ON responses (cid, endpoint);
+            """)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest + '.gz')
+
+    def _store_object(self, tmp_path, digest):
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+    def _record(self, digest, size, meta):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO responses (sha256, endpoint, cid, bvid, part, url, status, "
+                "content_type, size, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest, meta.get('endpoint'), meta.get('cid'), meta.get('bvid'),
+                 None if meta.get('part') is None else str(meta['part']), meta.get('url'),
+                 meta.get('status', 200), meta.get('content_type'), size, time.time())
+            )
+
+    def writer(self, endpoint, cid, bvid=None, part=None, url=None, content_type=None, status=200):
+        """流式写入一个响应"""
+        return ArchiveWriter(self, endpoint=endpoint, cid=cid, bvid=bvid, part=part, url=url,
+                             content_type=content_type, status=status)
+
+    def put(self, payload, endpoint, cid, bvid=None, part=None, url=None, content_type=None,
+            status=200):
+        """写入一个完整响应，返回内容哈希"""
+        writer = self.writer(endpoint, cid, bvid, part, url, content_type, status)
+        writer.write(payload)
+        return writer.commit()
+
+    def read(self, digest):
+        """读取并解压一个响应"""
+        with open(self.object_path(digest), 'rb') as f:
+            return zlib.decompress(f.read(), 16 + zlib.MAX_WBITS)
+
+    def latest_responses(self, endpoints=None):
+        """每个 (cid, 接口, 分段) 最新一次抓取的索引记录，按cid分组 {cid: [记录, ...]}"""
+        sql = (
+            "SELECT r.cid, r.bvid, r.endpoint, r.part, r.sha256, r.content_type, r.fetched_at "
+            "FROM responses AS r JOIN ("
+            "    SELECT MAX(id) AS id FROM responses WHERE status = 200 "
+            "    GROUP BY cid, endpoint, part"
+            ") AS latest ON r.id = latest.id"
+        )
+        params = []
+        if endpoints:
+            sql += f" WHERE r.endpoint IN ({','.join('?' * len(endpoints))})"
+            params.extend(endpoints)
+        sql += " ORDER BY r.cid, r.endpoint, r.part"
+
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+
+        grouped = {}
+        for cid, bvid, endpoint, part, digest, content_type, fetched_at in rows:
+            grouped.setdefault(cid, []).append({
+                'cid': cid, 'bvid': bvid, 'endpoint': endpoint, 'part': part,
+                'sha256': digest, 'content_type': content_type, 'fetched_at': fetched_at,
+            })
+        return grouped
+
+    def stats(self):
+        """存档概况：抓取次数、不同内容数、原始总字节数"""
+        with self._lock:
+            fetches, objects, raw_bytes = self.conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT sha256), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {'fetches': fetches, 'objects': objects, 'raw_bytes': raw_bytes}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+if __name__ == "__main__":
+    # 查看存档概况
+    if not archive_exists():
+        print(f"存档不存在: {DEFAULT_ARCHIVE_DIR}")
+    else:
+        archive = ResponseArchive(readonly=True)
+        info = archive.stats()
+        print(f"🗄️ 原始响应存档: {DEFAULT_ARCHIVE_DIR}")
+        print(f"   抓取次数: {info['fetches']:,} | 不同内容: {info['objects']:,} | "
+              f"原始大小: {info['raw_bytes']:,} 字节")
+        print(f"   视频数: {len(archive.latest_responses()):,}")
+        archive.close()
@@ -0,0 +1,229 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from 弹幕字段 import SAVE_FIELDS
+
+# 默认数据库文件（与弹幕CSV放在同一目录）
+DEFAULT_DB_PATH = "弹幕增量库.db"
+
+# 写入库中的弹幕字段（与CSV保存字段一致）
+RECORD_FIELDS = SAVE_FIELDS
+
+
+class DanmuStateStore:
+    """弹幕增量状态库 - 以 (cid, 弹幕ID) 为主键记录已入库的弹幕"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        # 批量模式下多个线程共用一个连接，写入时加锁
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        """建表"""
+        with self._lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    started_at REAL NOT NULL,
+                    finished_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS videos (
+                    cid INTEGER PRIMARY KEY,
+                    bvid TEXT,
+                    title TEXT,
+                    last_run_id INTEGER,
+                    last_crawl_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS danmu (
+                    cid INTEGER NOT NULL,
+                    row_id TEXT NOT NULL,
+                    bvid TEXT,
+                    run_id INTEGER NOT NULL,
+                    appear_time REAL,
+                    send_timestamp INTEGER,
+                    content TEXT,
+                    record TEXT NOT NULL,
+                    PRIMARY KEY (cid, row_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_danmu_run ON danmu (run_id);
+                CREATE TABLE IF NOT EXISTS backfill_days (
+                    cid INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    danmu_count INTEGER,
+                    finished_at REAL,
+                    PRIMARY KEY (cid, day)
+                );
+            """)
+
+    def start_run(self):
+        """开始一次爬取，返回运行编号"""
+        with self._lock, self.conn:
+            cursor = self.conn.execute("INSERT INTO runs (started_at) VALUES (?)", (time.time(),))
+            return cursor.lastrowid
+
+    def finish_run(self, run_id):
+        """结束一次爬取"""
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?",
+                              (time.time(), run_id))
+
+    def last_run_id(self, finished_only=True):
+        """最近一次（已完成的）运行编号，没有则返回None"""
+        sql = "SELECT MAX(run_id) FROM runs"
+        if finished_only:
+            sql += " WHERE finished_at IS NOT NULL"
+        with self._lock:
+            row = self.conn.execute(sql).fetchone()
+        return row[0] if row else None
+
+    def ingest(self, records, cid, bvid, run_id, stats=None, title=None, batch_size=500):
+        """按批写入弹幕，只产出库中尚不存在的新弹幕（生成器）
+
+        stats 字典累计 seen（处理条数）和 new（新增条数）。
+        """
+        if stats is None:
+            stats = {}
+        stats.setdefault('seen', 0)
+        stats.setdefault('new', 0)
+
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield from self._ingest_batch(batch, cid, bvid, run_id, stats)
+                batch = []
+        if batch:
+            yield from self._ingest_batch(batch, cid, bvid, run_id, stats)
+
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO videos (cid, bvid, title, last_run_id, last_crawl_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(cid) DO UPDATE SET bvid = excluded.bvid, "
+                "title = COALESCE(excluded.title, videos.title), "
+                "last_run_id = excluded.last_run_id, last_crawl_at = excluded.last_crawl_at",
+                (cid, bvid, title, run_id, time.time())
+            )
+
+    def _ingest_batch(self, batch, cid, bvid, run_id, stats):
+        """写入一批弹幕，返回其中的新弹幕"""
+        stats['seen'] += len(batch)
+
+        # 批内去重（同一弹幕ID只保留第一条）
+        unique = {}
+        for record in batch:
+            unique.setdefault(str(record.row_id), record)
+
+        placeholders = ','.join('?' * len(unique))
+        with self._lock, self.conn:
+            existing = {
+                row[0] for row in self.conn.execute(
+                    f"SELECT row_id FROM danmu WHERE cid = ? AND row_id IN ({placeholders})",
+                    [cid, *unique.keys()]
+                )
+            }
+            new_records = [record for row_id, record in unique.items() if row_id not in existing]
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO danmu "
+                "(cid, row_id, bvid, run_id, appear_time, send_timestamp, content, record) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (cid, str(record.row_id), bvid, run_id, record.appear_seconds,
+                     record.send_timestamp, record.content,
+                     json.dumps(dict(zip(RECORD_FIELDS, record.csv_row())), ensure_ascii=False))
+                    for record in new_records
+                ]
+            )
+
+        stats['new'] += len(new_records)
+        return new_records
+
+    def discard_ingest(self, cid, run_id):
+        """撤销某次运行对一个cid的入库（输出文件没有写成时调用），返回撤销的弹幕条数
+
+        这些弹幕下次增量运行会重新获取；这次运行中记下的历史回溯日期也一并撤销。
+        """
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT started_at FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            deleted = self.conn.execute("DELETE FROM danmu WHERE cid = ? AND run_id = ?",
+                                        (cid, run_id)).rowcount
+            if row is not None:
+                self.conn.execute("DELETE FROM backfill_days WHERE cid = ? AND finished_at >= ?",
+                                  (cid, row[0]))
+        return deleted
+
+    def backfilled_days(self, cid):
+        """历史回溯中已完成的日期集合"""
+        with self._lock:
+            rows = self.conn.execute("SELECT day FROM backfill_days WHERE cid = ?", (cid,)).fetchall()
+        return {row[0] for row in rows}
+
+    def mark_day_backfilled(self, cid, day, danmu_count):
+        """记录某天的历史弹幕已入库（回溯进度）"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO backfill_days (cid, day, danmu_count, finished_at) "
+                "VALUES (?, ?, ?, ?)",
+                (cid, day, danmu_count, time.time())
+            )
+
+    def load_since(self, run_id=None, cid=None):
+        """读取某次运行之后（含该次）新增的弹幕记录
+
+        run_id 为None时读取最近一次运行新增的弹幕。
+        """
+        if run_id is None:
+            run_id = self.last_run_id(finished_only=False)
+            if run_id is None:
+                return []
+
+        sql = "SELECT cid, bvid, record FROM danmu WHERE run_id >= ?"
+        params = [run_id]
+        if cid is not None:
+            sql += " AND cid = ?"
+            params.append(cid)
+        sql += " ORDER BY cid, appear_time"
+
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+
+        records = []
+        for row_cid, row_bvid, record in rows:
+            data = json.loads(record)
+            data['cid'] = row_cid
+            data['bvid'] = row_bvid
+            records.append(data)
+        return records
+
+    def count(self, cid=None):
+        """库中弹幕总数"""
+        with self._lock:
+            if cid is None:
+                return self.conn.execute("SELECT COUNT(*) FROM danmu").fetchone()[0]
+            return self.conn.execute("SELECT COUNT(*) FROM danmu WHERE cid = ?", (cid,)).fetchone()[0]
+
+    def close(self):
+        """关闭数据库"""
+        with self._lock:
+            self.conn.close()
+
+
+if __name__ == "__main__":
+    # 查看增量库概况
+    if not os.path.exists(DEFAULT_DB_PATH):
+        print(f"增量库不存在: {DEFAULT_DB_PATH}")
+    else:
+        store = DanmuStateStore()
+        last_run = store.last_run_id()
+        print(f"📦 增量库: {DEFAULT_DB_PATH}")
+        print(f"   弹幕总数: {store.count():,} 条")
+        print(f"   最近一次运行: {last_run}")
+        if last_run is not None:
+            print(f"   最近一次新增: {len(store.load_since(last_run)):,} 条")
+        store.close()
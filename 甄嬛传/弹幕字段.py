@@ -0,0 +1,193 @@
+# 弹幕字段定义与显示标签 - 爬虫、存储和分析脚本共用
+
+from datetime import datetime
+
+# 保存到CSV的字段（不含调试字段）
+SAVE_FIELDS = [
+    '发送日期', '发送时间', '发送年份', '时间位置',
+    '出现时间秒', '弹幕内容', '用户ID', '弹幕颜色',
+    '颜色代码', '弹幕模式', '字体大小', '弹幕长度', '弹幕ID'
+]
+
+# 常用弹幕颜色的中文名称
+COLOR_NAMES = {
+    '#FFFFFF': '白色',
+    '#000000': '黑色',
+    '#FF0000': '红色',
+    '#FF5E5E': '浅红色',
+    '#E70012': '深红色',
+    '#FFAEC9': '粉红色',
+    '#FF7F27': '橙色',
+    '#FFC90E': '黄色',
+    '#FEF102': '亮黄色',
+    '#22B14C': '绿色',
+    '#90C320': '浅绿色',
+    '#00A2E8': '蓝色',
+    '#3F48CC': '深蓝色',
+    '#1D9AA5': '青色',
+    '#A349A4': '紫色',
+    '#B97A57': '棕色',
+    '#7F7F7F': '灰色',
+    '#C3C3C3': '浅灰色'
+}
+
+# 颜色整数值 -> 中文名称（解码时直接查表，不必先转成十六进制）
+COLOR_NAME_BY_VALUE = {int(color_hex[1:], 16): name for color_hex, name in COLOR_NAMES.items()}
+
+# 弹幕模式
+MODE_NAMES = {1: '滚动弹幕', 4: '底部弹幕', 5: '顶部弹幕'}
+
+# 默认字号
+NORMAL_FONT_SIZE = 25
+
+
+def color_to_hex(color):
+    """颜色整数值转十六进制颜色代码"""
+    return f"#{color:06X}"
+
+
+def color_to_chinese(color_hex):
+    """将十六进制颜色转换为中文颜色名称"""
+    return COLOR_NAMES.get(color_hex.upper(), '其他颜色')
+
+
+def mode_to_chinese(mode):
+    """弹幕模式描述"""
+    return MODE_NAMES.get(mode, f"模式{mode}")
+
+
+def font_size_to_chinese(font_size):
+    """字体大小描述"""
+    if font_size == NORMAL_FONT_SIZE:
+        return "正常"
+    return "较大" if font_size > NORMAL_FONT_SIZE else "较小"
+
+
+def format_time_pos(appear_time):
+    """视频内出现时间格式化为 分:秒"""
+    minutes = int(appear_time // 60)
+    seconds = int(appear_time % 60)
+    return f"{minutes}:{seconds:02d}"
+
+
+class DanmuRecord:
+    """单条弹幕 - 只保存原始值，显示字段在写入或预览时才计算
+
+    兼容原先的字典记录：record['发送日期'] 等中文键仍可读取。
+    """
+
+    __slots__ = ('appear_time', 'mode', 'font_size', 'color', 'send_timestamp',
+                 'send_year', 'timestamp_str', 'user_hash', 'content', 'row_id')
+
+    def __init__(self, appear_time, mode, font_size, color, send_timestamp,
+                 send_year, timestamp_str, user_hash, content, row_id):
+        self.appear_time = appear_time
+        self.mode = mode
+        self.font_size = font_size
+        self.color = color
+        self.send_timestamp = send_timestamp
+        self.send_year = send_year
+        self.timestamp_str = timestamp_str
+        self.user_hash = user_hash
+        self.content = content
+        self.row_id = row_id
+
+    @property
+    def send_time(self):
+        return datetime.fromtimestamp(self.send_timestamp)
+
+    @property
+    def send_date(self):
+        return self.send_time.strftime('%Y-%m-%d')
+
+    @property
+    def send_clock(self):
+        return self.send_time.strftime('%H:%M:%S')
+
+    @property
+    def appear_seconds(self):
+        return round(self.appear_time, 2)
+
+    @property
+    def time_pos(self):
+        return format_time_pos(self.appear_time)
+
+    @property
+    def user_id(self):
+        return self.user_hash[:8] + '...'
+
+    @property
+    def color_hex(self):
+        return color_to_hex(self.color)
+
+    @property
+    def color_name(self):
+        return COLOR_NAME_BY_VALUE.get(self.color, '其他颜色')
+
+    @property
+    def mode_name(self):
+        return mode_to_chinese(self.mode)
+
+    @property
+    def font_size_name(self):
+        return font_size_to_chinese(self.font_size)
+
+    @property
+    def length(self):
+        return len(self.content)
+
+    def csv_row(self):
+        """按 SAVE_FIELDS 顺序生成CSV行（发送时间只换算一次）"""
+        send_time = self.send_time
+        return [
+            send_time.strftime('%Y-%m-%d'),
+            send_time.strftime('%H:%M:%S'),
+            self.send_year,
+            self.time_pos,
+            self.appear_seconds,
+            self.content,
+            self.user_id,
+            self.color_name,
+            self.color_hex,
+            self.mode_name,
+            self.font_size_name,
+            len(self.content),
+            self.row_id,
+        ]
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, RECORD_KEYS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        attr = RECORD_KEYS.get(key)
+        return getattr(self, attr) if attr else default
+
+    def __repr__(self):
+        return f"DanmuRecord({self.row_id}, {self.appear_time:.2f}s, {self.content!r})"
+
+
+# 中文字段名 -> DanmuRecord 属性
+RECORD_KEYS = {
+    '发送日期': 'send_date',
+    '发送时间': 'send_clock',
+    '发送年份': 'send_year',
+    '时间位置': 'time_pos',
+    '出现时间秒': 'appear_seconds',
+    '弹幕内容': 'content',
+    '用户ID': 'user_id',
+    '弹幕颜色': 'color_name',
+    '颜色代码': 'color_hex',
+    '弹幕模式': 'mode_name',
+    '字体大小': 'font_size_name',
+    '弹幕长度': 'length',
+    '弹幕ID': 'row_id',
+    '原始时间戳': 'timestamp_str',
+    '发送时间戳': 'send_timestamp',
+    '原始颜色': 'color',
+    '原始模式': 'mode',
+    '原始字号': 'font_size',
+    '原始用户哈希': 'user_hash',
+}
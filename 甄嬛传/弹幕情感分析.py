@@ -1,5 +1,4 @@
 import pandas as pd
-from snownlp import SnowNLP
 import matplotlib.pyplot as plt
 import seaborn as sns
 from wordcloud import WordCloud
@@ -7,14 +6,22 @@ import jieba
 from collections import Counter
 import warnings
 import os
+import sys
 
+from 弹幕列式存储 import load_danmu_table
+from 情感词典 import add_emotion_columns
+from 情感评分 import score_sentiments
+from 情感趋势 import DEFAULT_SMOOTH_SECONDS, SentimentTrend
+from 新词发现 import load_jieba_userdict
 
-def analyze_danmu_sentiment(file_path):
+
+def analyze_danmu_sentiment(file_path, parquet_path=None):
     """
     对弹幕数据进行情感分析并生成可视化报告
 
     参数:
-    file_path (str): CSV文件路径
+    file_path (str): CSV文件路径，也可以直接传入爬虫生成的 .parquet 文件
+    parquet_path (str): 可选，与CSV对应的Parquet文件路径（文件名与CSV不同时使用）
     """
     warnings.filterwarnings('ignore')
 
@@ -24,17 +31,12 @@ def analyze_danmu_sentiment(file_path):
     plt.rcParams['font.sans-serif'] = ['SimHei']  # Windows
     # 1. 读取数据
     print("正在读取数据...")
-    df = pd.read_csv(file_path, encoding='utf-8-sig')
-
-    # 2. 情感分析函数
-    def get_sentiment(text):
-        try:
-            return SnowNLP(text).sentiments
-        except:
-            return 0.5
+    # 有Parquet列式文件时优先读取（更小、更快）
+    df = load_danmu_table(file_path, labels=False, parquet_path=parquet_path)
 
+    # 2. 情感分析（多进程批量评分）
     print("正在进行情感分析...")
-    df['情感得分'] = df['弹幕内容'].apply(get_sentiment)
+    df['情感得分'] = score_sentiments(df['弹幕内容'], verbose=True)
 
     # 3. 情感分类
     def classify_sentiment(score):
@@ -46,6 +48,8 @@ def analyze_danmu_sentiment(file_path):
             return '中性'
 
     df['情感分类'] = df['情感得分'].apply(classify_sentiment)
+    # 细粒度情感类别（喜悦/愤怒/悲伤/恐惧/惊讶/厌恶/中性）
+    add_emotion_columns(df, '弹幕内容')
 
     # 4. 创建可视化图表
     print("生成可视化图表...")
@@ -83,15 +87,15 @@ def analyze_danmu_sentiment(file_path):
     # 图4: 按时间的情感变化趋势
     ax4 = plt.subplot(2, 3, 4)
     df['出现时间秒'] = pd.to_numeric(df['出现时间秒'], errors='coerce')
-    # 按时间窗口平滑处理
-    window_size = 20
-    df_sorted = df.sort_values('出现时间秒')
-    df_sorted['情感得分平滑'] = df_sorted['情感得分'].rolling(window=window_size, center=True).mean()
-    ax4.scatter(df_sorted['出现时间秒'], df_sorted['情感得分'], alpha=0.3, s=10, color='gray')
-    ax4.plot(df_sorted['出现时间秒'], df_sorted['情感得分平滑'], color='red', linewidth=2)
+    # 按视频时间分桶汇总，平滑窗口覆盖固定时长（疏密段落一致）
+    window_seconds = DEFAULT_SMOOTH_SECONDS
+    trend = SentimentTrend()
+    trend.add_frame(df)
+    if not trend.plot(ax4, window_seconds):
+        ax4.text(0.5, 0.5, '没有带时间的弹幕', ha='center', va='center', transform=ax4.transAxes)
     ax4.set_xlabel('视频时间 (秒)', fontsize=12)
     ax4.set_ylabel('情感得分', fontsize=12)
-    ax4.set_title(f'情感得分随时间变化趋势 (滑动窗口: {window_size}条)', fontsize=14, fontweight='bold')
+    ax4.set_title(f'情感得分随时间变化趋势 (时间窗口: {window_seconds}秒)', fontsize=14, fontweight='bold')
     ax4.grid(True, alpha=0.3)
 
     # 图5: 弹幕长度与情感关系
@@ -109,7 +113,8 @@ def analyze_danmu_sentiment(file_path):
     ax6 = plt.subplot(2, 3, 6)
     # 提取所有弹幕文本
     all_text = ' '.join(df['弹幕内容'].astype(str).tolist())
-    # 分词并过滤停用词
+    # 分词并过滤停用词（新词词典中的弹幕新词作为整词切出）
+    load_jieba_userdict()
     words = jieba.lcut(all_text)
     stopwords = ['的', '了', '在', '是', '我', '你', '他', '她', '它', '这', '那', '和', '与',
                  '就', '都', '而', '及', '等', '们', '也', '着', '个', '来', '去', '说', '要',
@@ -180,6 +185,10 @@ def analyze_danmu_sentiment(file_path):
         percentage = count / len(df) * 100
         print(f"  {sentiment}: {count} 条 ({percentage:.1f}%)")
 
+    print("\n情感类别统计:")
+    for category, count in df['情感类别'].value_counts().items():
+        print(f"  {category}: {count} 条 ({count / len(df) * 100:.1f}%)")
+
     print("\n情感得分范围:")
     print(f"  最低: {df['情感得分'].min():.3f}")
     print(f"  最高: {df['情感得分'].max():.3f}")
@@ -201,11 +210,19 @@ def analyze_danmu_sentiment(file_path):
         print(f"  ✗ [{row['情感得分']:.3f}] {row['弹幕内容'][:50]}...")
 
 
-analyze_danmu_sentiment('./莞莞类卿-纯元故衣事件.csv')
-analyze_danmu_sentiment('./华妃之死-皇上你害得世兰好苦啊.csv')
-analyze_danmu_sentiment('./沈眉庄被陷害假孕争宠.csv')
-analyze_danmu_sentiment('./滴血验亲.csv')
-analyze_danmu_sentiment('./甄嬛设计与皇上重逢，风光回宫.csv')
-analyze_danmu_sentiment('./甄嬛逆风如解意与皇上御花园初遇.csv')
-analyze_danmu_sentiment('./甄嬛首次小产（被猫抓伤后遭安陵容暗算）.csv')
-analyze_danmu_sentiment('./皇后杀了皇后-纯元皇后死亡真相揭晓.csv')
+# 评分使用进程池，Windows 下子进程会重新导入本文件，入口需放在 __main__ 下
+if __name__ == "__main__":
+    # 命令行传入文件时只分析这些文件，例如: python 弹幕情感分析.py 弹幕数据_BVxxx_3000条.parquet
+    if sys.argv[1:]:
+        for path in sys.argv[1:]:
+            analyze_danmu_sentiment(path)
+        sys.exit(0)
+
+    analyze_danmu_sentiment('./莞莞类卿-纯元故衣事件.csv')
+    analyze_danmu_sentiment('./华妃之死-皇上你害得世兰好苦啊.csv')
+    analyze_danmu_sentiment('./沈眉庄被陷害假孕争宠.csv')
+    analyze_danmu_sentiment('./滴血验亲.csv')
+    analyze_danmu_sentiment('./甄嬛设计与皇上重逢，风光回宫.csv')
+    analyze_danmu_sentiment('./甄嬛逆风如解意与皇上御花园初遇.csv')
+    analyze_danmu_sentiment('./甄嬛首次小产（被猫抓伤后遭安陵容暗算）.csv')
+    analyze_danmu_sentiment('./皇后杀了皇后-纯元皇后死亡真相揭晓.csv')
@@ -0,0 +1,511 @@
+import argparse
+import base64
+import hashlib
+import json
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from 直播弹幕采集 import (HEADER, OP_AUTH_REPLY, OP_HEARTBEAT, OP_HEARTBEAT_REPLY, OP_MESSAGE,
+                          PROTO_BROTLI, PROTO_JSON, PROTO_ZLIB, brotli, pack_packet)
+
+# 模拟B站接口：视频信息、list.so XML、分段protobuf、历史弹幕
+# 以及直播弹幕WebSocket（长度前缀数据包，zlib/brotli压缩）
+# 用于离线测试爬虫和压测，弹幕内容按 cid 确定性生成
+
+SEGMENT_SECONDS = 360
+BASE_TIMESTAMP = 1700000000
+
+SAMPLE_TEXTS = [
+    '皇上驾到', '臣妾做不到啊', '贱人就是矫情', '这位答应好生眼熟', '甄嬛好美',
+    '华妃太霸气了', '前方高能', '哈哈哈哈哈', '安陵容好可怜', '果郡王！！！',
+    '熹贵妃回宫', '逆风如解意 容易莫摧残', '年世兰', '四郎', '滴血验亲名场面',
+]
+
+
+class MockConfig:
+    """模拟服务器参数"""
+
+    def __init__(self, danmu_per_video=3000, segments=2, latency=0.0, jitter=0.0,
+                 error_rate=0.0, encoding='utf-8', mojibake_rate=0.0, compress=True,
+                 history_days=0, pages=1):
+        self.danmu_per_video = danmu_per_video
+        self.segments = segments
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # list.so 编码：utf-8 或 gbk（gbk 时只在XML声明里注明，响应头不带charset）
+        self.encoding = encoding
+        # 被 latin1 误解码后再按UTF-8保存的弹幕比例（乱码修复测试）
+        self.mojibake_rate = mojibake_rate
+        # 与真实接口一样对 list.so 使用 deflate 压缩
+        self.compress = compress
+        # 每个月有历史弹幕的天数
+        self.history_days = history_days
+        # 每个视频的分P数（第k P的cid为 主cid + k - 1）
+        self.pages = pages
+
+
+def bvid_to_cid(bvid):
+    """BV号映射为稳定的cid"""
+    return zlib.crc32(bvid.encode('utf-8')) % 10 ** 8 + 1
+
+
+def danmu_rows(cid, count, mojibake_rate=0.0):
+    """生成一个视频的弹幕 (p属性, 内容)"""
+    rng = random.Random(cid)
+    rows = []
+    for i in range(count):
+        text = rng.choice(SAMPLE_TEXTS)
+        if mojibake_rate and rng.random() < mojibake_rate:
+            text = text.encode('utf-8').decode('latin1')
+        params = [
+            f"{rng.uniform(0, 2700):.5f}",
+            str(rng.choice((1, 1, 1, 4, 5))),
+            str(rng.choice((25, 25, 25, 18, 36))),
+            str(rng.choice((16777215, 16777215, 16711680, 16776960))),
+            str(BASE_TIMESTAMP + rng.randrange(0, 60 * 86400)),
+            '0',
+            f"{rng.getrandbits(32):08x}",
+            str(cid * 10 ** 6 + i),
+        ]
+        rows.append((','.join(params), text))
+    return rows
+
+
+def _xml_escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def build_list_xml(cid, config):
+    """list.so 响应体"""
+    encoding = 'GBK' if config.encoding.lower() in ('gbk', 'gb18030') else 'UTF-8'
+    parts = [f'<?xml version="1.0" encoding="{encoding}"?><i><chatserver>chat.bilibili.com</chatserver>'
+             f'<chatid>{cid}</chatid><maxlimit>{config.danmu_per_video}</maxlimit>']
+    for p, text in danmu_rows(cid, config.danmu_per_video, config.mojibake_rate):
+        parts.append(f'<d p="{p}">{_xml_escape(text)}</d>')
+    parts.append('</i>')
+    # GBK无法表示的字符（乱码样本中的拉丁字符等）用字符引用代替
+    body = ''.join(parts).encode(encoding.lower(), errors='xmlcharrefreplace')
+    if config.compress:
+        compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        body = compressor.compress(body) + compressor.flush()
+    return body
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number, value):
+    if isinstance(value, int):
+        return _varint(number << 3) + _varint(value)
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+def build_segment(rows):
+    """DmSegMobileReply protobuf"""
+    out = bytearray()
+    for p, text in rows:
+        params = p.split(',')
+        elem = b''.join([
+            _field(1, int(params[7])),
+            _field(2, int(float(params[0]) * 1000)),
+            _field(3, int(params[1])),
+            _field(4, int(params[2])),
+            _field(5, int(params[3])),
+            _field(6, params[6]),
+            _field(7, text),
+            _field(8, int(params[4])),
+            _field(11, 0),
+            _field(12, params[7]),
+        ])
+        out += _field(1, elem)
+    return bytes(out)
+
+
+class MockBilibiliHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = MockConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='application/octet-stream', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        config = self.config
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if config.latency or config.jitter:
+            time.sleep(config.latency + random.uniform(0, config.jitter))
+        if config.error_rate and random.random() < config.error_rate:
+            status = random.choice((429, 503))
+            self._send(status, headers={'Retry-After': '0'} if status == 429 else None)
+            return
+
+        handler = ROUTES.get(url.path)
+        if handler is None:
+            self._send(404)
+            return
+        handler(self, query)
+
+    def view(self, query):
+        bvid = query.get('bvid', 'BV0')
+        cid = bvid_to_cid(bvid)
+        duration = self.config.segments * SEGMENT_SECONDS - 60
+        data = {
+            'bvid': bvid, 'aid': cid, 'cid': cid, 'title': f"模拟视频 {bvid}",
+            'owner': {'name': '模拟UP主', 'mid': 1}, 'duration': duration, 'pubdate': BASE_TIMESTAMP,
+            'pages': [{'cid': cid + k, 'page': k + 1, 'part': f"{bvid} P{k + 1}", 'duration': duration}
+                      for k in range(self.config.pages)],
+        }
+        body = json.dumps({'code': 0, 'message': '0', 'data': data}, ensure_ascii=False)
+        self._send(200, body.encode('utf-8'), 'application/json; charset=utf-8')
+
+    def list_so(self, query):
+        cid = int(query.get('oid', 1))
+        body = cached_list_xml(cid, self.config)
+        content_type = 'text/xml' if self.config.encoding.lower() != 'utf-8' else 'text/xml; charset=utf-8'
+        headers = {'Content-Encoding': 'deflate'} if self.config.compress else None
+        self._send(200, body, content_type, headers)
+
+    def segment(self, query):
+        cid = int(query.get('oid', 1))
+        index = int(query.get('segment_index', 1))
+        self._send(200, cached_segment(cid, index, self.config))
+
+    def history_index(self, query):
+        month = query.get('month', '2023-01')
+        days = [f"{month}-{day:02d}" for day in range(1, self.config.history_days + 1)]
+        body = json.dumps({'code': 0, 'message': '0', 'data': days or None})
+        self._send(200, body.encode('utf-8'), 'application/json')
+
+    def history_segment(self, query):
+        cid = int(query.get('oid', 1))
+        day = query.get('date', '2023-01-01')
+        self._send(200, cached_history(cid, day, self.config))
+
+
+ROUTES = {
+    '/x/web-interface/view': MockBilibiliHandler.view,
+    '/x/v1/dm/list.so': MockBilibiliHandler.list_so,
+    '/x/v2/dm/web/seg.so': MockBilibiliHandler.segment,
+    '/x/v2/dm/history/index': MockBilibiliHandler.history_index,
+    '/x/v2/dm/web/history/seg.so': MockBilibiliHandler.history_segment,
+}
+
+
+# 响应体按cid缓存，服务器本身不成为压测瓶颈
+@lru_cache(maxsize=256)
+def cached_list_xml(cid, config):
+    return build_list_xml(cid, config)
+
+
+@lru_cache(maxsize=1024)
+def cached_segment(cid, index, config):
+    if index > config.segments:
+        return b''
+    rows = danmu_rows(cid, config.danmu_per_video, config.mojibake_rate)
+    per_segment = -(-len(rows) // config.segments)
+    return build_segment(rows[(index - 1) * per_segment:index * per_segment])
+
+
+@lru_cache(maxsize=1024)
+def cached_history(cid, day, config):
+    # 每天返回截至当天的一部分弹幕，相邻日期有重叠
+    rng = random.Random(f"{cid}-{day}")
+    rows = danmu_rows(cid, config.danmu_per_video, config.mojibake_rate)
+    start = rng.randrange(0, max(1, len(rows) - 200))
+    return build_segment(rows[start:start + 200])
+
+
+class MockBilibiliServer:
+    """在后台线程运行的模拟服务器"""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        handler = type('ConfiguredHandler', (MockBilibiliHandler,), {'config': config or MockConfig()})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-bilibili', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+# 预先生成的压缩包数量，循环发送（服务端不做实时压缩，不成为压测瓶颈）
+LIVE_PACKET_POOL = 500
+
+
+def live_danmu_message(i, send_ms):
+    """第i条 DANMU_MSG 消息（字段位置与真实直播消息一致）"""
+    rng = random.Random(i)
+    meta = [0, rng.choice((1, 1, 1, 4, 5)), 25, 16777215, send_ms, rng.getrandbits(31), 0,
+            f"{rng.getrandbits(32):08x}", 0, 0, 0, '', 0, '{}', '{}',
+            {'extra': json.dumps({'id_str': f"live{i}"})}]
+    return {'cmd': 'DANMU_MSG:4:0:2:2:2:0', 'info': [meta, rng.choice(SAMPLE_TEXTS), [i, '模拟观众']]}
+
+
+@lru_cache(maxsize=4)
+def live_packet_pool(proto, per_packet):
+    """按压缩协议生成一组业务包，每包含 per_packet 条弹幕"""
+    send_ms = BASE_TIMESTAMP * 1000
+    packets = []
+    for k in range(LIVE_PACKET_POOL):
+        body = b''.join(
+            pack_packet(OP_MESSAGE, json.dumps(live_danmu_message(k * per_packet + j, send_ms),
+                                               ensure_ascii=False), proto=PROTO_JSON)
+            for j in range(per_packet))
+        if proto == PROTO_BROTLI:
+            body = brotli.compress(body, quality=5)
+        else:
+            body = zlib.compress(body)
+        packets.append(pack_packet(OP_MESSAGE, body, proto=proto))
+    return packets
+
+
+def _ws_frame(payload):
+    """服务端二进制帧（不加掩码）"""
+    size = len(payload)
+    if size < 126:
+        header = struct.pack('!BB', 0x82, size)
+    elif size < 65536:
+        header = struct.pack('!BBH', 0x82, 126, size)
+    else:
+        header = struct.pack('!BBQ', 0x82, 127, size)
+    return header + payload
+
+
+def _recv_exact(conn, size):
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("客户端关闭连接")
+        data += chunk
+    return data
+
+
+def _ws_recv(conn):
+    """读取一个客户端帧，返回 (opcode, 解除掩码后的数据)"""
+    first, second = _recv_exact(conn, 2)
+    size = second & 0x7F
+    if size == 126:
+        size = struct.unpack('!H', _recv_exact(conn, 2))[0]
+    elif size == 127:
+        size = struct.unpack('!Q', _recv_exact(conn, 8))[0]
+    mask = _recv_exact(conn, 4) if second & 0x80 else b'\0\0\0\0'
+    data = _recv_exact(conn, size)
+    return first & 0x0F, bytes(byte ^ mask[i % 4] for i, byte in enumerate(data))
+
+
+class MockLiveServer:
+    """模拟直播弹幕服务器（WebSocket）
+
+    完成握手和进房认证后，按认证包的 protover 以 zlib 或 brotli 压缩包连续推送
+    total 条弹幕，然后保持连接只回应心跳。drop_after 大于0时第一个连接在推送
+    这么多条后被断开，用于测试断线重连。
+    """
+
+    def __init__(self, total=100000, per_packet=20, drop_after=0, popularity=1234,
+                 host='127.0.0.1', port=0):
+        self.total = total
+        self.per_packet = per_packet
+        self.drop_after = drop_after
+        self.popularity = popularity
+        self.sock = socket.create_server((host, port))
+        self.connections = 0
+        self.sent = 0
+        self._closed = threading.Event()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.sock.getsockname()[:2]
+        return f"ws://{host}:{port}/sub"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='mock-live', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        while not self._closed.is_set():
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            self.connections += 1
+            drop_after = self.drop_after if self.connections == 1 else 0
+            threading.Thread(target=self._serve_client, args=(conn, drop_after),
+                             name='mock-live-client', daemon=True).start()
+
+    def stop(self):
+        self._closed.set()
+        self.sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handshake(self, conn):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = conn.recv(4096)
+            if not chunk:
+                raise ConnectionError("握手未完成")
+            request += chunk
+        key = next(line.split(b':', 1)[1].strip() for line in request.split(b'\r\n')
+                   if line.lower().startswith(b'sec-websocket-key:'))
+        accept = base64.b64encode(hashlib.sha1(key + WS_GUID.encode()).digest()).decode()
+        conn.sendall(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                      f'Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+
+    def _reply_heartbeats(self, conn):
+        """读取客户端心跳并回复人气值，收到关闭帧或连接断开时返回"""
+        try:
+            while True:
+                opcode, data = _ws_recv(conn)
+                if opcode == 0x8:
+                    return
+                if len(data) >= HEADER.size and HEADER.unpack_from(data)[3] == OP_HEARTBEAT:
+                    conn.sendall(_ws_frame(pack_packet(OP_HEARTBEAT_REPLY,
+                                                       struct.pack('>I', self.popularity))))
+        except (OSError, ConnectionError, ValueError):
+            return
+
+    def _serve_client(self, conn, drop_after):
+        try:
+            self._handshake(conn)
+            _, auth = _ws_recv(conn)
+            protover = json.loads(auth[HEADER.size:]).get('protover', PROTO_ZLIB)
+            proto = PROTO_BROTLI if protover == PROTO_BROTLI and brotli is not None else PROTO_ZLIB
+            conn.sendall(_ws_frame(pack_packet(OP_AUTH_REPLY, '{"code":0}')))
+
+            reader = threading.Thread(target=self._reply_heartbeats, args=(conn,), daemon=True)
+            reader.start()
+
+            packets = live_packet_pool(proto, self.per_packet)
+            sent = 0
+            for k in range(-(-self.total // self.per_packet)):
+                conn.sendall(_ws_frame(packets[k % len(packets)]))
+                sent += self.per_packet
+                self.sent += self.per_packet
+                if drop_after and sent >= drop_after:
+                    conn.shutdown(socket.SHUT_RDWR)
+                    return
+            reader.join()
+        except (OSError, ConnectionError, ValueError, StopIteration):
+            pass
+        finally:
+            conn.close()
+
+
+def serve_in_process(config, ready_queue, stop_event):
+    """在子进程中运行（压测时与爬虫分开统计内存）"""
+    server = MockBilibiliServer(config).start()
+    ready_queue.put(server.url)
+    stop_event.wait()
+    server.stop()
+
+
+def serve_live_in_process(total, per_packet, ready_queue, stop_event):
+    """在子进程中运行模拟直播服务器（压测时不与采集器争抢GIL）"""
+    server = MockLiveServer(total=total, per_packet=per_packet).start()
+    ready_queue.put(server.url)
+    stop_event.wait()
+    server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="B站弹幕接口模拟服务器")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--danmu', type=int, default=3000, help="每个视频的弹幕条数")
+    parser.add_argument('--segments', type=int, default=2, help="每个视频的分段数")
+    parser.add_argument('--latency', type=float, default=0.0, help="固定延迟（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="随机附加延迟上限（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回429/503的比例")
+    parser.add_argument('--encoding', default='utf-8', choices=['utf-8', 'gbk'])
+    parser.add_argument('--mojibake-rate', type=float, default=0.0, help="乱码弹幕比例")
+    parser.add_argument('--history-days', type=int, default=0, help="每月有历史弹幕的天数")
+    parser.add_argument('--pages', type=int, default=1, help="每个视频的分P数")
+    parser.add_argument('--live', action='store_true', help="改为模拟直播弹幕WebSocket服务器")
+    parser.add_argument('--live-total', type=int, default=100000, help="每个连接推送的弹幕条数")
+    parser.add_argument('--per-packet', type=int, default=20, help="每个压缩包中的弹幕条数")
+    parser.add_argument('--drop-after', type=int, default=0, help="第一个连接推送多少条后断开")
+    args = parser.parse_args()
+
+    if args.live:
+        server = MockLiveServer(total=args.live_total, per_packet=args.per_packet,
+                                drop_after=args.drop_after, port=args.port)
+        print(f"🧪 模拟直播弹幕服务器已启动: {server.url}")
+        print("   采集时把 LiveDanmuIngester 的 url 设为该地址、token 设为空字符串")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+        return
+
+    config = MockConfig(danmu_per_video=args.danmu, segments=args.segments, latency=args.latency,
+                        jitter=args.jitter, error_rate=args.error_rate, encoding=args.encoding,
+                        mojibake_rate=args.mojibake_rate, history_days=args.history_days,
+                        pages=args.pages)
+    server = MockBilibiliServer(config, port=args.port)
+    print(f"🧪 模拟服务器已启动: {server.url}")
+    print(f"   设置环境变量 BILI_API_BASE={server.url} 后运行 弹幕爬取.py 即可离线爬取")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,132 @@
 import requests
+from requests.adapters import HTTPAdapter
 import csv
+import os
+import shutil
 import time
-import random
 import re
+import bisect
+import codecs
+import itertools
+import xml.etree.ElementTree as ET
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
 
-def fixed_time_danmu_crawler():
+from 弹幕增量库 import DanmuStateStore, DEFAULT_DB_PATH
+from 弹幕请求调度 import RequestScheduler
+from 弹幕元数据缓存 import VideoInfoCache, video_parts
+from 弹幕任务队列 import JobQueue, DEFAULT_QUEUE_PATH, default_worker_id
+from 弹幕原始存档 import ResponseArchive, DEFAULT_ARCHIVE_DIR, archive_exists
+from 弹幕字段 import SAVE_FIELDS, DanmuRecord
+from 弹幕列式存储 import parquet_available, write_danmu_parquet
+
+# B站接口地址（本地测试时可通过环境变量 BILI_API_BASE 指向模拟服务器）
+API_BASE = os.environ.get('BILI_API_BASE', "https://api.bilibili.com")
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Referer': 'https://www.bilibili.com',
+    'Origin': 'https://www.bilibili.com'
+}
+
+# 所有请求共享的限速/重试调度器（可通过 scheduler.set_max_rate 调整速率）
+scheduler = RequestScheduler(max_rate=5.0, burst=10)
+
+# 视频信息（cid、标题、UP主）磁盘缓存，重复爬取时跳过 view 接口
+video_cache = VideoInfoCache()
+
+# 原始响应存档，调用 enable_response_archive() 后才会保存
+response_archive = None
+
+def enable_response_archive(root=DEFAULT_ARCHIVE_DIR):
+    """开启原始响应存档（list.so、分段和历史弹幕响应）"""
+    global response_archive
+    if response_archive is None:
+        response_archive = ResponseArchive(root)
+        print(f"🗄️ 原始响应将存档到 {root}")
+    return response_archive
+
+def archive_response(payload, endpoint, cid, bvid=None, part=None, url=None):
+    """存档一个完整响应（未开启存档时跳过）"""
+    if response_archive is not None:
+        response_archive.put(payload, endpoint, cid, bvid=bvid, part=part, url=url)
+
+def tee_to_archive(chunks, writer):
+    """边把数据块交给解析器边写入存档，完整读完才算存档成功
+
+    解析器提前停止（如XML格式错误）时，由 finish_archive 读完剩余数据块，完整响应照样存档。
+    """
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            yield chunk
+    except BaseException:
+        writer.discard()
+        raise
+    writer.commit()
+
+def finish_archive(tee):
+    """读完 tee_to_archive 剩余的数据块并提交存档（已读完或下载中断时不做任何事）"""
+    try:
+        for _ in tee:
+            pass
+    except Exception as e:
+        print(f"⚠️ 原始响应存档失败: {e}")
+
+def create_session(pool_size=10):
+    """创建会话 - 挂载连接池，keep-alive复用连接"""
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    # 历史弹幕接口需要登录，从环境变量读取Cookie
+    sessdata = os.environ.get('BILI_SESSDATA')
+    if sessdata:
+        session.cookies.set('SESSDATA', sessdata)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_video_info(bvid, session, max_retries=3, api_base=None, refresh=False):
+    """获取视频信息（cid、标题、UP主、分P），失败返回None
+
+    优先读取磁盘缓存；refresh=True 时忽略缓存重新请求。
+    """
+    if not refresh:
+        cached = video_cache.get(bvid)
+        if cached:
+            print(f"🗂️ 使用缓存的视频信息... {bvid}")
+            return cached
+    
+    api_base = api_base or API_BASE
+    info_url = f"{api_base}/x/web-interface/view?bvid={bvid}"
+    
+    try:
+        print(f"获取视频信息... {bvid}")
+        # 限速与退避重试由共享调度器负责
+        response = scheduler.get(session, info_url, endpoint='view',
+                                 max_retries=max_retries, timeout=15)
+        
+        if response.status_code == 200 and response.text.strip():
+            info_data = response.json()
+            if info_data.get('code') == 0:
+                return video_cache.put(bvid, info_data['data'])
+            print(f"API返回错误: {info_data.get('message')}")
+        else:
+            print(f"获取视频信息失败: 状态码 {response.status_code}")
+            
+    except Exception as e:
+        print(f"获取视频信息失败: {e}")
+    
+    return None
+
+def fixed_time_danmu_crawler(segmented=False, incremental=False, output_format='csv',
+                             refresh=False, backfill=None):
     """修复时间显示的弹幕爬虫"""
     
     # 创建会话并设置headers
-    session = requests.Session()
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Referer': 'https://www.bilibili.com',
-        'Origin': 'https://www.bilibili.com'
-    }
-    session.headers.update(headers)
+    session = create_session()
     
     # 用户输入BV号
     bvid = input("请输入您要爬取的视频BV号: ").strip()
@@ -26,303 +137,1145 @@ def fixed_time_danmu_crawler():
     print(f"🎯 开始爬取视频 {bvid} 的弹幕...")
     
     # 获取视频信息
-    max_retries = 3
-    info_data = None
-    
-    for attempt in range(max_retries):
-        try:
-            print(f"尝试获取视频信息... (第 {attempt + 1} 次)")
-            info_url = f"https://api.bilibili.com/x/web-interface/view?bvid={bvid}"
-            
-            time.sleep(random.uniform(1, 3))
-            
-            response = session.get(info_url, timeout=15)
-            
-            if response.status_code == 200 and response.text.strip():
-                info_data = response.json()
-                if info_data.get('code') == 0:
-                    break
-                else:
-                    print(f"API返回错误: {info_data.get('message')}")
-                    
-        except Exception as e:
-            print(f"获取视频信息失败: {e}")
+    video_info = get_video_info(bvid, session, refresh=refresh)
     
-    if not info_data or info_data.get('code') != 0:
+    if not video_info:
         print("❌ 无法获取视频信息，请检查BV号是否正确")
         return False
     
     # 正常流程
-    cid = info_data['data']['cid']
-    title = info_data['data']['title']
-    owner = info_data['data']['owner']['name']
+    title = video_info['title']
+    owner = video_info['owner']['name']
+    parts = video_parts(video_info)
     print(f"✅ 视频标题: {title}")
     print(f"✅ UP主: {owner}")
-    print(f"✅ 视频CID: {cid}")
+    print(f"✅ 视频CID: {', '.join(str(part['cid']) for part in parts)}")
     
-    # 获取弹幕
-    danmu_list = get_fixed_time_danmu_data(cid, session)
+    # 增量模式：只保存库中没有的新弹幕
+    store = DanmuStateStore() if incremental or backfill else None
+    run_id = store.start_run() if store else None
+    ingest_stats = {}
+    fetched = 0
     
-    if danmu_list:
-        save_fixed_time_danmu_to_csv(danmu_list, bvid, title, owner)
+    # 多P视频逐P获取（边下载边解析边写入），每P一个文件
+    for part_info in parts:
+        if len(parts) > 1:
+            print(f"\n📺 P{part_info['page']} {part_info['part']} (CID: {part_info['cid']})")
+        fetched += crawl_video_part(part_info, bvid, session, segmented=segmented, store=store,
+                                    run_id=run_id, output_format=output_format, backfill=backfill,
+                                    ingest_stats=ingest_stats, show_summary=True,
+                                    name_prefix=part_name_prefix(part_info, store))[0]
+    
+    if store:
+        store.finish_run(run_id)
+        store.close()
+        show_ingest_delta(ingest_stats)
+    if fetched:
         return True
-    else:
-        print("❌ 没有获取到弹幕数据")
-        return False
+    print("❌ 没有获取到弹幕数据")
+    return False
+
+def part_name_prefix(part_info, store=None):
+    """输出文件名前缀：增量模式加"新增"，多P视频加P序号"""
+    prefix = '新增' if store is not None else ''
+    if 'page' in part_info:
+        prefix += f"P{part_info['page']}_"
+    return prefix
 
-def get_fixed_time_danmu_data(cid, session):
-    """获取弹幕数据 - 修复时间显示"""
+def crawl_video_part(part_info, bvid, session, api_base=None, save=True, segmented=False,
+                     store=None, run_id=None, output_format='csv', backfill=None,
+                     ingest_stats=None, show_summary=False, name_prefix=''):
+    """爬取并保存一个cid（单P视频即整个视频）的弹幕，返回 (获取条数, 保存条数)
+
+    传入 store 时为增量模式：只保存库中没有的新弹幕。
+    backfill 为 (起始月份, 结束月份) 时同时回溯历史弹幕（需要 store），与当前弹幕合并到同一个文件。
+    入库随下载逐批提交，若下载中断或输出文件没有写成，则撤销这次入库，下次运行重新获取。
+    """
+    title = part_info['title']
+    owner = part_info['owner']['name']
+    danmu_records = fetch_danmu_records(part_info, session, segmented, api_base)
+    
+    part_stats = {}
+    if store is not None:
+        danmu_records = store.ingest(danmu_records, part_info['cid'], bvid, run_id,
+                                     part_stats, title=title)
+        if backfill:
+            danmu_records = itertools.chain(danmu_records, backfill_video_danmu(
+                part_info, bvid, session, store, run_id, backfill, part_stats,
+                api_base=api_base))
+    
+    finished = []
+    
+    def until_finished(records):
+        yield from records
+        finished.append(True)
+    
+    danmu_records = until_finished(danmu_records)
+    count = 0
     try:
-        danmu_url = f"https://api.bilibili.com/x/v1/dm/list.so?oid={cid}"
-        print(f"获取弹幕URL: {danmu_url}")
-        
-        response = session.get(danmu_url, timeout=15)
+        if save:
+            count = save_danmu_records(danmu_records, bvid, title, owner, output_format,
+                                       show_summary=show_summary, name_prefix=name_prefix)
+        else:
+            count = sum(1 for _ in danmu_records)
+    finally:
+        # 新弹幕没有全部写进输出文件：撤销入库，否则下次增量运行会当作已保存而跳过
+        if store is not None and (not finished or (save and count != part_stats['new'])):
+            discarded = store.discard_ingest(part_info['cid'], run_id)
+            print(f"↩️ 输出未完成，已撤销 CID {part_info['cid']} 本次入库的 {discarded} 条弹幕")
+            part_stats['seen'] = part_stats['new'] = 0
+    
+    if ingest_stats is not None:
+        for key, value in part_stats.items():
+            ingest_stats[key] = ingest_stats.get(key, 0) + value
+    # 增量模式下 count 为新增条数，获取条数以入库统计为准
+    return part_stats.get('seen', count), count
+
+def fetch_danmu_records(video_info, session, segmented=False, api_base=None):
+    """按所选接口获取弹幕记录流"""
+    if segmented:
+        return get_segment_danmu_data(video_info['cid'], session,
+                                      duration=video_info.get('duration'), api_base=api_base,
+                                      bvid=video_info.get('bvid'))
+    return get_fixed_time_danmu_data(video_info['cid'], session, api_base=api_base,
+                                     bvid=video_info.get('bvid'))
+
+def show_ingest_delta(ingest_stats):
+    """显示增量入库结果"""
+    seen = ingest_stats.get('seen', 0)
+    new = ingest_stats.get('new', 0)
+    print(f"\n📦 增量入库: 本次获取 {seen} 条，新增 {new} 条，已存在 {seen - new} 条")
+
+def load_bvid_list(source):
+    """读取BV号列表 - 支持列表或每行一个BV号的文本文件"""
+    if isinstance(source, str):
+        with open(source, 'r', encoding='utf-8-sig') as f:
+            lines = f.read().split()
+    else:
+        lines = source
+    
+    bvids = []
+    for line in lines:
+        bvid = line.strip()
+        if not bvid or bvid.startswith('#'):
+            continue
+        if not bvid.startswith('BV'):
+            print(f"⚠️ 跳过格式错误的BV号: {bvid}")
+            continue
+        if bvid not in bvids:
+            bvids.append(bvid)
+    
+    return bvids
+
+def crawl_video_danmu(bvid, session, api_base=None, save=True, segmented=False,
+                      store=None, run_id=None, output_format='csv', refresh=False,
+                      backfill=None):
+    """爬取单个视频的弹幕（批量模式使用，不阻塞等待）
+
+    多P视频逐P爬取全部cid，每P保存为单独的文件（文件名带P序号）。
+    传入 store 时为增量模式：只保存库中没有的新弹幕。
+    backfill 为 (起始月份, 结束月份) 时同时回溯历史弹幕（需要 store）。
+    """
+    start_time = time.time()
+    video_info = get_video_info(bvid, session, api_base=api_base, refresh=refresh)
+    
+    if not video_info:
+        return {'bvid': bvid, 'success': False, 'count': 0,
+                'error': '无法获取视频信息', 'elapsed': time.time() - start_time}
+    
+    parts = video_parts(video_info)
+    fetched = 0
+    count = 0
+    for part_info in parts:
+        part_fetched, part_count = crawl_video_part(
+            part_info, bvid, session, api_base, save, segmented, store, run_id, output_format,
+            backfill, name_prefix=part_name_prefix(part_info, store))
+        fetched += part_fetched
+        count += part_count
+    
+    # 增量模式下 count 为新增条数，成功与否以实际获取条数为准
+    return {
+        'bvid': bvid,
+        'success': fetched > 0,
+        'count': fetched,
+        'new': count,
+        'title': video_info['title'],
+        'cid': video_info['cid'],
+        'cids': [part_info['cid'] for part_info in parts],
+        'error': None if fetched else '没有获取到弹幕数据',
+        'elapsed': time.time() - start_time
+    }
+
+def batch_danmu_crawler(bvids, max_workers=8, api_base=None, save=True, segmented=False,
+                        incremental=False, db_path=DEFAULT_DB_PATH, max_rate=None,
+                        output_format='csv', refresh=False, backfill=None):
+    """批量爬取弹幕 - 有界线程池并发请求，共享连接池和限速器
+
+    backfill 为 (起始月份, 结束月份) 时回溯历史弹幕，自动启用增量库去重。
+    """
+    bvids = load_bvid_list(bvids)
+    
+    if not bvids:
+        print("❌ 没有有效的BV号")
+        return None
+    
+    max_workers = max(1, min(max_workers, len(bvids)))
+    if max_rate:
+        scheduler.set_max_rate(max_rate)
+    session = create_session(pool_size=max_workers)
+    
+    print(f"🎯 批量爬取 {len(bvids)} 个视频，并发数: {max_workers}")
+    
+    store = DanmuStateStore(db_path) if incremental or backfill else None
+    run_id = store.start_run() if store else None
+    
+    results = []
+    start_time = time.time()
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(crawl_video_danmu, bvid, session, api_base, save, segmented,
+                            store, run_id, output_format, refresh, backfill): bvid
+            for bvid in bvids
+        }
         
-        if response.status_code == 200:
-            # 直接处理二进制数据，尝试多种编码
-            content_bytes = response.content
-            encodings = ['gb18030', 'gbk', 'gb2312', 'utf-8', 'latin1']
-            xml_content = None
-            
-            for encoding in encodings:
-                try:
-                    xml_content = content_bytes.decode(encoding, errors='strict')
-                    if '弹幕' in xml_content or '<?xml' in xml_content:
-                        print(f"✅ 使用编码 {encoding} 成功")
-                        break
-                except UnicodeDecodeError:
-                    continue
-            
-            if xml_content is None:
-                xml_content = content_bytes.decode('gb18030', errors='ignore')
-                print("⚠️ 使用GB18030忽略错误模式")
+        for future in as_completed(futures):
+            bvid = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'bvid': bvid, 'success': False, 'count': 0, 'new': 0,
+                          'error': str(e), 'elapsed': 0.0}
+            results.append(result)
             
-            return parse_fixed_time_danmu_xml(xml_content)
+            status = "✅" if result['success'] else "❌"
+            print(f"{status} [{len(results)}/{len(bvids)}] {bvid}: "
+                  f"{result['count']} 条弹幕 ({result['elapsed']:.2f}秒)")
+    
+    session.close()
+    if store:
+        store.finish_run(run_id)
+        store.close()
+    elapsed = time.time() - start_time
+    summary = summarize_batch_results(results, elapsed)
+    summary['metrics'] = scheduler.metrics()
+    show_batch_statistics(summary)
+    video_cache.show_stats()
+    scheduler.show_metrics()
+    return summary
+
+def summarize_batch_results(results, elapsed):
+    """汇总批量爬取结果并计算吞吐量"""
+    total_danmu = sum(r['count'] for r in results)
+    success_count = sum(1 for r in results if r['success'])
+    elapsed = max(elapsed, 1e-9)
+    
+    return {
+        'results': results,
+        'videos': len(results),
+        'success': success_count,
+        'failed': len(results) - success_count,
+        'total_danmu': total_danmu,
+        'new_danmu': sum(r.get('new', r['count']) for r in results),
+        'elapsed': elapsed,
+        'videos_per_sec': len(results) / elapsed,
+        'danmu_per_sec': total_danmu / elapsed
+    }
+
+def show_batch_statistics(summary):
+    """显示批量爬取统计和吞吐量"""
+    print(f"\n📊 批量爬取统计:")
+    print(f"   视频总数: {summary['videos']} 个")
+    print(f"   成功: {summary['success']} 个 | 失败: {summary['failed']} 个")
+    print(f"   总弹幕数: {summary['total_danmu']} 条")
+    if summary['new_danmu'] != summary['total_danmu']:
+        print(f"   新增弹幕: {summary['new_danmu']} 条")
+    print(f"   总用时: {summary['elapsed']:.2f} 秒")
+    print(f"   吞吐量: {summary['videos_per_sec']:.2f} 视频/秒, "
+          f"{summary['danmu_per_sec']:.1f} 弹幕/秒")
+    
+    failed = [r for r in summary['results'] if not r['success']]
+    if failed:
+        print(f"\n⚠️ 失败列表:")
+        for r in failed:
+            print(f"   {r['bvid']}: {r['error']}")
+
+def enqueue_danmu_jobs(bvids, queue_path=DEFAULT_QUEUE_PATH, segmented=False):
+    """把BV号加入共享任务队列，返回新增任务数"""
+    bvids = load_bvid_list(bvids)
+    job_queue = JobQueue(queue_path)
+    added = job_queue.add_jobs('video', bvids, payload={'segmented': segmented})
+    print(f"📋 已加入 {added} 个视频任务（{len(bvids) - added} 个已在队列中）")
+    job_queue.show_progress()
+    job_queue.close()
+    return added
+
+def run_queue_worker(queue_path=DEFAULT_QUEUE_PATH, worker_id=None, api_base=None, save=True,
+                     incremental=False, db_path=DEFAULT_DB_PATH, output_format='csv',
+                     idle_wait=5.0, max_idle=3):
+    """任务队列工作进程 - 领取任务、心跳续租、完成后汇报
+
+    可在多台机器上同时运行（共享队列文件和分段缓存目录）。
+    分段模式下视频任务会拆成各分段任务，全部下载完后再由一个合并任务保存。
+    还有进行中的任务时一直等待（至少等到最早的租约到期，持有者崩溃时可以接手），
+    否则队列连续 max_idle 次没有可领取的任务时退出。
+    """
+    worker_id = worker_id or default_worker_id()
+    job_queue = JobQueue(queue_path)
+    session = create_session()
+    store = DanmuStateStore(db_path) if incremental else None
+    run_id = store.start_run() if store else None
+    
+    print(f"👷 工作进程 {worker_id} 开始领取任务")
+    finished = 0
+    idle = 0
+    start_time = time.time()
+    
+    while True:
+        job = job_queue.claim(worker_id)
+        if job is None:
+            if job_queue.unfinished() == 0:
+                break
+            expiry = job_queue.next_lease_expiry()
+            if expiry is not None:
+                # 其他进程还有进行中的任务（可能会过期或放出合并任务），等到租约到期或下次轮询
+                idle = 0
+                time.sleep(min(idle_wait, max(expiry - time.time(), 0.1)))
+                continue
+            if idle >= max_idle:
+                break
+            idle += 1
+            time.sleep(idle_wait)
+            continue
+        idle = 0
+        
+        with job_queue.keep_alive(job):
+            try:
+                result = run_queue_job(job, job_queue, session, api_base, save, store,
+                                       run_id, output_format)
+                error = None if result.get('success', True) else result.get('error')
+            except Exception as e:
+                result, error = None, e
+        
+        if error is None:
+            if job_queue.complete(job, result):
+                finished += 1
+                print(f"✅ [{worker_id}] {job['kind']} {job['key']} 完成")
+            else:
+                print(f"⚠️ [{worker_id}] {job['kind']} {job['key']} 租约已失效，结果作废")
         else:
-            print(f"弹幕请求失败: {response.status_code}")
-            
+            job_queue.fail(job, error)
+            print(f"❌ [{worker_id}] {job['kind']} {job['key']} 失败 "
+                  f"(第 {job['attempt']} 次): {error}")
+    
+    session.close()
+    if store:
+        store.finish_run(run_id)
+        store.close()
+    print(f"\n👷 工作进程 {worker_id} 结束：完成 {finished} 个任务，用时 {time.time() - start_time:.1f} 秒")
+    job_queue.show_progress()
+    job_queue.close()
+    return finished
+
+def run_queue_job(job, job_queue, session, api_base, save, store, run_id, output_format):
+    """执行一个队列任务，返回结果字典"""
+    payload = job['payload']
+    
+    if job['kind'] == 'video' and payload.get('segmented'):
+        # 各P拆分为分段任务，另加一个等全部分段结束后才能领取的合并任务
+        video_info = get_video_info(job['key'], session, api_base=api_base)
+        if not video_info:
+            return {'success': False, 'error': '无法获取视频信息'}
+        group = f"seg:{job['key']}"
+        segment_count = 0
+        for part_info in video_parts(video_info):
+            cid = part_info['cid']
+            part_segments = max(1, -(-int(part_info.get('duration') or SEGMENT_SECONDS) // SEGMENT_SECONDS))
+            job_queue.add_jobs('segment', [f"{cid}:{index}" for index in range(1, part_segments + 1)],
+                               payload={'bvid': job['key']}, group=group)
+            segment_count += part_segments
+        job_queue.add_job('merge', job['key'], wait_group=group)
+        return {'cid': video_info['cid'], 'segments': segment_count}
+    
+    if job['kind'] == 'segment':
+        cid, index = map(int, job['key'].split(':'))
+        segment_dir = os.path.join(SEGMENT_CACHE_DIR, str(cid))
+        os.makedirs(segment_dir, exist_ok=True)
+        payload = fetch_danmu_segment(cid, index, session, segment_dir, api_base, payload.get('bvid'))
+        if payload is None:
+            return {'success': False, 'error': f"第{index}段下载失败"}
+        return {'bytes': len(payload)}
+    
+    # 普通视频任务，或分段已全部缓存后的合并任务
+    result = crawl_video_danmu(job['key'], session, api_base, save,
+                               segmented=job['kind'] == 'merge', store=store, run_id=run_id,
+                               output_format=output_format)
+    result.pop('elapsed', None)
+    return result
+
+def replay_response_archive(root=DEFAULT_ARCHIVE_DIR, max_workers=None, output_format='csv'):
+    """从原始存档重新解码、解析全部视频 - 多进程并行，不访问接口
+
+    每个cid取最新一次抓取的响应：有分段响应时用分段，否则用 list.so，
+    历史弹幕按弹幕ID去重后合并。输出文件名带"重放"前缀，多P视频另带cid，各P的文件互不覆盖。
+    """
+    if not archive_exists(root):
+        print(f"❌ 存档不存在: {root}（先开启原始响应存档再爬取）")
+        return None
+    archive = ResponseArchive(root, readonly=True)
+    grouped = archive.latest_responses()
+    archive.close()
+    
+    if not grouped:
+        print(f"❌ 存档中没有可重放的响应: {root}")
+        return None
+    
+    max_workers = max_workers or os.cpu_count() or 1
+    print(f"🔁 重放 {len(grouped)} 个cid的原始响应，进程数: {max_workers}")
+    
+    # 同一BV号有多个cid（多P视频）时各P并行重放，文件名需带cid区分
+    bvid_of = {cid: archived_bvid(entries) for cid, entries in grouped.items()}
+    cids_per_bvid = {}
+    for bvid in bvid_of.values():
+        cids_per_bvid[bvid] = cids_per_bvid.get(bvid, 0) + 1
+    
+    results = []
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(replay_archived_video, root, entries, output_format,
+                            cids_per_bvid[bvid_of[cid]] > 1): cid
+            for cid, entries in grouped.items()
+        }
+        for future in as_completed(futures):
+            cid = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'bvid': f"cid{cid}", 'success': False, 'count': 0, 'error': str(e)}
+            results.append(result)
+            status = "✅" if result['success'] else "❌"
+            print(f"{status} [{len(results)}/{len(grouped)}] {result['bvid']}: {result['count']} 条弹幕")
+    
+    summary = summarize_batch_results(results, time.time() - start_time)
+    show_batch_statistics(summary)
+    return summary
+
+def archived_bvid(entries):
+    """存档记录中的BV号（没有记录时为None）"""
+    return next((entry['bvid'] for entry in entries if entry['bvid']), None)
+
+def replay_archived_video(root, entries, output_format='csv', with_cid=False):
+    """重放单个cid的存档响应并保存（在子进程中运行），with_cid 时文件名带cid"""
+    archive = ResponseArchive(root, readonly=True)
+    cid = entries[0]['cid']
+    bvid = archived_bvid(entries) or f"cid{cid}"
+    
+    by_endpoint = {}
+    for entry in entries:
+        by_endpoint.setdefault(entry['endpoint'], []).append(entry)
+    
+    def iter_records():
+        segments = sorted(by_endpoint.get('seg.so', []), key=lambda entry: int(entry['part']))
+        if segments:
+            segment_entries = itertools.chain.from_iterable(
+                decode_danmu_segment(archive.read(entry['sha256'])) for entry in segments)
+            yield from iter_danmu_records(segment_entries, verbose=False)
+        else:
+            # 每个cid只保留最新一次 list.so 响应
+            for entry in by_endpoint.get('list.so', []):
+                xml_chunks = [archive.read(entry['sha256'])]
+                yield from iter_danmu_records(iter_danmu_xml(xml_chunks, entry['content_type']),
+                                              verbose=False)
+        for entry in sorted(by_endpoint.get('history/seg.so', []), key=lambda entry: entry['part']):
+            yield from iter_danmu_records(decode_danmu_segment(archive.read(entry['sha256'])),
+                                          date_range=None, verbose=False)
+    
+    def unique(records):
+        seen = set()
+        for record in records:
+            if record.row_id not in seen:
+                seen.add(record.row_id)
+                yield record
+    
+    try:
+        count = save_danmu_records(unique(iter_records()), bvid, None, None, output_format,
+                                   show_summary=False,
+                                   name_prefix=f"重放cid{cid}_" if with_cid else '重放')
+    finally:
+        archive.close()
+    
+    return {'bvid': bvid, 'cid': cid, 'success': count > 0, 'count': count,
+            'error': None if count else '存档中没有弹幕'}
+
+def get_fixed_time_danmu_data(cid, session, api_base=None, bvid=None):
+    """获取弹幕数据 - 流式下载并逐条产出弹幕记录（生成器）
+
+    请求失败时不产出弹幕；已开始产出后下载中断或XML格式错误则抛出异常，
+    保存和增量入库据此放弃这次不完整的结果，不会把截断的数据当作完整文件。
+    """
+    api_base = api_base or API_BASE
+    danmu_url = f"{api_base}/x/v1/dm/list.so?oid={cid}"
+    print(f"获取弹幕URL: {danmu_url}")
+    
+    try:
+        response = scheduler.get(session, danmu_url, endpoint='list.so', timeout=15, stream=True)
     except Exception as e:
         print(f"获取弹幕失败: {e}")
+        return
+    
+    with response:
+        if response.status_code != 200:
+            print(f"弹幕请求失败: {response.status_code}")
+            return
+        
+        # 按块喂给XML增量解析器，不保留完整响应
+        chunks = response.iter_content(chunk_size=64 * 1024)
+        content_type = response.headers.get('Content-Type')
+        tee = None
+        if response_archive is not None:
+            chunks = tee = tee_to_archive(chunks, response_archive.writer(
+                'list.so', cid, bvid=bvid, url=danmu_url, content_type=content_type))
+        try:
+            yield from iter_danmu_records(iter_danmu_xml(chunks, content_type))
+        except Exception as e:
+            print(f"❌ 弹幕数据不完整: {e}")
+            raise
+        finally:
+            # 格式错误的响应正是离线重放要排查的，解析中断也要存档完整响应
+            if tee is not None:
+                finish_archive(tee)
+
+# 分段弹幕接口：每段6分钟，protobuf格式
+SEGMENT_SECONDS = 360
+SEGMENT_CACHE_DIR = "弹幕分段缓存"
+
+def get_segment_danmu_data(cid, session, duration=None, max_workers=4,
+                           cache_dir=SEGMENT_CACHE_DIR, api_base=None, bvid=None):
+    """获取分段弹幕（全量） - 各段并行下载，已完成的分段断点续传
+
+    分段缓存只用于中断后续传：全部分段都在且弹幕已全部产出（保存完成）后删除该cid的缓存，
+    下次爬取重新下载，增量模式才能取到新弹幕。
+    """
+    segment_dir = os.path.join(cache_dir, str(cid))
+    os.makedirs(segment_dir, exist_ok=True)
+    
+    if duration:
+        segment_count = max(1, -(-int(duration) // SEGMENT_SECONDS))
+        segment_indexes = list(range(1, segment_count + 1))
+    else:
+        segment_indexes = None
     
-    return []
+    if segment_indexes is None:
+        # 时长未知：顺序下载直到遇到空分段
+        segment_indexes = []
+        index = 1
+        while True:
+            payload = fetch_danmu_segment(cid, index, session, segment_dir, api_base, bvid)
+            if not payload:
+                break
+            segment_indexes.append(index)
+            index += 1
+    else:
+        pending = [index for index in segment_indexes
+                   if not os.path.exists(segment_checkpoint_path(segment_dir, index))]
+        print(f"分段总数: {len(segment_indexes)}，已缓存: {len(segment_indexes) - len(pending)}，"
+              f"待下载: {len(pending)}")
+        
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+                futures = {
+                    executor.submit(fetch_danmu_segment, cid, index, session, segment_dir,
+                                    api_base, bvid): index
+                    for index in pending
+                }
+                for future in as_completed(futures):
+                    index = futures[future]
+                    if future.result() is None:
+                        print(f"⚠️ 第{index}段下载失败，下次运行将重试")
+    
+    # 下载完成后逐段解码，每次只在内存中保留一个分段
+    missing = []
+    
+    def iter_segment_entries():
+        for index in segment_indexes:
+            path = segment_checkpoint_path(segment_dir, index)
+            if not os.path.exists(path):
+                missing.append(index)
+                continue
+            with open(path, 'rb') as f:
+                yield from decode_danmu_segment(f.read())
+    
+    def iter_records():
+        yield from iter_danmu_records(iter_segment_entries())
+        # 有分段下载失败时保留缓存，下次只补下载缺的分段
+        if not missing:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+    
+    return iter_records()
+
+def segment_checkpoint_path(segment_dir, index):
+    """分段缓存文件路径"""
+    return os.path.join(segment_dir, f"seg_{index:04d}.pb")
+
+def fetch_danmu_segment(cid, index, session, segment_dir, api_base=None, bvid=None):
+    """下载单个分段并写入缓存，失败返回None"""
+    api_base = api_base or API_BASE
+    path = segment_checkpoint_path(segment_dir, index)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    
+    try:
+        seg_url = f"{api_base}/x/v2/dm/web/seg.so?type=1&oid={cid}&segment_index={index}"
+        response = scheduler.get(session, seg_url, endpoint='seg.so', timeout=15)
+        
+        if response.status_code != 200:
+            print(f"分段请求失败: 第{index}段 {response.status_code}")
+            return None
+        
+        payload = response.content
+        archive_response(payload, 'seg.so', cid, bvid=bvid, part=index, url=seg_url)
+        # 先写临时文件再改名，中断时不会留下半个分段
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return payload
+        
+    except Exception as e:
+        print(f"获取第{index}段弹幕失败: {e}")
+        return None
+
+# 历史弹幕回溯：list.so 只返回最近的一部分弹幕，更早的弹幕按日期逐天获取
+HISTORY_START_MONTH = '2023-01'
+
+def iter_months(start_month, end_month):
+    """生成 [起始月份, 结束月份] 之间的所有月份 (YYYY-MM)"""
+    year, month = map(int, start_month.split('-'))
+    end_year, end_month_num = map(int, end_month.split('-'))
+    while (year, month) <= (end_year, end_month_num):
+        yield f"{year:04d}-{month:02d}"
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+def get_history_dates(cid, session, start_month=HISTORY_START_MONTH, end_month=None, api_base=None):
+    """查询各月份有历史弹幕的日期（需要登录）"""
+    api_base = api_base or API_BASE
+    end_month = end_month or datetime.now().strftime('%Y-%m')
+    dates = []
+    
+    for month in iter_months(start_month, end_month):
+        index_url = f"{api_base}/x/v2/dm/history/index?type=1&oid={cid}&month={month}"
+        try:
+            response = scheduler.get(session, index_url, endpoint='history/index', timeout=15)
+            data = response.json() if response.status_code == 200 else {}
+        except Exception as e:
+            print(f"查询 {month} 历史弹幕日期失败: {e}")
+            continue
+        
+        if data.get('code') != 0:
+            print(f"查询 {month} 历史弹幕日期失败: {data.get('message', response.status_code)}")
+            continue
+        dates.extend(data.get('data') or [])
+    
+    return sorted(set(dates))
+
+def fetch_history_day(cid, day, session, api_base=None, bvid=None):
+    """获取某一天的历史弹幕，返回 (p属性, 内容) 列表，失败返回None"""
+    api_base = api_base or API_BASE
+    history_url = f"{api_base}/x/v2/dm/web/history/seg.so?type=1&oid={cid}&date={day}"
+    try:
+        response = scheduler.get(session, history_url, endpoint='history/seg.so', timeout=15)
+        if response.status_code != 200:
+            print(f"历史弹幕请求失败: {day} {response.status_code}")
+            return None
+        archive_response(response.content, 'history/seg.so', cid, bvid=bvid, part=day,
+                         url=history_url)
+        return decode_danmu_segment(response.content)
+    except Exception as e:
+        print(f"获取 {day} 历史弹幕失败: {e}")
+        return None
+
+def backfill_video_danmu(video_info, bvid, session, store, run_id, backfill,
+                         ingest_stats=None, max_workers=4, api_base=None):
+    """历史弹幕回溯（生成器） - 各天并行下载，去重入库后产出新弹幕
+
+    每天入库完成后记入回溯进度，中断后再次运行会跳过已完成的日期。
+    """
+    cid = video_info['cid']
+    start_month, end_month = backfill
+    dates = get_history_dates(cid, session, start_month, end_month, api_base)
+    done = store.backfilled_days(cid)
+    pending = [day for day in dates if day not in done]
+    print(f"📜 历史弹幕日期: {len(dates)} 天，已回溯: {len(dates) - len(pending)} 天，"
+          f"待回溯: {len(pending)} 天")
+    if not pending:
+        return
+    
+    def fetch_day(day):
+        entries = fetch_history_day(cid, day, session, api_base, bvid)
+        if entries is None:
+            return None
+        # 回溯的目的就是取回更早的弹幕，不做日期筛选
+        return list(iter_danmu_records(entries, date_range=None, verbose=False))
+    
+    finished = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+        futures = {executor.submit(fetch_day, day): day for day in pending}
+        for future in as_completed(futures):
+            day = futures[future]
+            records = future.result()
+            if records is None:
+                print(f"⚠️ {day} 回溯失败，下次运行将重试")
+                continue
+            # 相邻日期的历史弹幕有重叠，入库时按弹幕ID去重
+            yield from store.ingest(records, cid, bvid, run_id, ingest_stats,
+                                    title=video_info.get('title'))
+            store.mark_day_backfilled(cid, day, len(records))
+            finished += 1
+    
+    print(f"📜 历史回溯完成 {finished}/{len(pending)} 天")
+
+def _read_varint(data, pos):
+    """读取protobuf varint，返回 (值, 新位置)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def _iter_proto_fields(data):
+    """遍历protobuf消息字段，产出 (字段号, 值)"""
+    pos = 0
+    end = len(data)
+    while pos < end:
+        key, pos = _read_varint(data, pos)
+        field, wire_type = key >> 3, key & 0x07
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 2:
+            length, pos = _read_varint(data, pos)
+            value = data[pos:pos + length]
+            pos += length
+        elif wire_type == 1:
+            value = data[pos:pos + 8]
+            pos += 8
+        elif wire_type == 5:
+            value = data[pos:pos + 4]
+            pos += 4
+        else:
+            raise ValueError(f"不支持的protobuf类型: {wire_type}")
+        yield field, value
+
+def decode_danmu_segment(payload):
+    """解码分段弹幕 DmSegMobileReply，转换为与XML相同的 (p属性, 内容) 格式"""
+    entries = []
+    if not payload:
+        return entries
+    
+    for field, elem in _iter_proto_fields(payload):
+        if field != 1:
+            continue
+        
+        # DanmakuElem: 1 id, 2 progress(毫秒), 3 mode, 4 fontsize, 5 color,
+        # 6 midHash, 7 content, 8 ctime, 11 pool, 12 idStr
+        values = {}
+        for sub_field, value in _iter_proto_fields(elem):
+            values[sub_field] = value
+        
+        def text(key):
+            return values.get(key, b'').decode('utf-8', errors='replace')
+        
+        row_id = text(12) or str(values.get(1, 0))
+        params = [
+            f"{values.get(2, 0) / 1000:.5f}",
+            str(values.get(3, 1)),
+            str(values.get(4, 25)),
+            str(values.get(5, 16777215)),
+            str(values.get(8, 0)),
+            str(values.get(11, 0)),
+            text(6),
+            row_id,
+        ]
+        entries.append((','.join(params), text(7)))
+    
+    return entries
 
 def parse_fixed_time_danmu_xml(xml_content):
     """解析弹幕XML - 修复时间显示问题"""
     if not xml_content:
         return []
     
-    danmu_list = []
-    pattern = r'<d p="([^"]*)">([^<]*)</d>'
-    matches = re.findall(pattern, xml_content)
+    return list(iter_danmu_records(iter_danmu_xml([xml_content])))
+
+# XML 1.0 不允许的控制字符，B站弹幕中偶尔出现，会导致解析中断
+_XML_INVALID_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XML_DECLARATION_RE = re.compile(rb'^\s*<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([A-Za-z0-9._-]+)', re.IGNORECASE)
+
+def sniff_xml_encoding(prefix, content_type=None):
+    """判断响应编码 - 只看前缀，优先级：BOM > HTTP头charset > XML声明 > UTF-8"""
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
     
-    print(f"找到 {len(matches)} 条弹幕")
+    encoding = None
+    if content_type:
+        match = _CHARSET_RE.search(content_type)
+        if match:
+            encoding = match.group(1)
+    if encoding is None:
+        match = _XML_DECLARATION_RE.match(prefix[:1024])
+        if match:
+            encoding = match.group(1).decode('ascii')
     
-    # 年份统计和时间戳调试
-    year_count = {2023: 0, 2024: 0, 2025: 0}
-    timestamp_issues = 0
+    try:
+        encoding = codecs.lookup(encoding or 'utf-8').name
+    except LookupError:
+        print(f"⚠️ 未知编码 {encoding}，按UTF-8处理")
+        return 'utf-8'
     
-    for i, match in enumerate(matches):
-        try:
-            params = match[0].split(',')
-            raw_content = match[1]
+    # GB2312/GBK 都是 GB18030 的子集，统一用超集解码
+    if encoding in ('gb2312', 'gbk'):
+        encoding = 'gb18030'
+    return encoding
+
+def iter_danmu_xml(chunks, content_type=None):
+    """增量解析弹幕XML，逐条产出 (p属性, 弹幕内容)
+
+    chunks 为字节块或字符串块的可迭代对象。字节块根据首块和HTTP头
+    判断一次编码，之后增量解码，每个字节只解码一次；实体(&amp; 等)
+    由解析器正确还原，已处理的 <d> 节点立即释放，内存占用与弹幕总数无关。
+    XML格式错误时抛出 ET.ParseError（此前产出的弹幕不完整）。
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    decoder = None
+    root = None
+    count = 0
+    
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if isinstance(chunk, bytes):
+                if decoder is None:
+                    encoding = sniff_xml_encoding(chunk, content_type)
+                    print(f"✅ 使用编码 {encoding}")
+                    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+                chunk = decoder.decode(chunk)
+            parser.feed(_XML_INVALID_RE.sub('', chunk))
             
-            if len(params) >= 8:
-                # 解析参数
-                appear_time = float(params[0])
-                mode = int(params[1])
-                font_size = int(params[2])
-                color = int(params[3])
-                send_timestamp_str = params[4]  # 时间戳字符串
-                user_hash = params[6]
-                
-                # !!! 关键修复：时间戳处理
-                send_time = None
-                send_year = None
-                
-                try:
-                    # 尝试将时间戳转换为整数
-                    send_timestamp = int(float(send_timestamp_str))
-                    
-                    # 检查时间戳是否合理（在2000-2030年之间）
-                    if send_timestamp > 946684800 and send_timestamp < 1900000000:
-                        send_time = datetime.fromtimestamp(send_timestamp)
-                        send_year = send_time.year
-                    else:
-                        # 时间戳不合理，使用当前时间作为备选
-                        timestamp_issues += 1
-                        send_time = datetime.now()
-                        send_year = send_time.year
-                        print(f"⚠️ 第{i+1}条弹幕时间戳异常: {send_timestamp_str}")
-                        
-                except (ValueError, TypeError, OSError) as e:
-                    # 时间戳解析失败，使用当前时间
-                    timestamp_issues += 1
-                    send_time = datetime.now()
-                    send_year = send_time.year
-                    print(f"⚠️ 第{i+1}条弹幕时间戳解析失败: {send_timestamp_str}, 错误: {e}")
-                
-                # 筛选2023-2025年的数据
-                if send_year not in [2023, 2024, 2025]:
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = elem
                     continue
-                
-                # 统计符合条件的数据
-                year_count[send_year] = year_count.get(send_year, 0) + 1
-                
-                # 修复内容编码
-                content = fix_content_encoding(raw_content)
-                
-                # 格式化时间位置
-                minutes = int(appear_time // 60)
-                seconds = int(appear_time % 60)
-                time_pos = f"{minutes}:{seconds:02d}"
-                
-                # 颜色处理 - 转换为中文
-                color_hex = f"#{color:06X}"
-                color_chinese = color_to_chinese(color_hex)
-                
-                # 弹幕模式描述
-                mode_desc = "滚动弹幕" if mode == 1 else "顶部弹幕" if mode == 5 else "底部弹幕" if mode == 4 else f"模式{mode}"
-                
-                # 字体大小描述
-                font_desc = "正常" if font_size == 25 else "较大" if font_size > 25 else "较小"
-                
-                danmu_data = {
-                    '发送日期': send_time.strftime('%Y-%m-%d') if send_time else '时间未知',
-                    '发送时间': send_time.strftime('%H:%M:%S') if send_time else '时间未知',
-                    '发送年份': send_year if send_year else '未知',
-                    '时间位置': time_pos,
-                    '出现时间秒': round(appear_time, 2),
-                    '弹幕内容': content,
-                    '用户ID': user_hash[:8] + '...',
-                    '弹幕颜色': color_chinese,
-                    '颜色代码': color_hex,
-                    '弹幕模式': mode_desc,
-                    '字体大小': font_desc,
-                    '弹幕长度': len(content),
-                    '原始时间戳': send_timestamp_str  # 用于调试
-                }
-                
-                danmu_list.append(danmu_data)
-                
-                # 显示前几条的时间信息用于调试
-                if i < 3:
-                    print(f"  示例 {i+1}: 时间戳={send_timestamp_str}, 日期={danmu_data['发送日期']}")
-                    
-        except Exception as e:
-            print(f"❌ 解析第{i+1}条弹幕失败: {e}")
-            continue
+                if elem.tag == 'd':
+                    count += 1
+                    yield elem.get('p', ''), elem.text or ''
+                    root.clear()
+        
+        if decoder is not None:
+            parser.feed(decoder.decode(b'', final=True))
+        parser.close()
+    except ET.ParseError as e:
+        print(f"⚠️ XML解析中断: {e}（已解析 {count} 条）")
+        raise
+    
+    print(f"找到 {count} 条弹幕")
+
+# 只保留该发送日期范围内的弹幕 [起始, 结束)，设为None则不筛选
+DANMU_DATE_RANGE = ('2023-01-01', '2026-01-01')
+# 每批解码的弹幕条数
+DECODE_BATCH_SIZE = 5000
+# 合理的时间戳范围（2000-2030年之间）
+MIN_TIMESTAMP = 946684800
+MAX_TIMESTAMP = 1900000000
+# 本地时区偏移按15分钟的时段查询（夏令时切换都发生在整15分钟）
+OFFSET_STEP_SECONDS = 900
+
+@lru_cache(maxsize=65536)
+def _utc_offset_at(step):
+    """某个15分钟时段的本地时区偏移（秒）"""
+    return int(datetime.fromtimestamp(step * OFFSET_STEP_SECONDS).astimezone().utcoffset().total_seconds())
+
+def local_utc_offsets(timestamps):
+    """每个时间戳各自的本地时区偏移（秒），跨夏令时切换时与 datetime.fromtimestamp 一致"""
+    steps, inverse = np.unique(timestamps // OFFSET_STEP_SECONDS, return_inverse=True)
+    offsets = np.array([_utc_offset_at(int(step)) for step in steps], dtype=np.int64)
+    return offsets[inverse.reshape(-1)]
+
+def iter_danmu_records(entries, date_range=DANMU_DATE_RANGE, batch_size=DECODE_BATCH_SIZE,
+                       verbose=True):
+    """解析 (p属性, 弹幕内容) 序列为弹幕记录（生成器） - XML与分段接口共用
+
+    按批处理：乱码修复、p属性拆分、时间戳转换和日期筛选都对整批一次完成，
+    只有通过筛选的弹幕才逐条生成记录。verbose=False 时不打印统计。
+    """
+    # 年份统计和时间戳调试（不打印时跳过示例输出）
+    stats = {'years': {}, 'timestamp_issues': 0, 'failed': 0, 'examples': 0 if verbose else 3}
+    
+    # 乱码修复按批进行，只处理命中乱码特征的行
+    repair_stats = {'checked': 0, 'repaired': 0, 'failed': 0}
+    
+    for batch in iter_batches(entries, batch_size):
+        batch = repair_mojibake_batch(batch, repair_stats)
+        yield from decode_danmu_batch(batch, date_range, stats)
+    
+    if not verbose:
+        return
     
     # 打印年份统计和时间戳问题
-    print(f"\n📅 符合条件的弹幕年份分布:")
-    for year in [2023, 2024, 2025]:
-        count = year_count.get(year, 0)
-        print(f"   {year}年: {count}条")
+    range_desc = f" ({date_range[0]} ~ {date_range[1]})" if date_range else ""
+    print(f"\n📅 符合条件的弹幕年份分布{range_desc}:")
+    for year in sorted(stats['years']):
+        print(f"   {year}年: {stats['years'][year]}条")
     
-    if timestamp_issues > 0:
-        print(f"⚠️ 时间戳问题: {timestamp_issues} 条弹幕的时间戳异常")
+    if stats['timestamp_issues'] > 0:
+        print(f"⚠️ 时间戳问题: {stats['timestamp_issues']} 条弹幕的时间戳异常")
+    if stats['failed'] > 0:
+        print(f"❌ 解析失败: {stats['failed']} 条弹幕")
+    
+    print(f"🔧 乱码修复: 检查 {repair_stats['checked']} 条，修复 {repair_stats['repaired']} 条，"
+          f"无法修复 {repair_stats['failed']} 条")
+
+def iter_batches(iterable, batch_size):
+    """按固定大小切分为列表批次"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def split_p_attributes(p_values):
+    """一次拆分整批p属性，返回 (行数, 8) 的字符串数组"""
+    p_array = np.array(p_values, dtype=str)
+    commas = np.char.count(p_array, ',')
+    if commas.min() < 7:
+        raise ValueError("p属性字段不足")
     
-    return danmu_list
+    if commas.min() == commas.max():
+        # 字段数一致：拼接后一次split，再整形为二维数组
+        width = int(commas[0]) + 1
+        fields = np.array(','.join(p_values).split(','), dtype=str).reshape(len(p_values), width)
+    else:
+        # 新旧格式混合（8或9个字段），逐行拆分后对齐
+        fields = np.array([p.split(',')[:8] for p in p_values], dtype=str)
+    return fields[:, :8]
+
+def decode_danmu_batch(batch, date_range, stats):
+    """向量化解码一批弹幕，返回通过日期筛选的 DanmuRecord 列表"""
+    try:
+        fields = split_p_attributes([p for p, _ in batch])
+        appear_times = fields[:, 0].astype(np.float64)
+        modes = fields[:, 1].astype(np.int64)
+        font_sizes = fields[:, 2].astype(np.int64)
+        colors = fields[:, 3].astype(np.int64)
+        timestamps = fields[:, 4].astype(np.float64).astype(np.int64)
+    except (ValueError, OverflowError) as e:
+        if len(batch) == 1:
+            stats['failed'] += 1
+            print(f"❌ 解析弹幕失败: {batch[0][0]}, 错误: {e}")
+            return []
+        # 整批转换失败时逐条解码，定位并跳过坏数据
+        records = []
+        for entry in batch:
+            records.extend(decode_danmu_batch([entry], date_range, stats))
+        return records
+    
+    # 时间戳不合理时使用当前时间作为备选
+    invalid = (timestamps <= MIN_TIMESTAMP) | (timestamps >= MAX_TIMESTAMP)
+    if invalid.any():
+        stats['timestamp_issues'] += int(invalid.sum())
+        for i in np.flatnonzero(invalid)[:5]:
+            print(f"⚠️ 弹幕时间戳异常: {fields[i, 4]}")
+        timestamps[invalid] = int(time.time())
+    
+    # 一次转换为本地时间的 datetime64（每个时间戳用各自的时区偏移），日期筛选在逐条处理之前完成
+    local_times = (timestamps + local_utc_offsets(timestamps)).astype('datetime64[s]')
+    if date_range:
+        start, end = (np.datetime64(day, 's') for day in date_range)
+        keep = (local_times >= start) & (local_times < end)
+    else:
+        keep = np.ones(len(batch), dtype=bool)
+    
+    years = local_times[keep].astype('datetime64[Y]').astype(np.int64) + 1970
+    for year, count in zip(*np.unique(years, return_counts=True)):
+        stats['years'][int(year)] = stats['years'].get(int(year), 0) + int(count)
+    
+    indexes = np.flatnonzero(keep)
+    kept = fields[indexes]
+    records = [
+        DanmuRecord(appear_time, mode, font_size, color, timestamp, year,
+                    timestamp_str, user_hash, batch[index][1], row_id)
+        for index, appear_time, mode, font_size, color, timestamp, year,
+            timestamp_str, user_hash, row_id in zip(
+                indexes.tolist(), appear_times[indexes].tolist(), modes[indexes].tolist(),
+                font_sizes[indexes].tolist(), colors[indexes].tolist(),
+                timestamps[indexes].tolist(), years.tolist(), kept[:, 4].tolist(),
+                kept[:, 6].tolist(), kept[:, 7].tolist())
+    ]
+    
+    # 显示前几条的时间信息用于调试
+    for record in records[:max(0, 3 - stats['examples'])]:
+        stats['examples'] += 1
+        print(f"  示例 {stats['examples']}: 时间戳={record.timestamp_str}, 日期={record.send_date}")
+    
+    return records
+
+# UTF-8 多字节字符被误按 latin1 解码后的特征：前导字节 + 续字节
+_MOJIBAKE_RE = re.compile('[\u00c2-\u00f4][\u0080-\u00bf]')
+def repair_mojibake_batch(batch, stats):
+    """对一批弹幕做一次拼接扫描，只对命中乱码特征的行做 latin1 -> UTF-8 还原"""
+    stats['checked'] += len(batch)
+    joined = '\n'.join(content for _, content in batch)
+    
+    # 绝大多数批次没有乱码，一次扫描即可跳过
+    if not _MOJIBAKE_RE.search(joined):
+        return batch
+    
+    # 每行在拼接串中的起始位置，用于把命中位置映射回行号
+    starts = list(itertools.accumulate((len(content) + 1 for _, content in batch), initial=0))
+    flagged = {bisect.bisect_right(starts, match.start()) - 1
+               for match in _MOJIBAKE_RE.finditer(joined)}
+    
+    for i in sorted(flagged):
+        params, content = batch[i]
+        fixed = fix_content_encoding(content)
+        if fixed != content:
+            batch[i] = (params, fixed)
+            stats['repaired'] += 1
+        else:
+            stats['failed'] += 1
+    
+    return batch
 
 def fix_content_encoding(content):
     """修复内容编码"""
     if not content:
         return content
     
-    # 如果是乱码模式（包含特殊字符），尝试修复
-    if 'å' in content or 'ä' in content or 'è' in content or 'é' in content:
+    # 如果是乱码模式（UTF-8被错误解码为latin1），尝试修复
+    if _MOJIBAKE_RE.search(content):
         try:
-            # 可能是UTF-8被错误解码为latin1
-            if isinstance(content, str):
-                # 重新编码为latin1再解码为UTF-8
-                content_bytes = content.encode('latin1')
-                content = content_bytes.decode('utf-8')
-        except:
+            # 重新编码为latin1再解码为UTF-8
+            content = content.encode('latin1').decode('utf-8')
+        except (UnicodeEncodeError, UnicodeDecodeError):
             pass
     
     return content
 
-def color_to_chinese(color_hex):
-    """将十六进制颜色转换为中文颜色名称"""
-    color_map = {
-        '#FFFFFF': '白色',
-        '#000000': '黑色',
-        '#FF0000': '红色',
-        '#FF5E5E': '浅红色',
-        '#E70012': '深红色',
-        '#FFAEC9': '粉红色',
-        '#FF7F27': '橙色',
-        '#FFC90E': '黄色',
-        '#FEF102': '亮黄色',
-        '#22B14C': '绿色',
-        '#90C320': '浅绿色',
-        '#00A2E8': '蓝色',
-        '#3F48CC': '深蓝色',
-        '#1D9AA5': '青色',
-        '#A349A4': '紫色',
-        '#B97A57': '棕色',
-        '#7F7F7F': '灰色',
-        '#C3C3C3': '浅灰色'
-    }
+def save_fixed_time_danmu_to_csv(danmu_records, bvid, title, owner, show_summary=True, name_prefix=''):
+    """保存弹幕到CSV - 逐条写入，移除调试字段，返回保存条数"""
+    # 总条数写入完成后才知道，先写临时文件再改名
+    # 临时文件名带前缀：同一视频的多个文件（如多P并行重放）同时写入时互不干扰
+    tmp_filename = f"弹幕数据_{bvid}_{name_prefix}写入中.csv"
+    count = 0
     
-    color_hex_upper = color_hex.upper()
-    return color_map.get(color_hex_upper, '其他颜色')
-
-def save_fixed_time_danmu_to_csv(danmu_list, bvid, title, owner):
-    """保存弹幕到CSV - 移除调试字段"""
-    if not danmu_list:
-        return
-    
-    filename = f"弹幕数据_{bvid}_{len(danmu_list)}条.csv"
+    # 边写边统计，不保留完整弹幕列表
+    stats = {'total': 0, 'unknown_time': 0, 'years': {}}
+    preview = []
     
     try:
-        # 字段列表 - 移除原始时间戳字段
-        save_fields = [
-            '发送日期', '发送时间', '发送年份', '时间位置', 
-            '出现时间秒', '弹幕内容', '用户ID', '弹幕颜色', 
-            '颜色代码', '弹幕模式', '字体大小', '弹幕长度'
-        ]
-        
-        # 创建最终数据（移除调试字段）
-        final_data = []
-        for danmu in danmu_list:
-            final_danmu = {field: danmu[field] for field in save_fields}
-            final_data.append(final_danmu)
-        
-        with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=save_fields)
-            writer.writeheader()
-            writer.writerows(final_data)
+        with open(tmp_filename, 'w', newline='', encoding='utf-8-sig') as f:
+            # 字段列表 - 不含原始时间戳等调试字段
+            writer = csv.writer(f)
+            writer.writerow(SAVE_FIELDS)
+            
+            for danmu in danmu_records:
+                writer.writerow(danmu.csv_row())
+                count += 1
+                update_fixed_time_statistics(stats, danmu)
+                if len(preview) < 10:
+                    preview.append(danmu)
         
-        print(f"✅ 成功保存 {len(danmu_list)} 条弹幕到 {filename}")
+        if count == 0:
+            os.remove(tmp_filename)
+            return 0
         
+        filename = f"弹幕数据_{bvid}_{name_prefix}{count}条.csv"
+        os.replace(tmp_filename, filename)
+            
+    except Exception as e:
+        # 写入失败时删除临时文件并返回0，不把写了一半的数据当作已保存
+        print(f"保存文件失败: {e}")
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        return 0
+    
+    print(f"✅ 成功保存 {count} 条弹幕到 {filename}")
+    
+    if show_summary:
         # 显示统计信息
-        show_fixed_time_statistics(danmu_list, title, owner)
+        show_fixed_time_statistics(stats, title, owner)
         
         # 显示弹幕预览
-        show_fixed_time_preview(danmu_list)
-            
+        show_fixed_time_preview(preview)
+    
+    return count
+
+def save_danmu_records(danmu_records, bvid, title, owner, output_format='csv',
+                       show_summary=True, name_prefix=''):
+    """按输出格式保存弹幕，返回保存条数"""
+    if output_format == 'parquet':
+        return save_danmu_to_parquet(danmu_records, bvid, name_prefix=name_prefix)
+    return save_fixed_time_danmu_to_csv(danmu_records, bvid, title, owner,
+                                        show_summary=show_summary, name_prefix=name_prefix)
+
+def save_danmu_to_parquet(danmu_records, bvid, name_prefix=''):
+    """保存弹幕到Parquet - 列式、带类型，显示标签读取时再生成"""
+    tmp_filename = f"弹幕数据_{bvid}_{name_prefix}写入中.parquet"
+    count = 0
+    
+    try:
+        count = write_danmu_parquet(danmu_records, tmp_filename)
+        if count == 0:
+            return 0
+        
+        filename = f"弹幕数据_{bvid}_{name_prefix}{count}条.parquet"
+        os.replace(tmp_filename, filename)
+        size = os.path.getsize(filename)
+        print(f"✅ 成功保存 {count} 条弹幕到 {filename} ({size:,} 字节)")
+        
     except Exception as e:
+        # 与CSV一致：写入失败时删除临时文件并返回0
         print(f"保存文件失败: {e}")
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        return 0
+    
+    return count
 
-def show_fixed_time_statistics(danmu_list, title, owner):
+def update_fixed_time_statistics(stats, danmu):
+    """累计单条弹幕的统计信息"""
+    stats['total'] += 1
+    
+    # 检查时间未知的弹幕
+    year = danmu.send_year
+    if year is None:
+        stats['unknown_time'] += 1
+    else:
+        # 年份统计
+        stats['years'][year] = stats['years'].get(year, 0) + 1
+
+def show_fixed_time_statistics(stats, title, owner):
     """显示统计信息"""
     print(f"\n📊 统计信息:")
     print(f"   视频标题: {title}")
     print(f"   UP主: {owner}")
-    print(f"   总弹幕数: {len(danmu_list)} 条")
+    print(f"   总弹幕数: {stats['total']} 条")
     
-    # 检查时间未知的弹幕
-    unknown_time_count = sum(1 for danmu in danmu_list if danmu['发送日期'] == '时间未知')
-    if unknown_time_count > 0:
-        print(f"⚠️  时间未知的弹幕: {unknown_time_count} 条")
-    
-    # 年份统计
-    year_stats = {}
-    for danmu in danmu_list:
-        year = danmu['发送年份']
-        if year != '未知':
-            year_stats[year] = year_stats.get(year, 0) + 1
+    if stats['unknown_time'] > 0:
+        print(f"⚠️  时间未知的弹幕: {stats['unknown_time']} 条")
     
+    year_stats = stats['years']
     print(f"\n📅 最终年份分布:")
     for year in sorted(year_stats.keys()):
         print(f"   {year}年: {year_stats[year]}条")
@@ -333,9 +1286,9 @@ def show_fixed_time_preview(danmu_list):
     print("=" * 70)
     
     for i, danmu in enumerate(danmu_list[:10], 1):
-        content = danmu['弹幕内容']
-        print(f"{i}. [{danmu['发送日期']} {danmu['发送时间']}]")
-        print(f"   用户: {danmu['用户ID']} | 颜色: {danmu['弹幕颜色']}")
+        content = danmu.content
+        print(f"{i}. [{danmu.send_date} {danmu.send_clock}]")
+        print(f"   用户: {danmu.user_id} | 颜色: {danmu.color_name}")
         print(f"   内容: {content}")
         print()
 
@@ -346,10 +1299,77 @@ def main():
     print("   • 增强时间戳解析")
     print("   • 处理异常时间戳")
     print("   • 显示时间戳问题统计")
+    print("   • 支持批量并发爬取多个BV号")
+    print("   • 支持分段接口全量弹幕（断点续传）")
+    print("   • 支持增量爬取（只保存新增弹幕）")
+    print("   • 自适应限速与退避重试")
+    print("   • 可选列式Parquet输出")
+    print("   • 视频信息本地缓存")
+    print("   • 按日期回溯历史弹幕（需设置环境变量 BILI_SESSDATA）")
+    print("   • 共享任务队列，多进程/多机器分工爬取")
+    print("   • 原始响应存档，可离线重放解析")
     print("=" * 50)
     
-    # 开始爬取
-    success = fixed_time_danmu_crawler()
+    print("\n请选择模式:")
+    print("  1. 爬取单个视频")
+    print("  2. 批量爬取（BV号列表文件或空格分隔的BV号）")
+    print("  3. 把BV号加入任务队列")
+    print("  4. 作为工作进程处理任务队列")
+    print("  5. 从原始响应存档重放解析（不访问接口）")
+    choice = input("请输入选择 (1/2/3/4/5): ").strip()
+    
+    if choice == '3':
+        source = input("请输入BV号列表文件路径，或直接输入多个BV号: ").strip()
+        segmented = input("是否使用分段接口获取全量弹幕? (y/n): ").strip().lower() == 'y'
+        enqueue_danmu_jobs(source if os.path.exists(source) else source.split(),
+                           segmented=segmented)
+        return
+    
+    if choice == '5':
+        output_format = 'parquet' if parquet_available() and input(
+            "是否保存为列式Parquet格式? (y/n): ").strip().lower() == 'y' else 'csv'
+        replay_response_archive(output_format=output_format)
+        return
+    
+    segmented = input("是否使用分段接口获取全量弹幕? (y/n): ").strip().lower() == 'y'
+    incremental = input("是否增量爬取（只保存新增弹幕）? (y/n): ").strip().lower() == 'y'
+    refresh = input("是否刷新视频信息缓存? (y/n): ").strip().lower() == 'y'
+    if input("是否存档原始响应（便于以后离线重放）? (y/n): ").strip().lower() == 'y':
+        enable_response_archive()
+    backfill = None
+    if input("是否按日期回溯历史弹幕? (y/n): ").strip().lower() == 'y':
+        start_month = input(f"请输入起始月份 (默认{HISTORY_START_MONTH}): ").strip() or HISTORY_START_MONTH
+        backfill = (start_month, None)
+    output_format = 'csv'
+    if parquet_available():
+        if input("是否保存为列式Parquet格式? (y/n): ").strip().lower() == 'y':
+            output_format = 'parquet'
+    
+    if choice == '2':
+        source = input("请输入BV号列表文件路径，或直接输入多个BV号: ").strip()
+        if os.path.exists(source):
+            bvids = load_bvid_list(source)
+        else:
+            bvids = load_bvid_list(source.split())
+        workers = input("请输入并发数 (默认8): ").strip()
+        max_workers = int(workers) if workers.isdigit() else 8
+        rate = input("请输入每秒最大请求数 (默认5): ").strip()
+        max_rate = float(rate) if rate.replace('.', '', 1).isdigit() else None
+        summary = batch_danmu_crawler(bvids, max_workers=max_workers, segmented=segmented,
+                                      incremental=incremental, max_rate=max_rate,
+                                      output_format=output_format, refresh=refresh,
+                                      backfill=backfill)
+        success = bool(summary and summary['success'])
+    elif choice == '4':
+        # 分段与否由加入队列时决定
+        success = run_queue_worker(incremental=incremental, output_format=output_format) > 0
+    else:
+        # 开始爬取
+        success = fixed_time_danmu_crawler(segmented=segmented, incremental=incremental,
+                                           output_format=output_format, refresh=refresh,
+                                           backfill=backfill)
+    
+    scheduler.show_metrics()
     
     if not success:
         print("\n❌ 爬取失败，请检查网络连接或BV号是否正确")
@@ -0,0 +1,211 @@
+import csv
+import random
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import urlparse
+
+import requests
+
+# 需要退避重试的状态码：412 为B站风控拦截，429 为限流，5xx 为服务端错误
+RETRY_STATUS = {412, 429, 500, 502, 503, 504}
+# 说明请求过快、需要降速的状态码
+THROTTLE_STATUS = {412, 429}
+
+
+class TokenBucket:
+    """令牌桶限速器 - 多线程共享"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """取一个令牌，不足时等待"""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def set_rate(self, rate):
+        """调整发放速率"""
+        with self.lock:
+            self._refill()
+            self.rate = rate
+
+
+class EndpointStats:
+    """单个接口的延迟与错误计数"""
+
+    def __init__(self, window=2048):
+        self.requests = 0
+        self.success = 0
+        self.retries = 0
+        self.errors = Counter()
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        # 只保留最近的延迟样本用于计算分位数，内存固定
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency, error=None):
+        self.requests += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.latencies.append(latency)
+        if error is None:
+            self.success += 1
+        else:
+            self.errors[error] += 1
+
+    def percentile(self, q):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self, endpoint):
+        return {
+            '接口': endpoint,
+            '请求数': self.requests,
+            '成功数': self.success,
+            '重试数': self.retries,
+            '错误数': sum(self.errors.values()),
+            '错误明细': ' '.join(f"{k}:{v}" for k, v in sorted(self.errors.items())),
+            '平均延迟秒': round(self.total_latency / self.requests, 4) if self.requests else 0.0,
+            'P50延迟秒': round(self.percentile(50), 4),
+            'P99延迟秒': round(self.percentile(99), 4),
+            '最大延迟秒': round(self.max_latency, 4),
+        }
+
+
+class RequestScheduler:
+    """自适应限速与重试调度器
+
+    - 所有请求共享一个令牌桶，速率不超过 max_rate
+    - 遇到 412/429 时速率减半，连续成功后逐步恢复到 max_rate
+    - 412/429/5xx 和网络异常按指数退避 + 随机抖动重试
+    - 按接口记录请求数、错误数和延迟分位数
+    """
+
+    def __init__(self, max_rate=5.0, burst=10, min_rate=0.5, max_retries=5,
+                 base_delay=1.0, max_delay=60.0):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = TokenBucket(max_rate, burst)
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def set_max_rate(self, max_rate):
+        """修改速率上限"""
+        self.max_rate = max_rate
+        self.bucket.set_rate(max_rate)
+
+    def get(self, session, url, endpoint=None, max_retries=None, **kwargs):
+        """限速、重试地发送GET请求，返回最后一次响应
+
+        所有重试都失败时：HTTP错误返回最后的响应，网络异常则抛出。
+        """
+        endpoint = endpoint or urlparse(url).path
+        max_retries = self.max_retries if max_retries is None else max_retries
+
+        for attempt in range(max_retries + 1):
+            self.bucket.acquire()
+            start = time.monotonic()
+            try:
+                response = session.get(url, **kwargs)
+            except requests.RequestException as e:
+                self._record(endpoint, time.monotonic() - start, type(e).__name__)
+                if attempt >= max_retries:
+                    raise
+                self._wait_before_retry(endpoint, attempt, str(e))
+                continue
+
+            latency = time.monotonic() - start
+            if response.status_code not in RETRY_STATUS:
+                self._record(endpoint, latency)
+                self._speed_up()
+                return response
+
+            self._record(endpoint, latency, str(response.status_code))
+            if response.status_code in THROTTLE_STATUS:
+                self._slow_down()
+            if attempt >= max_retries:
+                return response
+
+            retry_after = response.headers.get('Retry-After')
+            response.close()
+            self._wait_before_retry(endpoint, attempt, f"状态码 {response.status_code}", retry_after)
+
+    def _wait_before_retry(self, endpoint, attempt, reason, retry_after=None):
+        """指数退避 + 全抖动；服务端给出 Retry-After 时以其为准"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.max_delay, float(retry_after)))
+
+        with self.lock:
+            self.stats.setdefault(endpoint, EndpointStats()).retries += 1
+        print(f"⚠️ {endpoint} {reason}，{delay:.1f}秒后重试 (第 {attempt + 1} 次)")
+        time.sleep(delay)
+
+    def _slow_down(self):
+        new_rate = max(self.min_rate, self.bucket.rate / 2)
+        if new_rate < self.bucket.rate:
+            print(f"🐢 触发限流，请求速率降至 {new_rate:.2f} 次/秒")
+        self.bucket.set_rate(new_rate)
+
+    def _speed_up(self):
+        if self.bucket.rate < self.max_rate:
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.max_rate / 20))
+
+    def _record(self, endpoint, latency, error=None):
+        with self.lock:
+            self.stats.setdefault(endpoint, EndpointStats()).record(latency, error)
+
+    def metrics(self):
+        """各接口统计汇总（列表，每个接口一行）"""
+        with self.lock:
+            return [stats.summary(endpoint) for endpoint, stats in sorted(self.stats.items())]
+
+    def show_metrics(self):
+        """打印各接口统计"""
+        rows = self.metrics()
+        if not rows:
+            return
+        print(f"\n📡 接口统计 (当前速率 {self.rate:.2f} 次/秒):")
+        for row in rows:
+            print(f"   {row['接口']}: 请求 {row['请求数']} | 成功 {row['成功数']} | "
+                  f"重试 {row['重试数']} | 错误 {row['错误数']} {row['错误明细']}")
+            print(f"      延迟 平均 {row['平均延迟秒']:.3f}s | P50 {row['P50延迟秒']:.3f}s | "
+                  f"P99 {row['P99延迟秒']:.3f}s | 最大 {row['最大延迟秒']:.3f}s")
+
+    def export_metrics(self, filename="接口统计.csv"):
+        """导出各接口统计到CSV"""
+        rows = self.metrics()
+        if not rows:
+            return None
+        with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"✅ 接口统计已导出到 {filename}")
+        return filename
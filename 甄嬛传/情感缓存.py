@@ -0,0 +1,152 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# 默认缓存文件（各分析脚本在同一目录运行时共用）
+DEFAULT_CACHE_PATH = "情感缓存.db"
+# 进程内 LRU 保留的条目数
+DEFAULT_LRU_SIZE = 200000
+# SQLite 单条语句的参数上限以内分批查询
+QUERY_BATCH = 500
+
+
+def normalize_text(text):
+    """缓存键使用的文本：去掉首尾空白（不影响 SnowNLP 分词和得分）"""
+    return text.strip()
+
+
+def text_key(text):
+    """规范化文本的哈希（16字节），作为磁盘缓存的主键"""
+    return hashlib.blake2b(normalize_text(text).encode('utf-8'), digest_size=16).digest()
+
+
+class SentimentCache:
+    """情感得分缓存 - 进程内 LRU + SQLite 磁盘缓存
+
+    - 以规范化文本的哈希为键，同一句弹幕在不同脚本、不同次运行中只评分一次
+    - 磁盘缓存记录模型版本，模型文件或评分方式变化后自动清空
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, model_version='', lru_size=DEFAULT_LRU_SIZE):
+        self.path = path
+        self.model_version = model_version
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+        self._check_version()
+
+    def _create_tables(self):
+        """建表"""
+        with self._lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS scores (
+                    text_hash BLOB PRIMARY KEY,
+                    score REAL NOT NULL
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS meta (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+
+    def _check_version(self):
+        """模型版本与缓存中记录的不一致时清空得分"""
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT value FROM meta WHERE name = 'model_version'").fetchone()
+            if row is not None and row[0] == self.model_version:
+                return
+            if row is not None:
+                print(f"♻️ 情感模型已变化，清空情感缓存 ({row[0]} → {self.model_version})")
+            self.conn.execute("DELETE FROM scores")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('model_version', ?)",
+                (self.model_version,)
+            )
+
+    def _remember(self, key, score):
+        """写入 LRU，超出容量时淘汰最久未用的条目"""
+        self._lru[key] = score
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, keys):
+        """批量查询，返回 {键: 得分}（只含命中的键）"""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                score = self._lru.get(key)
+                if score is None:
+                    missing.append(key)
+                else:
+                    self._lru.move_to_end(key)
+                    found[key] = score
+            self.memory_hits += len(found)
+
+            for start in range(0, len(missing), QUERY_BATCH):
+                batch = missing[start:start + QUERY_BATCH]
+                rows = self.conn.execute(
+                    f"SELECT text_hash, score FROM scores WHERE text_hash IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, score in rows:
+                    found[key] = score
+                    self._remember(key, score)
+                self.disk_hits += len(rows)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """批量写入 (键, 得分)"""
+        items = [(key, float(score)) for key, score in items]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scores (text_hash, score) VALUES (?, ?)", items
+            )
+            for key, score in items:
+                self._remember(key, score)
+
+    def clear(self):
+        """清空内存和磁盘缓存"""
+        with self._lock, self.conn:
+            self._lru.clear()
+            self.conn.execute("DELETE FROM scores")
+
+    def size(self):
+        """磁盘缓存条目数"""
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def show_stats(self):
+        """打印命中情况"""
+        total = self.memory_hits + self.disk_hits + self.misses
+        if total:
+            print(f"🧠 情感缓存: 内存命中 {self.memory_hits} 条，磁盘命中 {self.disk_hits} 条，"
+                  f"未命中 {self.misses} 条 (命中率 {(total - self.misses) / total:.1%})")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+if __name__ == "__main__":
+    # 查看缓存概况
+    if not os.path.exists(DEFAULT_CACHE_PATH):
+        print(f"情感缓存不存在: {DEFAULT_CACHE_PATH}")
+    else:
+        conn = sqlite3.connect(DEFAULT_CACHE_PATH)
+        count = conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        version = conn.execute("SELECT value FROM meta WHERE name = 'model_version'").fetchone()
+        print(f"🧠 情感缓存: {DEFAULT_CACHE_PATH}")
+        print(f"   已缓存文本: {count:,} 条 | 模型版本: {version[0] if version else '未知'}")
+        conn.close()
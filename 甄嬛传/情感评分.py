@@ -0,0 +1,223 @@
+import hashlib
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from 情感缓存 import SentimentCache, normalize_text, text_key
+
+# 文本少于该数量时在当前进程评分（进程池启动开销大于并行收益）
+PARALLEL_THRESHOLD = 1000
+# 每个进程一次处理的文本数
+CHUNK_SIZE = 500
+# 空文本或评分出错时的得分（与原先 get_sentiment 的兜底一致）
+NEUTRAL_SCORE = 0.5
+# 评分方式变化时加一，使旧的磁盘缓存失效
+SCORER_VERSION = 2
+# 分词结果缓存的汉字片段数（弹幕中大量重复的片段只分词一次）
+SEGMENT_CACHE_SIZE = 100000
+
+# 每个进程只构建一次的向量化情感评分器
+_scorer = None
+# 默认情感缓存（首次评分时创建）
+_default_cache = None
+
+
+class NaiveBayesScorer:
+    """向量化的朴素贝叶斯情感评分 - 由 SnowNLP 情感模型导出的对数概率表
+
+    SnowNLP 对每条文本逐词查表、累加对数概率；这里把各类别的词频表一次性转成
+    (词表大小+1, 类别数) 的 NumPy 数组（第0行为未登录词），整批文本分词后组成
+    稀疏的文档-词矩阵，与概率表相乘再做 log-sum-exp，得到与 SnowNLP(text).sentiments
+    一致的积极概率（浮点误差以内）。
+    """
+
+    def __init__(self, classifier=None):
+        from snownlp import normal, seg
+        if classifier is None:
+            from snownlp import sentiment
+            classifier = sentiment.classifier
+
+        self._seg = seg
+        self._stopwords = normal.stop
+        bayes = classifier.classifier
+        self.classes = list(bayes.d)
+        self.pos_index = self.classes.index('pos')
+
+        self.vocab = {}
+        for probs in bayes.d.values():
+            for word in probs.d:
+                self.vocab.setdefault(word, len(self.vocab) + 1)
+
+        # log P(词|类别)，未登录词按加一平滑取 log(1/总数)
+        self.log_prob = np.empty((len(self.vocab) + 1, len(self.classes)), dtype=np.float64)
+        self.log_prior = np.empty(len(self.classes), dtype=np.float64)
+        for k, name in enumerate(self.classes):
+            probs = bayes.d[name]
+            total = probs.getsum()
+            counts = np.full(len(self.vocab) + 1, probs.none, dtype=np.float64)
+            for word, count in probs.d.items():
+                counts[self.vocab[word]] = count
+            self.log_prob[:, k] = np.log(counts) - math.log(total)
+            self.log_prior[k] = math.log(total) - math.log(bayes.total)
+
+        # seg.seg 按汉字片段分别切分，同一片段的结果可以复用
+        self._segment_run = lru_cache(maxsize=SEGMENT_CACHE_SIZE)(seg.single_seg)
+
+    def tokenize(self, text):
+        """分词并去停用词，结果与 Sentiment.handle 相同"""
+        words = []
+        for part in self._seg.re_zh.split(text):
+            part = part.strip()
+            if not part:
+                continue
+            if self._seg.re_zh.match(part):
+                words += self._segment_run(part)
+            else:
+                words += part.split()
+        return [word for word in words if word not in self._stopwords]
+
+    def document_term_ids(self, token_lists):
+        """整批文本转为稀疏文档-词矩阵的坐标形式 (文档下标, 词编号)，重复项即词频"""
+        vocab = self.vocab
+        doc_ids = []
+        word_ids = []
+        for doc, tokens in enumerate(token_lists):
+            doc_ids.extend([doc] * len(tokens))
+            word_ids.extend(vocab.get(word, 0) for word in tokens)
+        return np.asarray(doc_ids, dtype=np.intp), np.asarray(word_ids, dtype=np.intp)
+
+    def score_tokens(self, token_lists):
+        """已分词文本的积极概率"""
+        doc_ids, word_ids = self.document_term_ids(token_lists)
+        n_docs = len(token_lists)
+        # 文档-词矩阵 × 对数概率表：每个类别按文档累加
+        joint = np.empty((n_docs, len(self.classes)), dtype=np.float64)
+        for k in range(len(self.classes)):
+            joint[:, k] = np.bincount(doc_ids, weights=self.log_prob[word_ids, k], minlength=n_docs)
+        joint += self.log_prior
+
+        # log-sum-exp 归一化，避免概率下溢
+        peak = joint.max(axis=1, keepdims=True)
+        log_norm = peak[:, 0] + np.log(np.exp(joint - peak).sum(axis=1))
+        return np.exp(joint[:, self.pos_index] - log_norm)
+
+    def score(self, texts):
+        """一批文本的积极概率，分词出错的文本得分为 0.5"""
+        token_lists = []
+        failed = []
+        for i, text in enumerate(texts):
+            try:
+                token_lists.append(self.tokenize(text))
+            except Exception:
+                token_lists.append([])
+                failed.append(i)
+        scores = self.score_tokens(token_lists)
+        scores[failed] = NEUTRAL_SCORE
+        return scores
+
+
+def _load_scorer():
+    """构建评分器（读取 SnowNLP 模型并导出概率表，每个进程只做一次）"""
+    global _scorer
+    if _scorer is None:
+        _scorer = NaiveBayesScorer()
+    return _scorer
+
+
+def model_version():
+    """情感模型版本：模型文件内容哈希 + 评分方式版本"""
+    from snownlp import sentiment
+    path = sentiment.data_path + '.3'
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    return f"snownlp-{digest}-v{SCORER_VERSION}"
+
+
+def default_sentiment_cache():
+    """各脚本共用的情感缓存（当前目录下的 情感缓存.db）"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SentimentCache(model_version=model_version())
+    return _default_cache
+
+
+def _to_text(value):
+    """缺失值和空文本返回None，其余转为规范化的字符串"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    text = normalize_text(value if isinstance(value, str) else str(value))
+    return text or None
+
+
+def _score_chunk(texts):
+    """在当前进程为一组文本评分，结果与 SnowNLP(text).sentiments 相同"""
+    return _load_scorer().score(texts)
+
+
+def _score_texts(texts, max_workers, chunk_size):
+    """为去重后的文本评分，量大时切块分给进程池"""
+    if max_workers == 1 or len(texts) < PARALLEL_THRESHOLD:
+        return _score_chunk(texts)
+
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    workers = min(max_workers, len(chunks))
+    # initializer 让每个进程先构建好评分器；map 按提交顺序返回结果
+    with ProcessPoolExecutor(max_workers=workers, initializer=_load_scorer) as executor:
+        return np.concatenate(list(executor.map(_score_chunk, chunks)))
+
+
+def score_sentiments(texts, max_workers=None, chunk_size=CHUNK_SIZE, cache=None, verbose=False):
+    """批量情感评分 - 去重、查缓存，未命中的文本多进程评分，返回与输入顺序一致的 NumPy 数组
+
+    参数:
+    texts: 文本序列（列表、Series 等），缺失值和空文本得分为 0.5
+    max_workers (int): 进程数，默认CPU核数；为1时不启动进程池
+    chunk_size (int): 每块文本数
+    cache: SentimentCache，默认使用共用缓存，传 False 不使用缓存
+    verbose (bool): 打印去重和缓存命中情况
+    """
+    texts = list(texts)
+    scores = np.full(len(texts), NEUTRAL_SCORE, dtype=np.float64)
+    if not texts:
+        return scores
+
+    # 先去重：相同文本只评分一次，最后按下标广播回原顺序
+    positions = {}
+    inverse = np.full(len(texts), -1, dtype=np.intp)
+    for i, value in enumerate(texts):
+        text = _to_text(value)
+        if text is not None:
+            inverse[i] = positions.setdefault(text, len(positions))
+    unique_texts = list(positions)
+    unique_scores = np.empty(len(unique_texts), dtype=np.float64)
+
+    if cache is None:
+        cache = default_sentiment_cache()
+    todo = list(range(len(unique_texts)))
+    if cache:
+        keys = [text_key(text) for text in unique_texts]
+        found = cache.get_many(keys)
+        todo = []
+        for i, key in enumerate(keys):
+            if key in found:
+                unique_scores[i] = found[key]
+            else:
+                todo.append(i)
+
+    if todo:
+        max_workers = max_workers or os.cpu_count() or 1
+        new_scores = _score_texts([unique_texts[i] for i in todo], max_workers, max(1, int(chunk_size)))
+        unique_scores[todo] = new_scores
+        if cache:
+            cache.put_many(zip((keys[i] for i in todo), new_scores))
+
+    if verbose:
+        print(f"🧠 情感评分: {len(texts)} 条，去重后 {len(unique_texts)} 条，"
+              f"缓存命中 {len(unique_texts) - len(todo)} 条，新评分 {len(todo)} 条")
+
+    mask = inverse >= 0
+    scores[mask] = unique_scores[inverse[mask]]
+    return scores
@@ -0,0 +1,230 @@
+from collections import Counter
+
+import numpy as np
+
+from 词频统计 import emotion_words
+
+# 细粒度情感类别词典：以 词频统计.py 的 emotion_words 为基础按类别划分，再补充弹幕常用表达
+# 类别与 台词剧情桑基图.py 的颜色表一致；一个词只属于一个类别
+
+# emotion_words 中各词的类别
+SOURCE_CATEGORIES = {
+    '喜悦': {
+        '爱', '笑', '喜', '欢', '痴', '甜', '善', '美', '宠', '幸', '宠幸', '专宠', '盛宠', '恩宠', '荣宠', '喜欢',
+        '喜爱', '疼爱', '宠爱', '开心', '关心', '动心', '爱心', '喜心', '欢心', '痴心', '可爱', '可亲', '可敬', '可喜',
+        '可贺', '高兴', '快乐', '幸福', '兴奋', '激动', '热情', '温柔', '善良', '正直', '忠诚', '信任', '相信', '希望',
+        '期望', '盼望', '渴望', '祈求', '祈祷', '祝福', '赞美', '表扬', '感激', '感谢', '感动',
+    },
+    '愤怒': {
+        '恨', '怒', '怨', '狠', '恨心', '怒心', '怨心', '狠心', '可恨', '可气', '愤怒', '生气', '凶狠', '诅咒', '批评',
+        '责备', '责怪', '埋怨', '抱怨',
+    },
+    '悲伤': {
+        '苦', '痛', '泪', '哭', '悲', '惨', '虐', '酸', '愁', '思', '念', '悔', '愧', '羞', '伤', '冤', '枉',
+        '屈', '失宠', '冷落', '心疼', '心痛', '心碎', '心酸', '心寒', '心凉', '心死', '伤心', '痛心', '寒心', '凉心', '死心',
+        '悲心', '思心', '可怜', '可悲', '可叹', '可惜', '悲伤', '痛苦', '难过', '失望', '绝望', '感慨', '感叹', '叹息',
+    },
+    '恐惧': {
+        '怕', '忧', '担心', '惊心', '慌心', '颤心', '跳心', '可怕', '害怕', '恐惧', '惊慌', '慌张', '慌乱', '惊恐', '惊吓',
+    },
+    '惊讶': {
+        '惊', '呆',
+    },
+    '厌恶': {
+        '毒', '耻', '骄', '傲', '狂', '妄', '奸', '诈', '阴', '险', '恶', '丑', '假', '虚', '辱', '争宠', '嫌弃',
+        '厌恶', '讨厌', '毒心', '机心', '可恶', '可耻', '可笑', '冷漠', '冷淡', '邪恶', '奸诈', '背叛', '怀疑', '不信',
+    },
+}
+
+# emotion_words 中不表达这六类情感的词：中性或描述性的字（真、死、病、疯 等）、
+# “意心”“绪心”等不成词的组合，以及“平静”，都不参与分类
+EXCLUDED_SOURCE_WORDS = {
+    '真', '实', '生', '死', '病', '残', '废', '疯', '傻', '意心', '情心', '绪心', '态心', '灵心', '平静',
+}
+
+# emotion_words 之外补充的词（同义词和弹幕常用表达）
+EXTRA_CATEGORIES = {
+    '喜悦': {
+        '欢喜', '欣慰', '满足', '得意', '骄傲', '哈哈', '嘿嘿', '嘻嘻', '好美', '好甜', '太好了', '好看', '精彩', '名场面',
+        '绝了', '好帅', '笑死', '磕到了', '大快人心', '解气', '痛快', '爽', '牛', '霸气', '帅', '美貌', '漂亮', '好听',
+        '期待', '恭喜', '庆幸', 'awsl',
+    },
+    '愤怒': {
+        '气死', '过分', '该死', '愤恨', '怨恨', '怒火', '发火', '恼火', '火大', '欺人太甚', '岂有此理', '混账', '放肆', '大胆',
+        '气人', '可恨之人', '报仇', '复仇',
+    },
+    '悲伤': {
+        '冤枉', '委屈', '后悔', '悔恨', '思念', '孤独', '寂寞', '凄凉', '悲哀', '悲惨', '泪目', '哭了', '意难平', '呜呜',
+        '好惨', '不开心', '不高兴', '遗憾', '心如死灰', '肝肠寸断', '好苦', '太苦了', '哀',
+    },
+    '恐惧': {
+        '忧虑', '担忧', '紧张', '不安', '吓死', '吓人', '毛骨悚然', '细思极恐', '不寒而栗', '阴森', '胆战心惊', '提心吊胆', '慌',
+        '恐怖',
+    },
+    '惊讶': {
+        '惊讶', '震惊', '吃惊', '竟然', '居然', '没想到', '想不到', '天哪', '天呐', '我的天', '卧槽', '我靠', '反转', '前方高能',
+        '高能', '难以置信', '目瞪口呆', '不可思议', '意外', '万万没想到', '原来如此', '哇',
+    },
+    '厌恶': {
+        '恶心', '阴险', '虚伪', '做作', '矫情', '恶毒', '心机', '绿茶', '白莲花', '鄙视', '呸', '渣', '无耻', '卑鄙', '歹毒',
+        '蛇蝎', '下作', '贱人', '狐媚', '烦',
+    },
+}
+
+
+def build_emotion_lexicon(source_words=emotion_words):
+    """由 source_words 的类别划分和补充词生成 {类别: 词集合}，SOURCE_CATEGORIES 中不在 source_words 里的词不收录"""
+    category_of = {word: category for category, words in SOURCE_CATEGORIES.items() for word in words}
+    lexicon = {category: set(words) for category, words in EXTRA_CATEGORIES.items()}
+    for word in source_words:
+        category = category_of.get(word)
+        if category is not None:
+            lexicon[category].add(word)
+    return lexicon
+
+
+def uncategorised_source_words(source_words=emotion_words):
+    """source_words 中既没有类别也没有排除的词（emotion_words 新增词后应补充到 SOURCE_CATEGORIES）"""
+    categorised = set().union(*SOURCE_CATEGORIES.values())
+    return set(source_words) - categorised - EXCLUDED_SOURCE_WORDS
+
+
+EMOTION_LEXICON = build_emotion_lexicon()
+
+# 没有命中任何情感词时的类别
+NEUTRAL_CATEGORY = '中性'
+# 多标签之间的分隔符
+LABEL_SEPARATOR = '、'
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式匹配自动机 - 每条文本只扫描一遍，耗时与文本长度成线性
+
+    构建后状态转移、失败指针和输出都存放在列表中；查询时沿失败指针回退，
+    不必对每个词单独查找。
+    """
+
+    def __init__(self, patterns):
+        """patterns: {词: 值}"""
+        self.goto = [{}]
+        self.fail = [0]
+        # 每个状态结束的词 (词长, 值)，包括沿失败指针可达的较短的词
+        self.outputs = [[]]
+
+        for word, value in patterns.items():
+            if not word:
+                continue
+            state = 0
+            for char in word:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                state = next_state
+            self.outputs[state].append((len(word), value))
+
+        # 按层序（BFS）计算失败指针，并合并失败状态的输出
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        """所有匹配（含重叠），依次产生 (起点, 终点, 值)"""
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in outputs[state]:
+                yield end - length, end, value
+
+    def longest_matches(self, text):
+        """从左到右取最长且互不重叠的匹配（“不开心”不会再算作“开心”）"""
+        matches = sorted(self.iter_matches(text), key=lambda match: (match[0], match[0] - match[1]))
+        selected = []
+        covered = 0
+        for start, end, value in matches:
+            if start >= covered:
+                selected.append((start, end, value))
+                covered = end
+        return selected
+
+
+class EmotionClassifier:
+    """基于词典的多标签情感分类（喜悦/愤怒/悲伤/恐惧/惊讶/厌恶，未命中为中性）"""
+
+    def __init__(self, lexicon=None):
+        lexicon = EMOTION_LEXICON if lexicon is None else lexicon
+        self.categories = list(lexicon)
+        patterns = {}
+        for category, words in lexicon.items():
+            for word in words:
+                patterns[word] = category
+        self.automaton = AhoCorasick(patterns)
+
+    def category_counts(self, text):
+        """各类别命中的情感词数，按首次出现顺序"""
+        if not isinstance(text, str) or not text:
+            return Counter()
+        return Counter(category for _, _, category in self.automaton.longest_matches(text))
+
+    def classify(self, text):
+        """返回 (主类别, 全部类别列表)；主类别为命中最多的类别，相同时取先出现的"""
+        counts = self.category_counts(text)
+        if not counts:
+            return NEUTRAL_CATEGORY, [NEUTRAL_CATEGORY]
+        return counts.most_common(1)[0][0], list(counts)
+
+    def classify_many(self, texts):
+        """批量分类，返回 (主类别数组, 多标签字符串数组)"""
+        primary = []
+        labels = []
+        for text in texts:
+            category, categories = self.classify(text)
+            primary.append(category)
+            labels.append(LABEL_SEPARATOR.join(categories))
+        return np.asarray(primary, dtype=object), np.asarray(labels, dtype=object)
+
+
+# 默认分类器（首次使用时构建）
+_default_classifier = None
+
+
+def default_emotion_classifier():
+    """各脚本共用的情感类别分类器"""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = EmotionClassifier()
+    return _default_classifier
+
+
+def add_emotion_columns(df, text_col):
+    """为 DataFrame 加上 情感类别（主类别）和 情感标签（多标签，用“、”分隔）两列"""
+    primary, labels = default_emotion_classifier().classify_many(df[text_col])
+    df['情感类别'] = primary
+    df['情感标签'] = labels
+    return df
+
+
+if __name__ == "__main__":
+    # 查看各类别词数，以及 emotion_words 中尚未分类的词
+    for category, words in EMOTION_LEXICON.items():
+        print(f"{category}: {len(words)} 个词")
+    missing = uncategorised_source_words()
+    if missing:
+        print(f"⚠️ emotion_words 中未分类的词: {'、'.join(sorted(missing))}")
+    else:
+        print("✅ emotion_words 中的词均已分类或排除")
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from 弹幕列式存储 import iter_danmu_table
+from 情感评分 import score_sentiments
+
+# 每个时间桶的长度（秒）
+DEFAULT_BUCKET_SECONDS = 10
+# 平滑曲线的时间窗口（秒）：窗口覆盖固定的视频时长，而不是固定条数
+DEFAULT_SMOOTH_SECONDS = 60
+# 分块读取文件时每块的行数
+READ_CHUNK_ROWS = 100000
+
+
+class SentimentTrend:
+    """情感得分随视频时间变化的流式汇总
+
+    按 出现时间秒 分到固定长度的时间桶，每个桶只保存 条数、得分和、得分平方和，
+    可以逐批加入数据（大文件分块读取、直播实时回调），内存只与桶数有关。
+    """
+
+    def __init__(self, bucket_seconds=DEFAULT_BUCKET_SECONDS):
+        if bucket_seconds <= 0:
+            raise ValueError("时间桶长度必须大于0")
+        self.bucket_seconds = float(bucket_seconds)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros(0, dtype=np.float64)
+        self.sumsq = np.zeros(0, dtype=np.float64)
+
+    @property
+    def total(self):
+        """已加入的弹幕条数"""
+        return int(self.counts.sum())
+
+    def _grow(self, size):
+        """桶数组扩展到至少 size 个"""
+        if size <= len(self.counts):
+            return
+        extra = size - len(self.counts)
+        self.counts = np.concatenate([self.counts, np.zeros(extra, dtype=np.int64)])
+        self.sums = np.concatenate([self.sums, np.zeros(extra, dtype=np.float64)])
+        self.sumsq = np.concatenate([self.sumsq, np.zeros(extra, dtype=np.float64)])
+
+    def add(self, times, scores):
+        """加入一批 (出现时间秒, 情感得分)，时间或得分缺失的跳过"""
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        scores = np.atleast_1d(np.asarray(scores, dtype=np.float64))
+        valid = np.isfinite(times) & np.isfinite(scores)
+        if not valid.any():
+            return
+        buckets = (np.maximum(times[valid], 0.0) // self.bucket_seconds).astype(np.intp)
+        scores = scores[valid]
+
+        size = max(len(self.counts), int(buckets.max()) + 1)
+        self._grow(size)
+        self.counts += np.bincount(buckets, minlength=size)
+        self.sums += np.bincount(buckets, weights=scores, minlength=size)
+        self.sumsq += np.bincount(buckets, weights=scores * scores, minlength=size)
+
+    def add_frame(self, df, time_col='出现时间秒', score_col='情感得分'):
+        """加入一个DataFrame中的弹幕"""
+        self.add(pd.to_numeric(df[time_col], errors='coerce'), df[score_col])
+
+    def merge(self, other):
+        """合并另一个汇总（桶长度须相同），用于分文件或多进程统计后汇总"""
+        if other.bucket_seconds != self.bucket_seconds:
+            raise ValueError("时间桶长度不同，无法合并")
+        self._grow(len(other.counts))
+        size = len(other.counts)
+        self.counts[:size] += other.counts
+        self.sums[:size] += other.sums
+        self.sumsq[:size] += other.sumsq
+        return self
+
+    def summary(self):
+        """每个桶的 起始秒、条数、平均得分、标准差"""
+        counts = self.counts.astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.sums / counts
+            std = np.sqrt(np.maximum(self.sumsq / counts - mean * mean, 0.0))
+        return pd.DataFrame({
+            '时间秒': np.arange(len(self.counts)) * self.bucket_seconds,
+            '条数': self.counts,
+            '平均得分': mean,
+            '标准差': std,
+        })
+
+    def smoothed(self, window_seconds=DEFAULT_SMOOTH_SECONDS):
+        """按时间窗口平滑：每个桶取前后共 window_seconds 秒内全部弹幕的平均得分和标准差
+
+        返回 (桶中心秒, 平滑平均, 平滑标准差)，窗口内没有弹幕的位置为 NaN。
+        窗口桶数取奇数（偶数时加一），以当前桶为中心；桶数少于窗口时照常返回每个桶一个值，没有桶时返回空数组
+        """
+        n = len(self.counts)
+        if n == 0:
+            empty = np.zeros(0, dtype=np.float64)
+            return empty, empty, empty
+        width = max(1, int(round(window_seconds / self.bucket_seconds))) | 1
+        half = width // 2
+        kernel = np.ones(width)
+        # 'full' 卷积再截回 n 个：第 i 个值为桶 i-half 到 i+half 之和，不受窗口比桶数长的影响
+        counts = np.convolve(self.counts.astype(np.float64), kernel, mode='full')[half:half + n]
+        sums = np.convolve(self.sums, kernel, mode='full')[half:half + n]
+        sumsq = np.convolve(self.sumsq, kernel, mode='full')[half:half + n]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(counts > 0, sums / counts, np.nan)
+            std = np.sqrt(np.maximum(sumsq / counts - mean * mean, 0.0))
+        centers = (np.arange(n) + 0.5) * self.bucket_seconds
+        return centers, mean, std
+
+    def plot(self, ax, window_seconds=DEFAULT_SMOOTH_SECONDS):
+        """画趋势图：灰点为各时间桶平均得分（大小表示弹幕量），红线为时间窗口平滑曲线
+
+        没有数据时不画，返回 False
+        """
+        if self.total == 0:
+            return False
+        table = self.summary()
+        table = table[table['条数'] > 0]
+        sizes = 10 + 90 * table['条数'] / max(1, table['条数'].max())
+        ax.scatter(table['时间秒'] + self.bucket_seconds / 2, table['平均得分'],
+                   s=sizes, alpha=0.3, color='gray')
+        centers, mean, std = self.smoothed(window_seconds)
+        ax.plot(centers, mean, color='red', linewidth=2)
+        ax.fill_between(centers, mean - std, mean + std, color='red', alpha=0.1)
+        return True
+
+    def live_handler(self):
+        """直播弹幕采集的在线分析回调：为每批弹幕评分后加入汇总（时间为相对开播采集的秒数）"""
+        def handle(batch):
+            scores = score_sentiments([record.content for record in batch])
+            self.add([record.appear_time for record in batch], scores)
+        return handle
+
+
+def trend_from_file(file_path, bucket_seconds=DEFAULT_BUCKET_SECONDS, chunk_rows=READ_CHUNK_ROWS,
+                    time_col='出现时间秒', score_col='情感得分', text_col='弹幕内容', parquet_path=None):
+    """分块读取弹幕文件（CSV或Parquet）生成情感趋势，文件没有得分列时逐块评分"""
+    trend = SentimentTrend(bucket_seconds)
+    for chunk in iter_danmu_table(file_path, chunk_rows=chunk_rows, parquet_path=parquet_path):
+        if score_col not in chunk.columns:
+            chunk[score_col] = score_sentiments(chunk[text_col])
+        trend.add_frame(chunk, time_col, score_col)
+    return trend
@@ -0,0 +1,246 @@
+import math
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from 分词自动机 import CJK_FIRST, CJK_LAST
+
+# 候选词的最大长度（“贱人就是矫情”为6个字）
+DEFAULT_MAX_LEN = 6
+# 候选词至少出现的次数
+DEFAULT_MIN_COUNT = 5
+# 凝固度（各切分点中最小的点互信息）下限
+DEFAULT_MIN_PMI = 3.0
+# 左右邻字熵（取较小的）下限：边界越自由越像独立的词
+DEFAULT_MIN_ENTROPY = 1.0
+# 新词词典文件（jieba 用户词典格式：词 频次 词性），分词器和 jieba 都从这里加载
+NEW_WORDS_PATH = "新词词典.txt"
+# 写入 jieba 用户词典时的词性（其他专名）
+NEW_WORD_TAG = 'nz'
+
+# 连续的汉字片段，其余字符都视为边界
+CJK_RUN_PATTERN = re.compile(f'[{CJK_FIRST}-{CJK_LAST}]+')
+
+# 已加载到 jieba 的用户词典
+_loaded_userdicts = set()
+
+
+def build_sequence(texts):
+    """各文本的汉字片段用 '\\0' 连接成一个序列（末尾也是 '\\0'），n-gram 不会跨过边界"""
+    if isinstance(texts, str):
+        texts = [texts]
+    runs = []
+    for text in texts:
+        if isinstance(text, str):
+            runs.extend(CJK_RUN_PATTERN.findall(text))
+    return '\0'.join(runs) + '\0'
+
+
+def _dense_rank(values):
+    """把数组换成从0开始的连续名次（相同的值名次相同），用 int32 节省内存"""
+    order = np.argsort(values, kind='stable')
+    ordered = values[order]
+    ranks = np.empty(len(values), dtype=np.int32)
+    ranks[order] = np.concatenate([[0], np.cumsum(ordered[1:] != ordered[:-1], dtype=np.int32)])
+    return ranks
+
+
+class SuffixIndex:
+    """截断后缀数组 - 只按前 depth 个字排序的后缀数组
+
+    n-gram 最长 depth-1 个字，再加一个右邻字，比较前 depth 个字就够了：
+    倍增排序只需 log2(depth) 轮，重复很多的弹幕也不会让排序变慢。
+    排好序后，同一个 n-gram 的所有出现位置是连续的一段，其中右邻字相同的又各自连续，
+    频次和右邻字熵都可以整批向量化计算。
+    """
+
+    def __init__(self, sequence, depth):
+        if not sequence.endswith('\0'):
+            sequence += '\0'
+        self.sequence = sequence
+        self.depth = depth
+        raw = np.frombuffer(sequence.encode('utf-32-le'), dtype=np.uint32)
+        # 字符压缩为连续编号，边界 '\0' 最小，编号为0
+        self.codes = _dense_rank(raw)
+        del raw
+        n = len(self.codes)
+
+        # 倍增：每轮把参与比较的长度从 k 加倍到 2k
+        rank = self.codes
+        k = 1
+        while k < depth:
+            key = rank.astype(np.int64) * (n + 1)
+            key[:-k] += rank[k:]
+            rank = _dense_rank(key)
+            del key
+            k *= 2
+        self.suffixes = np.argsort(rank, kind='stable').astype(np.int32)
+        del rank
+
+        # 每个位置到下一个边界的汉字数（超过 depth 的记为 depth，该位置开头最长的 n-gram）
+        boundaries = np.flatnonzero(self.codes == 0)
+        positions = np.arange(n)
+        run_length = boundaries[np.searchsorted(boundaries, positions)] - positions
+        self.run_length = np.minimum(run_length, depth).astype(np.int16)
+        del positions, run_length
+
+        # 相邻后缀的公共前缀长度（不超过 depth，不跨边界）
+        padded = np.concatenate([self.codes, np.zeros(depth, dtype=np.int32)])
+        self.lcp = np.zeros(n, dtype=np.int16)
+        alive = np.ones(n - 1, dtype=bool)
+        for offset in range(depth):
+            current = padded[self.suffixes[1:] + offset]
+            alive &= (current == padded[self.suffixes[:-1] + offset]) & (current != 0)
+            self.lcp[1:] += alive
+
+    def ngram_stats(self, n, min_count):
+        """长度为 n 的 n-gram：{词: (频次, 右邻字熵)}，只保留频次不低于 min_count 的
+
+        右邻字为边界时每次出现都算作不同的邻字（出现在句末的词右边界是自由的）。
+        """
+        rows = self.run_length[self.suffixes] >= n
+        # 新的 n-gram 从公共前缀 < n 的行开始，新的右邻字从公共前缀 < n+1 的行开始
+        group_start = rows & (self.lcp < n)
+        run_start = rows & (self.lcp < n + 1)
+
+        group_of_row = np.cumsum(group_start) - 1
+        run_of_row = np.cumsum(run_start) - 1
+        freq = np.bincount(group_of_row[rows])
+        run_size = np.bincount(run_of_row[rows])
+        run_group = group_of_row[run_start]
+
+        # H = log f - Σ s·log s / f，s 为各右邻字的次数
+        weighted = np.bincount(run_group, weights=run_size * np.log(run_size), minlength=len(freq))
+        entropy = np.log(freq) - weighted / freq
+
+        first_rows = np.flatnonzero(group_start)
+        stats = {}
+        for group in np.flatnonzero(freq >= min_count).tolist():
+            start = int(self.suffixes[first_rows[group]])
+            stats[self.sequence[start:start + n]] = (int(freq[group]), float(entropy[group]))
+        return stats
+
+
+def _jieba_vocabulary():
+    """jieba 主词典中的词（用于排除已收录的常用词），未安装 jieba 时返回None"""
+    try:
+        import jieba
+    except ImportError:
+        return None
+    jieba.initialize()
+    return {word for word, freq in jieba.dt.FREQ.items() if freq}
+
+
+def discover_new_words(texts, max_len=DEFAULT_MAX_LEN, min_count=DEFAULT_MIN_COUNT, min_pmi=DEFAULT_MIN_PMI,
+                       min_entropy=DEFAULT_MIN_ENTROPY, known_words=(), exclude_jieba=True, verbose=True):
+    """新词发现 - 按频次、凝固度（点互信息）和左右邻字熵从文本中找出候选新词
+
+    参数:
+    texts: 文本或文本序列（弹幕、台词等）
+    max_len (int): 候选词最大长度
+    min_count (int): 最少出现次数
+    min_pmi (float): 凝固度下限（各切分点 log(p(词)/(p(左)p(右))) 的最小值）
+    min_entropy (float): 左右邻字熵中较小者的下限
+    known_words: 已在词典中的词，不作为新词返回
+    exclude_jieba (bool): 同时排除 jieba 主词典已收录的词（未安装 jieba 时不排除）
+
+    返回按得分排序的 DataFrame（词、频次、凝固度、左熵、右熵、得分），得分 = log(频次) × min(左熵, 右熵)
+    """
+    sequence = build_sequence(texts)
+    total_chars = len(sequence) - sequence.count('\0')
+    columns = ['词', '频次', '凝固度', '左熵', '右熵', '得分']
+    if total_chars == 0:
+        return pd.DataFrame(columns=columns)
+
+    # 正序的索引给出频次和右邻字熵，逆序文本的索引给出左邻字熵（两个索引先后构建，不同时占用内存）
+    counts = {}
+    right = {}
+    index = SuffixIndex(sequence, max_len + 1)
+    for n in range(1, max_len + 1):
+        for word, (freq, entropy) in index.ngram_stats(n, min_count).items():
+            counts[word] = freq
+            right[word] = entropy
+    left = {}
+    index = SuffixIndex(sequence[-2::-1], max_len + 1)
+    for n in range(1, max_len + 1):
+        for word, (_, entropy) in index.ngram_stats(n, min_count).items():
+            left[word[::-1]] = entropy
+    del index
+
+    known_words = set(known_words)
+    if exclude_jieba:
+        vocabulary = _jieba_vocabulary()
+        if vocabulary is None:
+            if verbose:
+                print("⚠️ 未安装 jieba，常用词不会被排除")
+        else:
+            known_words |= vocabulary
+    rows = []
+    for word, freq in counts.items():
+        if len(word) < 2 or word in known_words:
+            continue
+        # 凝固度：任意切成两半，整体出现的概率都远大于两半独立出现的概率
+        pmi = min(math.log(freq * total_chars / (counts[word[:i]] * counts[word[i:]]))
+                  for i in range(1, len(word)))
+        entropy = min(left[word], right[word])
+        if pmi >= min_pmi and entropy >= min_entropy:
+            rows.append((word, freq, pmi, left[word], right[word], math.log(freq) * entropy))
+
+    result = pd.DataFrame(rows, columns=columns).sort_values('得分', ascending=False, ignore_index=True)
+    if verbose:
+        print(f"🔎 新词发现: {total_chars:,} 个汉字，{len(counts):,} 个高频 n-gram，发现新词 {len(result)} 个")
+    return result
+
+
+def save_user_dict(new_words, path=NEW_WORDS_PATH):
+    """把新词写成 jieba 用户词典（词 频次 词性），分词器也从这个文件加载"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for word, freq in zip(new_words['词'], new_words['频次']):
+            f.write(f"{word} {int(freq)} {NEW_WORD_TAG}\n")
+    print(f"✅ 新词词典已保存: {path} ({len(new_words)} 个词)")
+    return path
+
+
+def load_user_dict_words(path=NEW_WORDS_PATH):
+    """读取新词词典中的词，文件不存在时返回空列表"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.split()[0] for line in f if line.strip()]
+
+
+def load_jieba_userdict(path=NEW_WORDS_PATH):
+    """新词词典存在时加载到 jieba（每个文件只加载一次）"""
+    if path in _loaded_userdicts or not os.path.exists(path):
+        return
+    import jieba
+    jieba.load_userdict(path)
+    _loaded_userdicts.add(path)
+
+
+if __name__ == "__main__":
+    # 从弹幕和台词CSV中发现新词并生成词典
+    import glob
+    texts = []
+    for file_path in glob.glob(os.path.join("弹幕数据CSV", "*.csv")) + glob.glob(os.path.join("台词CSV+情感分析", "*.csv")):
+        for encoding in ('utf-8-sig', 'gbk'):
+            try:
+                df = pd.read_csv(file_path, encoding=encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            continue
+        # 每个文件取一列文本（部分台词文件同时有 dialogue 和 台词 两列）
+        for column in ('弹幕内容', 'dialogue', '台词'):
+            if column in df.columns:
+                texts.extend(df[column].dropna().astype(str))
+                break
+
+    from 词频统计 import emotion_words, zhuanhuan_keywords
+    new_words = discover_new_words(texts, known_words=zhuanhuan_keywords | emotion_words)
+    print(new_words.head(30).to_string(index=False))
+    if len(new_words):
+        save_user_dict(new_words)
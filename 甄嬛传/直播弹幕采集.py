@@ -0,0 +1,425 @@
+import csv
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+
+import requests
+
+from 弹幕字段 import SAVE_FIELDS, DanmuRecord
+
+# websocket-client 为可选依赖：只有直播采集需要
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+# brotli 为可选依赖：没有安装时向服务端请求 zlib 压缩
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+LIVE_API_BASE = "https://api.live.bilibili.com"
+DEFAULT_WS_URL = "wss://broadcastlv.chat.bilibili.com/sub"
+
+# 数据包头：包长(4) 头长(2) 协议版本(2) 操作码(4) 序号(4)，大端
+HEADER = struct.Struct('>IHHII')
+
+# 协议版本
+PROTO_JSON = 0
+PROTO_HEARTBEAT = 1
+PROTO_ZLIB = 2
+PROTO_BROTLI = 3
+
+# 操作码
+OP_HEARTBEAT = 2
+OP_HEARTBEAT_REPLY = 3
+OP_MESSAGE = 5
+OP_AUTH = 7
+OP_AUTH_REPLY = 8
+
+# 心跳间隔（服务端约70秒无心跳会断开）
+HEARTBEAT_INTERVAL = 30
+# 内存队列上限，满时接收线程等待写入线程（背压）
+QUEUE_SIZE = 20000
+# 攒够多少条或隔多少秒写一次盘
+FLUSH_SIZE = 2000
+FLUSH_INTERVAL = 5.0
+# 断线重连的最长等待秒数
+MAX_RECONNECT_DELAY = 60.0
+
+
+def live_available():
+    """是否安装了 websocket-client"""
+    return websocket is not None
+
+
+def pack_packet(op, body=b'', proto=PROTO_HEARTBEAT, seq=1):
+    """打包一个数据包"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return HEADER.pack(HEADER.size + len(body), HEADER.size, proto, op, seq) + body
+
+
+def iter_packets(data):
+    """拆分数据包，压缩包体递归解压后逐个产出 (操作码, 包体)"""
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        packet_len, header_len, proto, op, _ = HEADER.unpack_from(data, offset)
+        if packet_len < header_len:
+            break
+        body = data[offset + header_len:offset + packet_len]
+        offset += packet_len
+
+        if op == OP_MESSAGE and proto == PROTO_ZLIB:
+            yield from iter_packets(zlib.decompress(body))
+        elif op == OP_MESSAGE and proto == PROTO_BROTLI:
+            if brotli is None:
+                raise RuntimeError("收到brotli压缩包，需要安装 brotli: pip install brotli")
+            yield from iter_packets(brotli.decompress(body))
+        else:
+            yield op, body
+
+
+def auth_packet(room_id, token='', uid=0):
+    """进房认证包"""
+    body = {
+        'uid': uid,
+        'roomid': room_id,
+        'protover': PROTO_BROTLI if brotli is not None else PROTO_ZLIB,
+        'platform': 'web',
+        'type': 2,
+        'key': token,
+    }
+    return pack_packet(OP_AUTH, json.dumps(body))
+
+
+def heartbeat_packet():
+    return pack_packet(OP_HEARTBEAT, '[object Object]')
+
+
+def get_danmu_server(room_id, session=None, api_base=None):
+    """获取弹幕服务器地址和认证token，失败时使用默认地址"""
+    api_base = api_base or LIVE_API_BASE
+    session = session or requests.Session()
+    try:
+        response = session.get(f"{api_base}/xlive/web-room/v1/index/getDanmuInfo",
+                               params={'id': room_id, 'type': 0}, timeout=10)
+        data = response.json()
+        if data.get('code') == 0:
+            info = data['data']
+            host = info['host_list'][0]
+            return f"wss://{host['host']}:{host['wss_port']}/sub", info.get('token', '')
+        print(f"获取弹幕服务器失败: {data.get('message')}")
+    except Exception as e:
+        print(f"获取弹幕服务器失败: {e}")
+    return DEFAULT_WS_URL, ''
+
+
+def danmu_from_message(message, start_time):
+    """DANMU_MSG 消息转为弹幕记录，出现时间为相对采集开始的秒数"""
+    info = message['info']
+    meta = info[0]
+    send_ms = int(meta[4])
+    send_timestamp = send_ms // 1000
+
+    # 新版消息在 extra 中带有弹幕ID，旧版用 发送毫秒-随机数 代替
+    row_id = None
+    if len(meta) > 15 and isinstance(meta[15], dict):
+        try:
+            row_id = json.loads(meta[15].get('extra') or '{}').get('id_str')
+        except ValueError:
+            row_id = None
+    if not row_id:
+        row_id = f"{send_ms}-{meta[5]}"
+
+    return DanmuRecord(
+        appear_time=max(0.0, send_ms / 1000 - start_time),
+        mode=int(meta[1]),
+        font_size=int(meta[2]),
+        color=int(meta[3]),
+        send_timestamp=send_timestamp,
+        send_year=datetime.fromtimestamp(send_timestamp).year,
+        timestamp_str=str(send_timestamp),
+        user_hash=str(meta[7]),
+        content=info[1],
+        row_id=row_id,
+    )
+
+
+class LiveDanmuIngester:
+    """直播间弹幕采集器
+
+    - 接收线程：维持WebSocket连接、心跳和断线重连，解包后放入有界队列
+    - 写入线程：从队列取弹幕，攒批追加写入CSV，并调用在线分析回调
+    队列满时接收线程阻塞等待，内存占用不随消息量增长。
+    """
+
+    def __init__(self, room_id, output=None, url=None, token=None, api_base=None,
+                 queue_size=QUEUE_SIZE, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 heartbeat_interval=HEARTBEAT_INTERVAL, max_reconnect_delay=MAX_RECONNECT_DELAY):
+        if not live_available():
+            raise ImportError("直播采集需要安装 websocket-client: pip install websocket-client")
+
+        self.room_id = room_id
+        self.output = output or f"直播弹幕_{room_id}_{datetime.now():%Y%m%d}.csv"
+        self.url = url
+        self.token = token
+        self.api_base = api_base
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handlers = []
+        self._stop = threading.Event()
+        self._ws = None
+        self.start_time = time.time()
+        self.stats = Counter()
+
+    def add_handler(self, handler):
+        """注册在线分析回调，每次写盘时以该批弹幕记录列表调用"""
+        self.handlers.append(handler)
+
+    def stop(self):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            # 直接断开，不等待服务端回应关闭帧
+            ws.shutdown()
+
+    def run(self, duration=None):
+        """开始采集，duration 秒后或 Ctrl+C 时停止，返回统计"""
+        self.start_time = time.time()
+        receiver = threading.Thread(target=self._receive_loop, name='live-receiver', daemon=True)
+        writer = threading.Thread(target=self._write_loop, name='live-writer', daemon=True)
+        receiver.start()
+        writer.start()
+
+        print(f"📺 开始采集直播间 {self.room_id} 的弹幕，保存到 {self.output}")
+        try:
+            while receiver.is_alive():
+                receiver.join(timeout=1.0)
+                if duration and time.time() - self.start_time >= duration:
+                    break
+        except KeyboardInterrupt:
+            print("\n⏹️ 停止采集...")
+        finally:
+            self.stop()
+            receiver.join(timeout=5)
+            writer.join()
+
+        self.show_statistics()
+        return dict(self.stats)
+
+    def _connect(self):
+        """建立连接并完成进房认证"""
+        url, token = self.url, self.token
+        if url is None:
+            url, server_token = get_danmu_server(self.room_id, api_base=self.api_base)
+            token = server_token if token is None else token
+        ws = websocket.create_connection(url, timeout=10)
+        ws.send_binary(auth_packet(self.room_id, token or ''))
+        return ws
+
+    def _receive_loop(self):
+        """接收循环：断线后指数退避重连"""
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                self._ws = self._connect()
+                self.stats['connections'] += 1
+                print(f"🔗 已连接弹幕服务器 (第 {self.stats['connections']} 次)")
+                attempt = 0
+                self._read_messages(self._ws)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                print(f"⚠️ 连接中断: {e}")
+            finally:
+                if self._ws is not None:
+                    try:
+                        self._ws.close()
+                    except Exception:
+                        pass
+                    self._ws = None
+
+            if self._stop.is_set():
+                break
+            delay = min(self.max_reconnect_delay, 2 ** attempt)
+            attempt += 1
+            self.stats['reconnects'] += 1
+            print(f"🔄 {delay:.0f}秒后重连...")
+            self._stop.wait(delay)
+
+    def _read_messages(self, ws):
+        """读取消息直到连接关闭，期间定时发送心跳"""
+        ws.settimeout(1.0)
+        next_heartbeat = 0.0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                ws.send_binary(heartbeat_packet())
+                next_heartbeat = now + self.heartbeat_interval
+
+            try:
+                data = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+            if not data:
+                raise ConnectionError("服务端关闭连接")
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+
+            for op, body in iter_packets(data):
+                if op == OP_MESSAGE:
+                    self._handle_message(body)
+                elif op == OP_HEARTBEAT_REPLY and len(body) >= 4:
+                    self.stats['popularity'] = struct.unpack('>I', body[:4])[0]
+                elif op == OP_AUTH_REPLY:
+                    code = json.loads(body or b'{}').get('code', 0)
+                    if code != 0:
+                        raise ConnectionError(f"进房认证失败: {code}")
+
+    def _handle_message(self, body):
+        """解析一条业务消息，弹幕放入队列（队列满时等待）"""
+        self.stats['messages'] += 1
+        try:
+            message = json.loads(body)
+        except ValueError:
+            self.stats['bad_messages'] += 1
+            return
+        # 新版cmd可能带后缀，如 DANMU_MSG:4:0:2:2:2:0
+        if not message.get('cmd', '').startswith('DANMU_MSG'):
+            return
+        try:
+            record = danmu_from_message(message, self.start_time)
+        except (KeyError, IndexError, TypeError, ValueError):
+            self.stats['bad_messages'] += 1
+            return
+
+        if self.queue.full():
+            self.stats['backpressure_waits'] += 1
+        while not self._stop.is_set():
+            try:
+                self.queue.put(record, timeout=1.0)
+                self.stats['received'] += 1
+                return
+            except queue.Full:
+                continue
+
+    def _write_loop(self):
+        """写入循环：攒批追加到CSV，停止时写完队列中剩余的弹幕"""
+        new_file = not os.path.exists(self.output)
+        with open(self.output, 'a', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(SAVE_FIELDS)
+
+            batch = []
+            last_flush = time.monotonic()
+            while True:
+                stopping = self._stop.is_set()
+                try:
+                    batch.append(self.queue.get(timeout=0.2))
+                    # 队列中已有的弹幕一次取完，避免逐条等待
+                    while len(batch) < self.flush_size:
+                        batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+                due = time.monotonic() - last_flush >= self.flush_interval
+                if batch and (len(batch) >= self.flush_size or due or stopping):
+                    self._flush(batch, writer, f)
+                    batch = []
+                    last_flush = time.monotonic()
+                elif due:
+                    last_flush = time.monotonic()
+
+                if stopping and self.queue.empty() and not batch:
+                    break
+
+    def _flush(self, batch, writer, f):
+        """写入一批弹幕并调用在线分析回调"""
+        writer.writerows(record.csv_row() for record in batch)
+        f.flush()
+        self.stats['written'] += len(batch)
+        self.stats['flushes'] += 1
+        for handler in self.handlers:
+            try:
+                handler(batch)
+            except Exception as e:
+                print(f"⚠️ 在线分析出错: {e}")
+
+    def show_statistics(self):
+        """显示采集统计"""
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        print(f"\n📊 直播弹幕采集统计:")
+        print(f"   运行时长: {elapsed:.1f} 秒 | 连接 {self.stats['connections']} 次 | "
+              f"重连 {self.stats['reconnects']} 次")
+        print(f"   消息数: {self.stats['messages']} | 弹幕数: {self.stats['received']} | "
+              f"已写入: {self.stats['written']}")
+        print(f"   吞吐量: {self.stats['messages'] / elapsed:.1f} 消息/秒, "
+              f"{self.stats['received'] / elapsed:.1f} 弹幕/秒")
+        if self.stats['backpressure_waits']:
+            print(f"   队列背压等待: {self.stats['backpressure_waits']} 次")
+        if self.stats['bad_messages']:
+            print(f"   无法解析的消息: {self.stats['bad_messages']} 条")
+
+
+class LiveDanmuMonitor:
+    """在线分析：定期输出弹幕速率和这段时间的高频弹幕"""
+
+    def __init__(self, report_interval=10.0, top_n=5):
+        self.report_interval = report_interval
+        self.top_n = top_n
+        self.total = 0
+        self.last_report = time.time()
+        self.window_count = 0
+        self.window = Counter()
+
+    def __call__(self, batch):
+        self.total += len(batch)
+        self.window_count += len(batch)
+        self.window.update(record.content for record in batch)
+
+        now = time.time()
+        if now - self.last_report < self.report_interval:
+            return
+        rate = self.window_count / (now - self.last_report)
+        top = ' | '.join(f"{text}×{count}" for text, count in self.window.most_common(self.top_n))
+        print(f"💬 累计 {self.total} 条，当前 {rate:.1f} 条/秒，高频: {top}")
+        # 每个统计周期重新计数，避免计数器无限增长
+        self.last_report = now
+        self.window_count = 0
+        self.window.clear()
+
+
+def main():
+    print("📺 B站直播弹幕采集")
+    print("=" * 50)
+    if not live_available():
+        print("❌ 需要安装 websocket-client: pip install websocket-client")
+        return
+
+    room = input("请输入直播间号: ").strip()
+    if not room.isdigit():
+        print("直播间号应为数字")
+        return
+    minutes = input("采集多少分钟? (直接回车则一直采集，Ctrl+C 停止): ").strip()
+    duration = float(minutes) * 60 if minutes.replace('.', '', 1).isdigit() else None
+
+    ingester = LiveDanmuIngester(int(room))
+    ingester.add_handler(LiveDanmuMonitor())
+    ingester.run(duration=duration)
+
+
+if __name__ == "__main__":
+    main()
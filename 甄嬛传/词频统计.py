@@ -1,6 +1,48 @@
 import re
-from collections import Counter
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import codecs
+import contextlib
+import io
 import os
+import time
+
+from 分词自动机 import AutomatonSegmenter
+from 新词发现 import discover_new_words, load_user_dict_words, save_user_dict
+from 高频词估计 import HeavyHitterSketch
+
+# 默认分词后端：'automaton' 为数组自动机，'trie' 为原先的字典树
+DEFAULT_SEGMENTER_BACKEND = 'automaton'
+# 分块少于该数量时在当前进程分词（进程池启动开销大于并行收益）
+PARALLEL_MIN_CHUNKS = 8
+# 每个进程任务处理的分块数
+CHUNKS_PER_TASK = 4
+
+# 超过该大小的文件默认流式分析（不整体读入内存）
+STREAM_THRESHOLD_BYTES = 100 * 1024 * 1024
+# 流式读取时每块的字符数
+STREAM_BLOCK_CHARS = 1024 * 1024
+# 找不到可切开的换行时，最多积压的块数（超过后强制切开，保证内存有上限）
+MAX_CARRY_BLOCKS = 4
+# 流式并行时每个进程最多在途的任务数
+STREAM_TASKS_PER_WORKER = 2
+# 流式分词每处理多少个分块显示一次进度
+STREAM_PROGRESS_CHUNKS = 100
+# 判断编码时读取的文件开头字节数
+ENCODING_SAMPLE_BYTES = 64 * 1024
+# 依次尝试的文本编码
+TEXT_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']
+
+# 一次扫描删除括号注释、字母数字和标点（与原先分步替换的结果相同）
+CLEAN_PATTERN = re.compile(r'[\(（].*?[）\)]|[0-9a-zA-Z，。！？；："「」『』《》【】、]+', re.DOTALL)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+# 文本末尾未闭合的括号（括号注释可能跨行，分块时不能从中间切开）
+UNCLOSED_PAREN_PATTERN = re.compile(r'[\(（][^）\)]*\Z')
+
+# 每个工作进程只构建一次的分词器
+_worker_segmenter = None
+# 工作进程的近似统计参数（None 为精确统计）
+_worker_sketch_params = None
 
 # 《甄嬛传》角色名和关键词列表
 zhuanhuan_keywords = {
@@ -159,15 +201,262 @@ class FastChineseSegmenter:
                 all_words.extend(words)
         return all_words
 
+def create_segmenter(backend=DEFAULT_SEGMENTER_BACKEND, extra_words=None):
+    """创建分词器：'automaton' 数组自动机（省内存，适合大词典），'trie' 字典树
+
+    extra_words 为补充词，默认读取新词发现生成的 新词词典.txt（不存在时不补充）
+    """
+    if extra_words is None:
+        extra_words = load_user_dict_words()
+    if backend == 'automaton':
+        return AutomatonSegmenter(zhuanhuan_keywords | emotion_words | set(extra_words), stop_words)
+    if backend == 'trie':
+        segmenter = FastChineseSegmenter()
+        for word in extra_words:
+            segmenter._add_word(word)
+            segmenter.max_word_len = max(segmenter.max_word_len, len(word))
+        return segmenter
+    raise ValueError(f"未知的分词后端: {backend}")
+
+def discover_words_from_file(file_path, top_n=30):
+    """从文件中发现新词（按行切分），保存为新词词典，之后的分词和 jieba 都会加载"""
+    content = read_text_file(file_path)
+    if content is None:
+        print("无法解码文件内容")
+        return None
+    
+    new_words = discover_new_words(content.splitlines(), known_words=zhuanhuan_keywords | emotion_words)
+    if new_words.empty:
+        print("没有发现新词")
+        return new_words
+    
+    print(f"\n前{top_n}个新词:")
+    print(new_words.head(top_n).to_string(index=False))
+    save_user_dict(new_words)
+    return new_words
+
+def _sketch_params(approximate):
+    """approximate 为 False 时精确统计（返回None），True 用默认参数，也可以传入参数字典"""
+    if not approximate:
+        return None
+    return {} if approximate is True else dict(approximate)
+
+def new_word_counter(approximate=False):
+    """精确统计用 Counter；近似统计用固定内存的 HeavyHitterSketch（不计停用词），两者都用 update 累加和合并"""
+    params = _sketch_params(approximate)
+    if params is None:
+        return Counter()
+    return HeavyHitterSketch(ignore=stop_words, **params)
+
+def _init_count_worker(backend, sketch_params=None):
+    """工作进程初始化：构建分词器（不重复打印词典信息）"""
+    global _worker_segmenter, _worker_sketch_params
+    with contextlib.redirect_stdout(io.StringIO()):
+        _worker_segmenter = create_segmenter(backend)
+    _worker_sketch_params = sketch_params
+
+def _count_chunks(chunks):
+    """map：为一组分块分词，只返回局部词频（或草图），不返回词列表"""
+    counter = new_word_counter(_worker_sketch_params if _worker_sketch_params is not None else False)
+    for chunk in chunks:
+        counter.update(_worker_segmenter.fast_segment(chunk))
+    return counter
+
+def count_words(chunks, backend=DEFAULT_SEGMENTER_BACKEND, max_workers=None, approximate=False):
+    """分词并统计词频 - 分块分给进程池，各进程返回局部 Counter，主进程合并（reduce）
+
+    参数:
+    chunks (list): process_large_text 得到的文本块
+    backend (str): 分词后端
+    max_workers (int): 进程数，默认CPU核数；为1时在当前进程逐块统计
+    approximate: 为 True（或草图参数字典）时用固定内存的近似统计，返回 HeavyHitterSketch
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    total_chunks = len(chunks)
+    word_counter = new_word_counter(approximate)
+    
+    if max_workers == 1 or total_chunks < PARALLEL_MIN_CHUNKS:
+        print("   单进程分词")
+        segmenter = create_segmenter(backend)
+        for i, chunk in enumerate(chunks):
+            # 逐块累加词频，不保留全部分词结果
+            word_counter.update(segmenter.fast_segment(chunk))
+            
+            # 显示进度
+            if total_chunks > 10 and i % (total_chunks // 10) == 0:
+                progress = (i + 1) / total_chunks * 100
+                print(f"   分词进度: {progress:.1f}% ({i+1}/{total_chunks})")
+        return word_counter
+    
+    tasks = [chunks[i:i + CHUNKS_PER_TASK] for i in range(0, total_chunks, CHUNKS_PER_TASK)]
+    workers = min(max_workers, len(tasks))
+    print(f"   并行分词: {workers} 个进程, {len(tasks)} 个任务")
+    done_chunks = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_count_worker,
+                             initargs=(backend, _sketch_params(approximate))) as executor:
+        for i, partial in enumerate(executor.map(_count_chunks, tasks)):
+            word_counter.update(partial)
+            done_chunks += len(tasks[i])
+            
+            # 显示进度
+            if len(tasks) > 10 and i % (len(tasks) // 10) == 0:
+                progress = done_chunks / total_chunks * 100
+                print(f"   分词进度: {progress:.1f}% ({done_chunks}/{total_chunks})")
+    return word_counter
+
+def _iter_tasks(chunks):
+    """把分块（可以是生成器）按 CHUNKS_PER_TASK 个一组"""
+    task = []
+    for chunk in chunks:
+        task.append(chunk)
+        if len(task) == CHUNKS_PER_TASK:
+            yield task
+            task = []
+    if task:
+        yield task
+
+def count_words_stream(chunks, backend=DEFAULT_SEGMENTER_BACKEND, max_workers=None, approximate=False):
+    """流式分词统计 - chunks 为分块生成器，在途任务数有上限；近似统计时词频也只占固定内存"""
+    max_workers = max_workers or os.cpu_count() or 1
+    word_counter = new_word_counter(approximate)
+    done_chunks = 0
+    
+    if max_workers == 1:
+        segmenter = create_segmenter(backend)
+        for chunk in chunks:
+            word_counter.update(segmenter.fast_segment(chunk))
+            done_chunks += 1
+            if done_chunks % STREAM_PROGRESS_CHUNKS == 0:
+                print(f"   已分词: {done_chunks:,} 块")
+        return word_counter
+    
+    print(f"   并行分词: {max_workers} 个进程")
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_count_worker,
+                             initargs=(backend, _sketch_params(approximate))) as executor:
+        for task in _iter_tasks(chunks):
+            pending.append((executor.submit(_count_chunks, task), len(task)))
+            # 等最早的任务完成再继续读取，生成器不会被提前读完
+            while len(pending) >= max_workers * STREAM_TASKS_PER_WORKER:
+                future, size = pending.popleft()
+                word_counter.update(future.result())
+                done_chunks += size
+                if done_chunks % STREAM_PROGRESS_CHUNKS < size:
+                    print(f"   已分词: {done_chunks:,} 块")
+        while pending:
+            future, size = pending.popleft()
+            word_counter.update(future.result())
+    return word_counter
+
+def compare_segmenters(text, repeat=3):
+    """对比两种分词器的吞吐量，并检查分词结果一致"""
+    cleaned_text = clean_text_fast(text)
+    print(f"\n分词器吞吐对比 (文本 {len(cleaned_text):,} 字符, 取 {repeat} 次最快)")
+    results = {}
+    for backend in ('trie', 'automaton'):
+        segmenter = create_segmenter(backend)
+        best = float('inf')
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            words = segmenter.fast_segment(cleaned_text)
+            best = min(best, time.perf_counter() - start_time)
+        speed = len(cleaned_text) / best if best > 0 else float('inf')
+        results[backend] = {'words': words, 'seconds': best, 'chars_per_sec': speed}
+        print(f"  {backend:9}: {best:.3f}秒, {speed:,.0f} 字符/秒, {len(words):,} 个词")
+
+    same = results['trie']['words'] == results['automaton']['words']
+    print(f"  分词结果{'一致' if same else '不一致!'}，"
+          f"加速比: {results['trie']['seconds'] / max(results['automaton']['seconds'], 1e-9):.2f}x")
+    return results
+
 def clean_text_fast(text):
     """快速清理文本"""
-    # 使用更高效的正则表达式
-    text = re.sub(r'[\(（].*?[）\)]', '', text, flags=re.DOTALL)
-    text = re.sub(r'[0-9a-zA-Z]', '', text)
-    text = re.sub(r'[，。！？；："「」『』《》【】、]', '', text)
-    text = re.sub(r'\s+', ' ', text)
+    # 括号注释、字母数字、标点在同一次扫描中删除，再合并空白
+    text = CLEAN_PATTERN.sub('', text)
+    text = WHITESPACE_PATTERN.sub(' ', text)
     return text.strip()
 
+def detect_encoding(file_path, sample_bytes=ENCODING_SAMPLE_BYTES):
+    """只读文件开头一段判断编码，都无法解码时返回None"""
+    with open(file_path, 'rb') as f:
+        prefix = f.read(sample_bytes)
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    for encoding in TEXT_ENCODINGS:
+        try:
+            # 增量解码：开头一段末尾被截断的多字节字符不算错误
+            codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+class StreamingTextReader:
+    """超大文本文件的流式读取 - 内存只与块大小有关
+
+    - 只读文件开头一段判断编码，之后逐块读入
+    - 每块只在换行处切开（不切断括号注释），剩余部分并入下一块，清理后的分词结果与整体清理相同
+    - 清理后的块在空白处再切成约 chunk_size 字符的分块，迭代时以生成器交给分词
+    """
+    
+    def __init__(self, file_path, encoding=None, block_chars=STREAM_BLOCK_CHARS, chunk_size=10000):
+        self.file_path = file_path
+        self.encoding = encoding or detect_encoding(file_path) or 'utf-8'
+        self.block_chars = block_chars
+        self.chunk_size = chunk_size
+        self.chars_read = 0
+        self.cleaned_chars = 0
+    
+    @staticmethod
+    def _complete_end(text):
+        """可以切开的位置：最后一个不在括号注释内的换行之后，没有时为0"""
+        cut = text.rfind('\n') + 1
+        while cut:
+            match = UNCLOSED_PAREN_PATTERN.search(text, 0, cut)
+            if match is None:
+                break
+            cut = text.rfind('\n', 0, match.start()) + 1
+        return cut
+    
+    def iter_blocks(self):
+        """逐块读取并清理，产生清理后的文本块"""
+        carry = ""
+        # 编码判断只看开头，文件后部的坏字节替换掉（替换字符不是汉字，不影响分词）
+        with open(self.file_path, 'r', encoding=self.encoding, errors='replace') as f:
+            while True:
+                block = f.read(self.block_chars)
+                if not block:
+                    break
+                self.chars_read += len(block)
+                text = carry + block
+                cut = self._complete_end(text)
+                if not cut and len(text) > self.block_chars * MAX_CARRY_BLOCKS:
+                    cut = len(text)
+                carry = text[cut:]
+                cleaned = clean_text_fast(text[:cut])
+                if cleaned:
+                    self.cleaned_chars += len(cleaned)
+                    yield cleaned
+        cleaned = clean_text_fast(carry)
+        if cleaned:
+            self.cleaned_chars += len(cleaned)
+            yield cleaned
+    
+    def __iter__(self):
+        """清理后的文本按空白切成分块（空白处不会有词跨过）"""
+        for block in self.iter_blocks():
+            start = 0
+            while len(block) - start > self.chunk_size:
+                cut = block.rfind(' ', start, start + self.chunk_size)
+                if cut <= start:
+                    cut = block.find(' ', start + self.chunk_size)
+                    if cut < 0:
+                        break
+                yield block[start:cut]
+                start = cut + 1
+            if start < len(block):
+                yield block[start:]
+
 def process_large_text(text, chunk_size=10000):
     """分块处理大文本"""
     print(f"文本大小: {len(text):,} 字符")
@@ -180,6 +469,11 @@ def process_large_text(text, chunk_size=10000):
     # 简单按标点分块
     sentences = re.split(r'[。！？；\n]', text)
     
+    # clean_text_fast 已去掉标点、把换行合并为空格，超长的句子再按空白切开
+    # （空白处不会有词跨过，切开后分词结果不变）
+    sentences = [piece for sentence in sentences
+                 for piece in (sentence.split() if len(sentence) > chunk_size else [sentence])]
+    
     for sentence in sentences:
         sentence = sentence.strip()
         if not sentence:
@@ -198,8 +492,9 @@ def process_large_text(text, chunk_size=10000):
     print(f"分块完成: {len(chunks)} 个块")
     return chunks
 
-def analyze_large_text(text, scene_name="弹幕分析", top_n=100):
-    """分析大文本（优化版）"""
+def analyze_large_text(text, scene_name="弹幕分析", top_n=100, backend=DEFAULT_SEGMENTER_BACKEND,
+                       max_workers=None, approximate=False):
+    """分析大文本（优化版），max_workers 为分词进程数（默认CPU核数，1为单进程），approximate 为近似统计"""
     print(f"\n{'='*60}")
     print(f"分析场景: {scene_name}")
     print(f"{'='*60}")
@@ -217,53 +512,65 @@ def analyze_large_text(text, scene_name="弹幕分析", top_n=100):
     print("2. 分块处理...")
     chunks = process_large_text(cleaned_text)
     
-    # 3. 初始化分词器
+    # 3-4. 分词并统计词频（分块并行，各进程只返回局部词频）
     print("3. 初始化分词器...")
-    segmenter = FastChineseSegmenter()
-    
-    # 4. 批量分词
     print("4. 批量分词...")
     start_time = time.time()
     
-    all_words = []
-    total_chunks = len(chunks)
-    
-    for i, chunk in enumerate(chunks):
-        words = segmenter.fast_segment(chunk)
-        all_words.extend(words)
-        
-        # 显示进度
-        if total_chunks > 10 and i % (total_chunks // 10) == 0:
-            progress = (i + 1) / total_chunks * 100
-            print(f"   分词进度: {progress:.1f}% ({i+1}/{total_chunks})")
+    word_counter = count_words(chunks, backend, max_workers, approximate)
     
     end_time = time.time()
     print(f"   分词完成，用时: {end_time - start_time:.2f}秒")
-    print(f"   总分词数: {len(all_words):,}")
+    if not isinstance(word_counter, HeavyHitterSketch):
+        print(f"   总分词数: {sum(word_counter.values()):,}")
     
-    if not all_words:
+    if not word_counter:
         print("没有找到有效词汇")
         return None
     
+    return report_word_counts(word_counter, scene_name, top_n, len(text))
+
+def _error_note(errors, word):
+    """近似统计时显示在次数后面的误差"""
+    return f" 误差≤{errors[word]}" if word in errors else ""
+
+def report_word_counts(word_counter, scene_name, top_n=100, text_length=0):
+    """根据词频统计结果生成高频词报告（步骤5-8），text_length 为原文字符数
+
+    word_counter 为 HeavyHitterSketch 时输出近似结果：次数为估计上界，后面标出误差
+    """
     # 5. 统计词频
     print("5. 统计词频...")
-    word_counter = Counter(all_words)
     
-    # 过滤停用词
-    filtered_counter = Counter()
-    for word, count in word_counter.items():
-        if word not in stop_words and len(word) > 0:
-            filtered_counter[word] = count
-    
-    total_words = sum(filtered_counter.values())
-    unique_words = len(filtered_counter)
+    approximate = isinstance(word_counter, HeavyHitterSketch)
+    errors = {}
+    if approximate:
+        # 停用词在加入草图时已经去掉
+        total_words = word_counter.total
+        unique_words = word_counter.distinct_estimate()
+        print(f"   近似统计: 草图占用约 {word_counter.memory_bytes() / 1024 / 1024:.1f} MB")
+    else:
+        # 过滤停用词
+        filtered_counter = Counter()
+        for word, count in word_counter.items():
+            if word not in stop_words and len(word) > 0:
+                filtered_counter[word] = count
+        
+        total_words = sum(filtered_counter.values())
+        unique_words = len(filtered_counter)
     
     print(f"   有效词数: {total_words:,}")
-    print(f"   唯一词数: {unique_words:,}")
+    print(f"   唯一词数: {'约' if approximate else ''}{unique_words:,}")
     
     # 6. 获取高频词
     print("6. 获取高频词...")
-    top_words = filtered_counter.most_common(top_n)
+    if approximate:
+        top_words = []
+        for word, count, error in word_counter.most_common(top_n):
+            top_words.append((word, count))
+            errors[word] = error
+    else:
+        top_words = filtered_counter.most_common(top_n)
     
     # 7. 分类统计
     print("7. 分类统计...")
@@ -286,9 +593,9 @@ def analyze_large_text(text, scene_name="弹幕分析", top_n=100):
     
     # 显示摘要
     print(f"\n摘要统计:")
-    print(f"  总字符数: {len(text):,}")
+    print(f"  总字符数: {text_length:,}")
     print(f"  有效词数: {total_words:,}")
-    print(f"  唯一词数: {unique_words:,}")
+    print(f"  唯一词数: {'约' if approximate else ''}{unique_words:,}")
     print(f"  角色词数: {len(zhuanhuan_words)}")
     print(f"  情感词数: {len(emotion_words_list)}")
     
@@ -302,19 +609,19 @@ def analyze_large_text(text, scene_name="弹幕分析", top_n=100):
             category = "[情感]"
         
         percentage = count / total_words * 100 if total_words > 0 else 0
-        print(f"{i:2}. {word:8} : {count:6} ({percentage:.2f}%) {category}")
+        print(f"{i:2}. {word:8} : {count:6} ({percentage:.2f}%) {category}{_error_note(errors, word)}")
     
     # 显示角色词
     if zhuanhuan_words:
         print(f"\n《甄嬛传》关键词 (前20个):")
         for i, (word, count) in enumerate(zhuanhuan_words[:20], 1):
-            print(f"  {i:2}. {word:8} : {count:6}")
+            print(f"  {i:2}. {word:8} : {count:6}{_error_note(errors, word)}")
     
     # 显示情感词
     if emotion_words_list:
         print(f"\n情感词汇 (前20个):")
         for i, (word, count) in enumerate(emotion_words_list[:20], 1):
-            print(f"  {i:2}. {word:8} : {count:6}")
+            print(f"  {i:2}. {word:8} : {count:6}{_error_note(errors, word)}")
     
     return {
         'scene_name': scene_name,
@@ -324,38 +631,85 @@ def analyze_large_text(text, scene_name="弹幕分析", top_n=100):
         'other_words': other_words,
         'total_words': total_words,
         'unique_words': unique_words,
-        'text_length': len(text)
+        'text_length': text_length,
+        'approximate': approximate,
+        'errors': errors
     }
 
-def analyze_from_file(file_path, top_n=100):
-    """从文件分析"""
-    print(f"从文件读取: {file_path}")
-    
-    try:
-        # 尝试不同编码
-        encodings = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']
-        content = None
-        
-        for encoding in encodings:
+def read_text_file(file_path):
+    """读取文本文件，按开头一段判断编码，无法解码时返回None"""
+    content = None
+    encoding = detect_encoding(file_path)
+    
+    if encoding is not None:
+        try:
+            with open(file_path, 'r', encoding=encoding) as f:
+                content = f.read()
+            print(f"使用编码: {encoding}")
+        except UnicodeDecodeError:
+            content = None
+    
+    if content is None:
+        print("无法读取文件，尝试使用二进制模式")
+        with open(file_path, 'rb') as f:
+            raw_content = f.read()
+        # 尝试解码
+        for encoding in TEXT_ENCODINGS:
             try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    content = f.read()
-                print(f"使用编码: {encoding}")
+                content = raw_content.decode(encoding)
                 break
-            except UnicodeDecodeError:
+            except:
                 continue
+    
+    return content
+
+def analyze_file_streaming(file_path, top_n=100, backend=DEFAULT_SEGMENTER_BACKEND, max_workers=None,
+                           encoding=None, approximate=False):
+    """流式分析大文件：逐块读取、清理、分词计数，不把整个文件读入内存"""
+    scene_name = os.path.splitext(os.path.basename(file_path))[0]
+    print(f"\n{'='*60}")
+    print(f"分析场景: {scene_name}（流式）")
+    print(f"{'='*60}")
+    
+    reader = StreamingTextReader(file_path, encoding)
+    print(f"1. 流式读取 (编码: {reader.encoding}, 每块 {reader.block_chars:,} 字符)...")
+    print("2. 逐块清理并切分...")
+    print("3. 初始化分词器...")
+    print("4. 批量分词...")
+    start_time = time.time()
+    
+    word_counter = count_words_stream(reader, backend, max_workers, approximate)
+    
+    end_time = time.time()
+    print(f"   读取 {reader.chars_read:,} 字符，清理后 {reader.cleaned_chars:,} 字符")
+    print(f"   分词完成，用时: {end_time - start_time:.2f}秒")
+    if not isinstance(word_counter, HeavyHitterSketch):
+        print(f"   总分词数: {sum(word_counter.values()):,}")
+    
+    if not word_counter:
+        print("没有找到有效词汇")
+        return None
+    
+    return report_word_counts(word_counter, scene_name, top_n, reader.chars_read)
+
+def analyze_from_file(file_path, top_n=100, max_workers=None, stream=None, approximate=None):
+    """从文件分析，stream 为None时超过 STREAM_THRESHOLD_BYTES 的文件自动流式分析
+
+    approximate 为None时流式分析使用近似统计（内存固定），一次读入的文件精确统计
+    """
+    print(f"从文件读取: {file_path}")
+    
+    try:
+        if stream is None:
+            stream = os.path.getsize(file_path) >= STREAM_THRESHOLD_BYTES
+        if stream:
+            result = analyze_file_streaming(file_path, top_n, max_workers=max_workers,
+                                            approximate=True if approximate is None else approximate)
+            if result:
+                save_analysis_result(result)
+            return result
         
-        if content is None:
-            print("无法读取文件，尝试使用二进制模式")
-            with open(file_path, 'rb') as f:
-                raw_content = f.read()
-            # 尝试解码
-            for encoding in encodings:
-                try:
-                    content = raw_content.decode(encoding)
-                    break
-                except:
-                    continue
+        content = read_text_file(file_path)
         
         if content is None:
             print("无法解码文件内容")
@@ -365,7 +719,8 @@ def analyze_from_file(file_path, top_n=100):
         scene_name = os.path.splitext(os.path.basename(file_path))[0]
         
         # 分析
-        result = analyze_large_text(content, scene_name, top_n)
+        result = analyze_large_text(content, scene_name, top_n, max_workers=max_workers,
+                                    approximate=approximate or False)
         
         # 保存结果
         if result:
@@ -385,7 +740,7 @@ def save_analysis_result(result):
         f.write(f"场景: {result['scene_name']}\n")
         f.write(f"文本长度: {result['text_length']:,} 字符\n")
         f.write(f"有效词数: {result['total_words']:,}\n")
-        f.write(f"唯一词数: {result['unique_words']:,}\n")
+        f.write(f"唯一词数: {'约' if result.get('approximate') else ''}{result['unique_words']:,}\n")
         f.write("=" * 60 + "\n\n")
         
         # 写入高频词
@@ -400,23 +755,31 @@ def save_analysis_result(result):
                 category = "[情感]"
             
             percentage = count / result['total_words'] * 100 if result['total_words'] > 0 else 0
-            f.write(f"{i:3}. {word:10} : {count:8} ({percentage:.3f}%) {category}\n")
+            f.write(f"{i:3}. {word:10} : {count:8} ({percentage:.3f}%) {category}"
+                    f"{_error_note(result.get('errors', {}), word)}\n")
         
         # 写入分类结果
         if result['zhuanhuan_words']:
             f.write(f"\n《甄嬛传》关键词 ({len(result['zhuanhuan_words'])}个):\n")
             for word, count in result['zhuanhuan_words']:
-                f.write(f"  {word:10} : {count:8}\n")
+                f.write(f"  {word:10} : {count:8}{_error_note(result.get('errors', {}), word)}\n")
         
         if result['emotion_words']:
             f.write(f"\n情感词汇 ({len(result['emotion_words'])}个):\n")
             for word, count in result['emotion_words']:
-                f.write(f"  {word:10} : {count:8}\n")
+                f.write(f"  {word:10} : {count:8}{_error_note(result.get('errors', {}), word)}\n")
     
     print(f"结果已保存到: {filename}")
 
-def batch_analyze_files(file_patterns=None):
-    """批量分析文件"""
+def _analyze_file_quietly(file_path, approximate=None):
+    """在工作进程中分析一个文件（文件内不再并行），输出收集后返回，避免多个文件的输出交错"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = analyze_from_file(file_path, max_workers=1, approximate=approximate)
+    return result, output.getvalue()
+
+def batch_analyze_files(file_patterns=None, max_workers=None, approximate=None):
+    """批量分析文件，多个文件时按文件分给进程池（max_workers 为1时逐个分析）"""
     print("批量分析模式")
     print("=" * 60)
     
@@ -440,13 +803,27 @@ def batch_analyze_files(file_patterns=None):
         print(f"  {i:2}. {f} ({size:,} bytes)")
     
     results = []
-    for file_path in files:
-        print(f"\n{'='*60}")
-        print(f"分析文件: {file_path}")
-        
-        result = analyze_from_file(file_path)
-        if result:
-            results.append(result)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers > 1 and len(files) > 1:
+        # 每个进程分析整个文件，主进程按文件顺序打印输出并收集结果
+        workers = min(max_workers, len(files))
+        print(f"\n并行分析: {workers} 个进程")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outputs = executor.map(_analyze_file_quietly, files, [approximate] * len(files))
+            for file_path, (result, output) in zip(files, outputs):
+                print(f"\n{'='*60}")
+                print(f"分析文件: {file_path}")
+                print(output, end='')
+                if result:
+                    results.append(result)
+    else:
+        for file_path in files:
+            print(f"\n{'='*60}")
+            print(f"分析文件: {file_path}")
+            
+            result = analyze_from_file(file_path, max_workers=max_workers, approximate=approximate)
+            if result:
+                results.append(result)
     
     # 生成汇总报告
     if len(results) > 1:
@@ -519,6 +896,15 @@ def generate_batch_summary(results):
     print(f"  总词数: {total_stats['words']:,}")
     print(f"  唯一词数: {total_stats['unique']:,}")
 
+def ask_approximate():
+    """询问统计方式：y 近似统计，n 精确统计，直接回车则只有流式分析的大文件使用近似统计"""
+    answer = input("使用近似统计（内存固定，计数有少量误差）? (y/n，直接回车则大文件自动使用): ").strip().lower()
+    if answer in ('y', 'yes', '是'):
+        return True
+    if answer in ('n', 'no', '否'):
+        return False
+    return None
+
 def main():
     """主函数"""
     import time
@@ -537,19 +923,21 @@ def main():
         print("  1. 分析单个大文本文件")
         print("  2. 批量分析多个文件")
         print("  3. 手动输入文本")
-        print("  4. 退出")
+        print("  4. 分词器吞吐对比")
+        print("  5. 新词发现（生成新词词典）")
+        print("  6. 退出")
         
-        choice = input("请输入选择 (1/2/3/4): ").strip()
+        choice = input("请输入选择 (1/2/3/4/5/6): ").strip()
         
         if choice == '1':
             file_path = input("请输入文件路径: ").strip()
             if os.path.exists(file_path):
-                analyze_from_file(file_path)
+                analyze_from_file(file_path, approximate=ask_approximate())
             else:
                 print("文件不存在!")
         
         elif choice == '2':
-            batch_analyze_files()
+            batch_analyze_files(approximate=ask_approximate())
         
         elif choice == '3':
             print("请输入文本（输入'END'结束）:")
@@ -565,6 +953,21 @@ def main():
             analyze_large_text(text, scene_name)
         
         elif choice == '4':
+            file_path = input("请输入文件路径: ").strip()
+            content = read_text_file(file_path) if os.path.exists(file_path) else None
+            if content is not None:
+                compare_segmenters(content)
+            else:
+                print("文件不存在!")
+        
+        elif choice == '5':
+            file_path = input("请输入文件路径: ").strip()
+            if os.path.exists(file_path):
+                discover_words_from_file(file_path)
+            else:
+                print("文件不存在!")
+        
+        elif choice == '6':
             print("退出程序")
             break
         
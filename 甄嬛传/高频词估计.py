@@ -0,0 +1,183 @@
+import hashlib
+import heapq
+import math
+from collections import Counter
+from collections.abc import Mapping
+
+import numpy as np
+
+# Misra-Gries 保留的候选词数：每个词最多少算 有效词数/(容量+1)
+DEFAULT_CAPACITY = 2000
+# Count-Min 的相对误差 ε：每个词最多多算 ε×有效词数
+DEFAULT_EPSILON = 1e-4
+# Count-Min 误差超出上界的概率 δ
+DEFAULT_DELTA = 1e-3
+# 估计唯一词数的位图大小（位）
+DISTINCT_BITS = 1 << 20
+
+
+def word_hashes(words):
+    """词的64位哈希（不受进程哈希随机化影响，各进程的草图可以直接合并）"""
+    digests = b''.join(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest() for word in words)
+    return np.frombuffer(digests, dtype=np.uint64)
+
+
+class CountMinSketch:
+    """Count-Min 草图 - depth × width 的固定计数表
+
+    每个词在每行按哈希落到一列，估计值取各行最小值：只会偏大，
+    且以 1-δ 的概率偏大不超过 ε×总数。参数相同的草图计数表相加即可合并。
+    """
+
+    def __init__(self, epsilon=DEFAULT_EPSILON, delta=DEFAULT_DELTA):
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError("epsilon 和 delta 必须在0到1之间")
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, hashes):
+        """双重哈希：第 i 行的列号为 (h1 + i×h2) mod width"""
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((low[None, :] + rows * high[None, :]) % np.uint64(self.width)).astype(np.intp)
+
+    def add(self, hashes, counts):
+        """加入一批 (哈希, 次数)"""
+        columns = self._columns(hashes)
+        rows = np.broadcast_to(np.arange(self.depth)[:, None], columns.shape)
+        np.add.at(self.table, (rows, columns), np.broadcast_to(counts, columns.shape))
+        self.total += int(counts.sum())
+
+    def estimate(self, hashes):
+        """各词次数的估计（上界）"""
+        columns = self._columns(hashes)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def error_bound(self):
+        """以 1-δ 的概率成立的单词误差上界"""
+        return math.ceil(self.epsilon * self.total)
+
+    def merge(self, other):
+        """合并参数相同的草图"""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Count-Min 草图参数不同，无法合并")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class MisraGries:
+    """Misra-Gries 频繁项摘要 - 最多保留 capacity 个候选词
+
+    超出容量时所有计数减去第 capacity+1 大的计数并删掉不为正的，
+    每个词的计数只会偏小，偏小量不超过累计扣减量（≤ 总数/(capacity+1)）。
+    两个摘要计数相加后再裁剪即可合并。
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("容量必须大于0")
+        self.capacity = capacity
+        self.counts = Counter()
+        self.decrement = 0
+
+    def update(self, counts):
+        """加入 {词: 次数}"""
+        self.counts.update(counts)
+        self._prune()
+
+    def merge(self, other):
+        """合并另一个摘要"""
+        self.counts.update(other.counts)
+        self.decrement += other.decrement
+        self._prune()
+        return self
+
+    def _prune(self):
+        if len(self.counts) <= self.capacity:
+            return
+        threshold = heapq.nlargest(self.capacity + 1, self.counts.values())[-1]
+        self.decrement += threshold
+        self.counts = Counter({word: count - threshold for word, count in self.counts.items()
+                               if count > threshold})
+
+
+class HeavyHitterSketch:
+    """固定内存的近似词频统计 - Misra-Gries 跟踪高频候选词，Count-Min 估计次数，位图估计唯一词数
+
+    update 的用法与 Counter.update 相同（词列表或 {词: 次数}），也可以传入另一个草图进行合并，
+    各分块、文件、进程分别统计后合并即可。内存只与参数有关，与文本长度和唯一词数无关。
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, epsilon=DEFAULT_EPSILON, delta=DEFAULT_DELTA, ignore=()):
+        self.ignore = frozenset(ignore)
+        self.heavy = MisraGries(capacity)
+        self.sketch = CountMinSketch(epsilon, delta)
+        self.distinct_bits = np.zeros(DISTINCT_BITS // 8, dtype=np.uint8)
+
+    @property
+    def total(self):
+        """已加入的词数（精确值）"""
+        return self.sketch.total
+
+    def __bool__(self):
+        return self.total > 0
+
+    def update(self, words):
+        """加入词列表、{词: 次数}，或合并另一个草图（ignore 中的词不计）"""
+        if isinstance(words, HeavyHitterSketch):
+            self.merge(words)
+            return
+        counts = words if isinstance(words, Mapping) else Counter(words)
+        counts = {word: count for word, count in counts.items()
+                  if count > 0 and word and word not in self.ignore}
+        if not counts:
+            return
+        hashes = word_hashes(counts)
+        self.sketch.add(hashes, np.fromiter(counts.values(), dtype=np.int64, count=len(counts)))
+        bits = hashes % np.uint64(DISTINCT_BITS)
+        np.bitwise_or.at(self.distinct_bits, (bits >> np.uint64(3)).astype(np.intp),
+                         (1 << (bits & np.uint64(7))).astype(np.uint8))
+        self.heavy.update(counts)
+
+    def merge(self, other):
+        """合并参数相同的草图"""
+        self.heavy.merge(other.heavy)
+        self.sketch.merge(other.sketch)
+        self.distinct_bits |= other.distinct_bits
+        return self
+
+    def distinct_estimate(self):
+        """线性计数估计唯一词数"""
+        zeros = DISTINCT_BITS - int(np.unpackbits(self.distinct_bits).sum())
+        if zeros == 0:
+            # 位图已满，只能给出下界
+            return DISTINCT_BITS
+        return round(-DISTINCT_BITS * math.log(zeros / DISTINCT_BITS))
+
+    def most_common(self, n=None):
+        """高频词 [(词, 估计次数, 误差)]，真实次数在 [估计次数-误差, 估计次数] 之间
+
+        下界为 Misra-Gries 计数，上界取 Count-Min 估计与 Misra-Gries 计数+累计扣减量中较小的
+        （Count-Min 的上界以 1-δ 的概率成立）。
+        """
+        words = list(self.heavy.counts)
+        if not words:
+            return []
+        upper = self.sketch.estimate(word_hashes(words)).tolist()
+        result = []
+        for word, high in zip(words, upper):
+            low = self.heavy.counts[word]
+            high = min(high, low + self.heavy.decrement)
+            result.append((word, high, high - low))
+        result.sort(key=lambda item: (-item[1], item[2]))
+        return result if n is None else result[:n]
+
+    def memory_bytes(self):
+        """草图占用的主要内存（计数表、位图和候选词计数）"""
+        return self.sketch.table.nbytes + self.distinct_bits.nbytes + 100 * len(self.heavy.counts)